@@ -0,0 +1,9 @@
+-- Migration: Index des contrats par chantier (cumuls catastrophe, app/accumulation.py)
+-- Date: 2026-10-19
+
+-- Les tables fake_site_exposures / fake_accumulation_cells / fake_accumulation_changes et les
+-- triggers de suivi sont créés au démarrage de l'API ; seul cet index manque aux bases existantes.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fake_client_contracts_construction_site_id
+ON fake_client_contracts (construction_site_id);
+
+ANALYZE fake_client_contracts;
@@ -0,0 +1,13 @@
+-- Migration: Index spatiaux des chantiers et adresses (recherche par rayon / rectangle)
+-- Date: 2026-10-19
+
+-- GiST sur le point (longitude, latitude) natif de PostgreSQL : ne nécessite pas PostGIS.
+-- L'expression doit rester identique à celle des requêtes (app/geo.py).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fake_construction_sites_location
+ON fake_construction_sites USING gist (point(longitude, latitude));
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fake_client_addresses_location
+ON fake_client_addresses USING gist (point(longitude, latitude));
+
+ANALYZE fake_construction_sites;
+ANALYZE fake_client_addresses;
@@ -0,0 +1,39 @@
+-- Migration: Colonnes JSON des contrats, sinistres et clauses en JSONB + index GIN
+-- Date: 2026-10-19
+
+-- Conversion json -> jsonb (réécriture de la table : à lancer hors charge)
+ALTER TABLE fake_client_contracts
+ALTER COLUMN selected_guarantees TYPE JSONB USING selected_guarantees::jsonb,
+ALTER COLUMN selected_clauses TYPE JSONB USING selected_clauses::jsonb,
+ALTER COLUMN specific_exclusions TYPE JSONB USING specific_exclusions::jsonb,
+ALTER COLUMN attached_documents TYPE JSONB USING attached_documents::jsonb;
+
+ALTER TABLE fake_claims
+ALTER COLUMN activated_guarantees TYPE JSONB USING activated_guarantees::jsonb,
+ALTER COLUMN attached_documents TYPE JSONB USING attached_documents::jsonb,
+ALTER COLUMN third_party_info TYPE JSONB USING third_party_info::jsonb;
+
+ALTER TABLE fake_ref_contract_clauses
+ALTER COLUMN applies_to_contract_types TYPE JSONB USING applies_to_contract_types::jsonb,
+ALTER COLUMN applies_to_guarantees TYPE JSONB USING applies_to_guarantees::jsonb;
+
+ALTER TABLE fake_ref_exclusions
+ALTER COLUMN applies_to_guarantees TYPE JSONB USING applies_to_guarantees::jsonb,
+ALTER COLUMN applies_to_contract_types TYPE JSONB USING applies_to_contract_types::jsonb;
+
+-- Index GIN jsonb_path_ops : recherche par contenance (@>), plus compacts que jsonb_ops
+CREATE INDEX IF NOT EXISTS ix_fake_client_contracts_selected_clauses
+ON fake_client_contracts USING gin (selected_clauses jsonb_path_ops);
+
+CREATE INDEX IF NOT EXISTS ix_fake_claims_activated_guarantees
+ON fake_claims USING gin (activated_guarantees jsonb_path_ops);
+
+CREATE INDEX IF NOT EXISTS ix_fake_ref_contract_clauses_applies_to_contract_types
+ON fake_ref_contract_clauses USING gin (applies_to_contract_types jsonb_path_ops);
+
+CREATE INDEX IF NOT EXISTS ix_fake_ref_contract_clauses_applies_to_guarantees
+ON fake_ref_contract_clauses USING gin (applies_to_guarantees jsonb_path_ops);
+
+ANALYZE fake_client_contracts;
+ANALYZE fake_claims;
+ANALYZE fake_ref_contract_clauses;
@@ -0,0 +1,45 @@
+-- Migration: Flux de synchronisation ordonné par transaction (/sync/changes, app/sync_feed.py)
+-- Date: 2026-10-19
+--
+-- updated_at est posé par l'application avant le commit : une transaction longue (import,
+-- lot) pouvait valider des lignes derrière un curseur déjà remis aux clients. Le flux suit
+-- désormais sync_xid, transaction de la dernière écriture, posé par trigger.
+-- Les fonctions et triggers sont créés au démarrage de l'application (init_db).
+-- Les jetons v1 déjà distribués déclenchent une resynchronisation complète.
+
+-- Lignes sans updated_at : aucune version serveur, /sync/batch ne pourrait pas y détecter de conflit
+UPDATE fake_clients SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+UPDATE fake_construction_sites SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+UPDATE fake_client_contracts SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+UPDATE fake_claims SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+
+ALTER TABLE fake_clients ADD COLUMN IF NOT EXISTS sync_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint);
+ALTER TABLE fake_construction_sites ADD COLUMN IF NOT EXISTS sync_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint);
+ALTER TABLE fake_client_contracts ADD COLUMN IF NOT EXISTS sync_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint);
+ALTER TABLE fake_claims ADD COLUMN IF NOT EXISTS sync_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint);
+ALTER TABLE fake_ref_insurance_contract_types ADD COLUMN IF NOT EXISTS sync_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint);
+ALTER TABLE fake_ref_guarantees ADD COLUMN IF NOT EXISTS sync_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint);
+ALTER TABLE fake_ref_contract_clauses ADD COLUMN IF NOT EXISTS sync_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint);
+ALTER TABLE fake_ref_building_categories ADD COLUMN IF NOT EXISTS sync_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint);
+ALTER TABLE fake_ref_work_categories ADD COLUMN IF NOT EXISTS sync_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint);
+ALTER TABLE fake_ref_professions ADD COLUMN IF NOT EXISTS sync_xid BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text::bigint);
+
+-- Parcours par curseur (sync_xid, id) ; index (updated_at, id) d'une version antérieure du flux supprimés s'ils existent
+DROP INDEX IF EXISTS ix_fake_clients_updated_at_id;
+DROP INDEX IF EXISTS ix_fake_construction_sites_updated_at_id;
+DROP INDEX IF EXISTS ix_fake_client_contracts_updated_at_id;
+DROP INDEX IF EXISTS ix_fake_claims_updated_at_id;
+CREATE INDEX IF NOT EXISTS ix_fake_clients_sync_xid_id ON fake_clients (sync_xid, id);
+CREATE INDEX IF NOT EXISTS ix_fake_construction_sites_sync_xid_id ON fake_construction_sites (sync_xid, id);
+CREATE INDEX IF NOT EXISTS ix_fake_client_contracts_sync_xid_id ON fake_client_contracts (sync_xid, id);
+CREATE INDEX IF NOT EXISTS ix_fake_claims_sync_xid_id ON fake_claims (sync_xid, id);
+
+-- Suppressions physiques remises au flux
+CREATE TABLE IF NOT EXISTS fake_sync_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    entity VARCHAR(40) NOT NULL,
+    entity_id INTEGER NOT NULL,
+    sync_xid BIGINT NOT NULL,
+    deleted_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_fake_sync_tombstones_entity_sync_xid_id ON fake_sync_tombstones (entity, sync_xid, id);
@@ -0,0 +1,255 @@
+"""
+Cumuls catastrophe naturelle : exposition assurée par département x zone sismique x zone inondable.
+
+Exposition d'un chantier (contrats actifs qui le couvrent) :
+- brute : somme des montants assurés des contrats et des plafonds de leurs garanties incluses
+- nette : la même somme plafonnée à la valeur du chantier (valeur du projet, à défaut coût de
+  construction). Plusieurs contrats sur un même chantier (DO, RC décennale de chaque
+  intervenant...) ne peuvent pas indemniser au-delà de l'ouvrage : le chantier n'est compté
+  qu'une fois dans le cumul.
+
+- fake_site_exposures : exposition de chaque chantier couvert, avec sa cellule de cumul
+- fake_accumulation_cells : cumul par cellule, maintenu par différence (anciennes valeurs des
+  chantiers retirées, nouvelles ajoutées)
+- fake_accumulation_changes : chantiers à recalculer, alimentée par des triggers de niveau
+  instruction sur les chantiers, les contrats, leurs garanties et le plafond par défaut des
+  garanties du référentiel
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.snapshots import Snapshot
+
+# Période d'application des modifications en tâche de fond (secondes)
+ACCUMULATION_REFRESH_SECONDS = 60
+
+# Au-delà de ce nombre de chantiers modifiés, une reconstruction complète est plus rapide
+ACCUMULATION_INCREMENTAL_MAX = 50000
+
+# Verrou consultatif : un seul processus met à jour les cumuls à la fois
+ACCUMULATION_ADVISORY_LOCK = 4103
+
+# Département non renseigné ; zone sismique non renseignée (zones 1 à 5)
+UNKNOWN = "non_renseigne"
+UNKNOWN_SEISMIC_ZONE = 0
+
+
+# =============================================================================
+# SUIVI DES MODIFICATIONS
+# =============================================================================
+
+# Tables suivies : colonnes dont la modification change l'exposition, chantier concerné
+# et jointure nécessaire pour le retrouver ({r} : alias de la table de transition)
+_TRACKED = {
+    "fake_construction_sites": {
+        "columns": ("department", "seismic_zone", "flood_zone", "construction_cost", "total_project_value", "is_active"),
+        "site": "{r}.id",
+        "join": "",
+    },
+    "fake_client_contracts": {
+        "columns": ("construction_site_id", "status", "insured_amount"),
+        "site": "{r}.construction_site_id",
+        "join": "",
+    },
+    "fake_contract_guarantees": {
+        "columns": ("contract_id", "guarantee_id", "custom_ceiling", "is_included"),
+        "site": "{r}_contract.construction_site_id",
+        "join": "JOIN fake_client_contracts {r}_contract ON {r}_contract.id = {r}.contract_id",
+    },
+    # Plafond par défaut : retenu pour les garanties de contrat sans plafond personnalisé
+    "fake_ref_guarantees": {
+        "columns": ("default_ceiling",),
+        "site": "{r}_contract.construction_site_id",
+        "join": (
+            "JOIN fake_contract_guarantees {r}_cg ON {r}_cg.guarantee_id = {r}.id AND {r}_cg.custom_ceiling IS NULL "
+            "JOIN fake_client_contracts {r}_contract ON {r}_contract.id = {r}_cg.contract_id"
+        ),
+    },
+}
+
+
+def _log_changes_function(table: str) -> str:
+    """Fonction trigger notant les chantiers dont l'exposition a pu changer"""
+    tracked = _TRACKED[table]
+    site = lambda r: tracked["site"].format(r=r)
+    join = lambda r: tracked["join"].format(r=r)
+    old_values = ", ".join(f"o.{column}" for column in tracked["columns"])
+    new_values = ", ".join(f"n.{column}" for column in tracked["columns"])
+    changed = "old_rows o JOIN new_rows n ON n.id = o.id"
+    return f"""
+    CREATE OR REPLACE FUNCTION {table}_log_accumulation() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        -- DO UPDATE et non DO NOTHING : la ligne déjà notée est verrouillée jusqu'au commit, une
+        -- mise à jour concurrente (DELETE ... RETURNING) attend donc et relit les données validées
+        IF TG_OP = 'TRUNCATE' THEN
+            DELETE FROM fake_accumulation_cells;
+            DELETE FROM fake_site_exposures;
+            DELETE FROM fake_accumulation_changes;
+        ELSIF TG_OP = 'INSERT' THEN
+            INSERT INTO fake_accumulation_changes (site_id)
+            SELECT DISTINCT {site("n")} FROM new_rows n {join("n")}
+            WHERE {site("n")} IS NOT NULL
+            ON CONFLICT (site_id) DO UPDATE SET site_id = excluded.site_id;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO fake_accumulation_changes (site_id)
+            SELECT DISTINCT {site("o")} FROM old_rows o {join("o")}
+            WHERE {site("o")} IS NOT NULL
+            ON CONFLICT (site_id) DO UPDATE SET site_id = excluded.site_id;
+        ELSE
+            -- Chantier avant et après (un contrat peut changer de chantier)
+            INSERT INTO fake_accumulation_changes (site_id)
+            SELECT DISTINCT site_id FROM (
+                SELECT {site("o")} AS site_id FROM {changed} {join("o")}
+                WHERE ({old_values}) IS DISTINCT FROM ({new_values})
+                UNION ALL
+                SELECT {site("n")} FROM {changed} {join("n")}
+                WHERE ({old_values}) IS DISTINCT FROM ({new_values})
+            ) touched
+            WHERE site_id IS NOT NULL
+            ON CONFLICT (site_id) DO UPDATE SET site_id = excluded.site_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """
+
+
+def create_accumulation_triggers(connection) -> None:
+    """Crée les fonctions et triggers de suivi absents (tables créées par create_all)"""
+    for table in _TRACKED:
+        connection.execute(text(_log_changes_function(table)))
+        # Un trigger par événement : les tables de transition n'acceptent qu'un seul événement
+        for event, transition in (
+            ("INSERT", "REFERENCING NEW TABLE AS new_rows"),
+            ("UPDATE", "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "REFERENCING OLD TABLE AS old_rows"),
+            ("TRUNCATE", ""),
+        ):
+            name = f"{table}_accumulation_{event.lower()}"
+            exists = connection.execute(text("SELECT 1 FROM pg_trigger WHERE tgname = :name"), {"name": name}).first()
+            if not exists:
+                connection.execute(text(
+                    f"CREATE TRIGGER {name} AFTER {event} ON {table} {transition} "
+                    f"FOR EACH STATEMENT EXECUTE FUNCTION {table}_log_accumulation()"
+                ))
+
+
+# =============================================================================
+# EXPOSITION PAR CHANTIER ET CUMULS
+# =============================================================================
+
+# Exposition des chantiers actifs couverts par au moins un contrat actif
+_SITE_EXPOSURES = f"""
+    SELECT s.id AS site_id,
+           coalesce(s.department, '{UNKNOWN}') AS department,
+           coalesce(s.seismic_zone, {UNKNOWN_SEISMIC_ZONE}) AS seismic_zone,
+           coalesce(s.flood_zone, false) AS flood_zone,
+           count(*) AS contracts_count,
+           coalesce(sum(c.insured_amount), 0) AS insured_amount_gross,
+           coalesce(sum(gc.ceiling), 0) AS guarantee_ceiling_gross,
+           nullif(coalesce(s.total_project_value, s.construction_cost), 0) AS site_value
+    FROM fake_construction_sites s
+    JOIN fake_client_contracts c ON c.construction_site_id = s.id AND c.status = 'actif'
+    LEFT JOIN LATERAL (
+        SELECT sum(coalesce(cg.custom_ceiling, g.default_ceiling)) AS ceiling
+        FROM fake_contract_guarantees cg
+        LEFT JOIN fake_ref_guarantees g ON g.id = cg.guarantee_id
+        WHERE cg.contract_id = c.id AND cg.is_included IS NOT FALSE
+    ) gc ON true
+    WHERE s.is_active IS NOT FALSE {{sites_filter}}
+    GROUP BY s.id
+"""
+
+_EXPOSURE_COLUMNS = """
+    site_id, department, seismic_zone, flood_zone, contracts_count, site_value,
+    insured_amount_gross, guarantee_ceiling_gross, insured_amount, guarantee_ceiling
+"""
+
+# Valeurs nettes : plafonnées à la valeur du chantier quand elle est connue
+_INSERT_EXPOSURES = f"""
+    INSERT INTO fake_site_exposures ({_EXPOSURE_COLUMNS})
+    SELECT site_id, department, seismic_zone, flood_zone, contracts_count, site_value,
+           insured_amount_gross, guarantee_ceiling_gross,
+           CASE WHEN site_value IS NULL THEN insured_amount_gross ELSE least(insured_amount_gross, site_value) END,
+           CASE WHEN site_value IS NULL THEN guarantee_ceiling_gross ELSE least(guarantee_ceiling_gross, site_value) END
+    FROM ({_SITE_EXPOSURES}) exposures
+"""
+
+# Ajout (sign = 1) ou retrait (sign = -1) de chantiers aux cumuls de leurs cellules
+_APPLY_TO_CELLS = """
+    WITH {cte}
+    INSERT INTO fake_accumulation_cells AS cell (
+        department, seismic_zone, flood_zone, sites_count, shared_sites_count, contracts_count,
+        insured_amount_gross, guarantee_ceiling_gross, insured_amount, guarantee_ceiling, updated_at
+    )
+    SELECT department, seismic_zone, flood_zone,
+           {sign} * count(*), {sign} * count(*) FILTER (WHERE contracts_count > 1), {sign} * sum(contracts_count),
+           {sign} * sum(insured_amount_gross), {sign} * sum(guarantee_ceiling_gross),
+           {sign} * sum(insured_amount), {sign} * sum(guarantee_ceiling), now()
+    FROM changed
+    GROUP BY department, seismic_zone, flood_zone
+    ON CONFLICT (department, seismic_zone, flood_zone) DO UPDATE SET
+        sites_count = cell.sites_count + excluded.sites_count,
+        shared_sites_count = cell.shared_sites_count + excluded.shared_sites_count,
+        contracts_count = cell.contracts_count + excluded.contracts_count,
+        insured_amount_gross = cell.insured_amount_gross + excluded.insured_amount_gross,
+        guarantee_ceiling_gross = cell.guarantee_ceiling_gross + excluded.guarantee_ceiling_gross,
+        insured_amount = cell.insured_amount + excluded.insured_amount,
+        guarantee_ceiling = cell.guarantee_ceiling + excluded.guarantee_ceiling,
+        updated_at = excluded.updated_at
+"""
+
+_RETURNING = f"RETURNING {_EXPOSURE_COLUMNS}"
+
+
+def _rebuild_all(db: Session) -> None:
+    db.execute(text("DELETE FROM fake_accumulation_changes"))
+    db.execute(text("DELETE FROM fake_accumulation_cells"))
+    db.execute(text("DELETE FROM fake_site_exposures"))
+    db.execute(text(_APPLY_TO_CELLS.format(
+        cte=f"changed AS ({_INSERT_EXPOSURES.format(sites_filter='')} {_RETURNING})", sign=1
+    )))
+
+
+def _refresh_sites(db: Session, site_ids: list) -> None:
+    """Retire les chantiers modifiés de leurs cellules, recalcule leur exposition et la rajoute"""
+    params = {"site_ids": site_ids}
+    db.execute(text(_APPLY_TO_CELLS.format(
+        cte=f"changed AS (DELETE FROM fake_site_exposures WHERE site_id = ANY(:site_ids) {_RETURNING})", sign=-1
+    )), params)
+    db.execute(text(_APPLY_TO_CELLS.format(
+        cte=f"changed AS ({_INSERT_EXPOSURES.format(sites_filter='AND s.id = ANY(:site_ids)')} {_RETURNING})", sign=1
+    )), params)
+    db.execute(text("DELETE FROM fake_accumulation_cells WHERE sites_count <= 0"))
+
+
+def refresh_accumulation(db: Session, force: bool = False) -> dict:
+    """
+    Applique aux cumuls les modifications en attente (reconstruction complète si force, si les
+    cumuls sont vides ou si trop de chantiers ont changé). Ne fait rien si un autre processus
+    met déjà les cumuls à jour.
+    """
+    pending = db.execute(text("""
+        SELECT EXISTS (SELECT 1 FROM fake_accumulation_changes),
+               NOT EXISTS (SELECT 1 FROM fake_site_exposures)
+               AND EXISTS (SELECT 1 FROM fake_client_contracts WHERE construction_site_id IS NOT NULL AND status = 'actif')
+    """)).one()
+    if not (force or any(pending)):
+        db.rollback()
+        return {"rebuilt": False, "changed_sites": 0}
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ACCUMULATION_ADVISORY_LOCK}).scalar():
+        db.rollback()
+        return {"skipped": "mise à jour en cours dans un autre processus"}
+    
+    site_ids = db.execute(text("DELETE FROM fake_accumulation_changes RETURNING site_id")).scalars().all()
+    rebuild = force or pending[1] or len(site_ids) > ACCUMULATION_INCREMENTAL_MAX
+    if rebuild:
+        _rebuild_all(db)
+    elif site_ids:
+        _refresh_sites(db, site_ids)
+    db.commit()
+    return {"rebuilt": rebuild, "changed_sites": len(site_ids)}
+
+
+ACCUMULATION_SNAPSHOT = Snapshot("accumulation", refresh_accumulation, ACCUMULATION_REFRESH_SECONDS)
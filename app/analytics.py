@@ -0,0 +1,191 @@
+"""
+Vues matérialisées analytiques : volumes de primes, coût des sinistres, exposition.
+
+Les endpoints /analytics/* ne lisent que ces agrégats ; les requêtes BI ne parcourent plus
+les tables de production. Les vues sont rafraîchies en tâche de fond (REFRESH ... CONCURRENTLY,
+sans bloquer les lectures), et seulement lorsque leurs tables sources ont changé.
+"""
+import json
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import column, table, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models import AnalyticsRefreshModel
+from app.snapshots import Snapshot
+
+# Période de vérification / rafraîchissement des vues (secondes)
+ANALYTICS_REFRESH_SECONDS = 300
+
+# Verrou consultatif : un seul processus rafraîchit les vues à la fois
+ANALYTICS_ADVISORY_LOCK = 4101
+
+# Valeur des dimensions non renseignées (les clés de l'index unique ne doivent pas être NULL)
+UNKNOWN = "non_renseigne"
+
+
+# =============================================================================
+# DÉFINITION DES VUES
+# =============================================================================
+
+ANALYTICS_VIEWS = {
+    "analytics_premium_monthly": {
+        "sources": ("fake_client_contracts",),
+        "keys": ("contract_type_code", "status", "month"),
+        "sql": f"""
+            SELECT coalesce(contract_type_code, '{UNKNOWN}') AS contract_type_code,
+                   coalesce(status::text, '{UNKNOWN}') AS status,
+                   date_trunc('month', coalesce(effective_date, issue_date, created_at::date, current_date))::date AS month,
+                   count(*) AS contracts_count,
+                   coalesce(sum(annual_premium), 0) AS annual_premium,
+                   coalesce(sum(total_premium), 0) AS total_premium,
+                   coalesce(sum(insured_amount), 0) AS insured_amount
+            FROM fake_client_contracts
+            GROUP BY 1, 2, 3
+        """,
+    },
+    "analytics_claims_monthly": {
+        "sources": ("fake_claims",),
+        "keys": ("claim_type", "severity", "month"),
+        "sql": f"""
+            SELECT coalesce(claim_type::text, '{UNKNOWN}') AS claim_type,
+                   coalesce(severity::text, '{UNKNOWN}') AS severity,
+                   date_trunc('month', coalesce(declaration_date, incident_date, created_at, now()))::date AS month,
+                   count(*) AS claims_count,
+                   count(*) FILTER (WHERE status IN ('declare', 'pris_en_compte', 'en_cours_expertise', 'attente_pieces', 'accepte')) AS open_claims,
+                   coalesce(sum(estimated_amount), 0) AS estimated_amount,
+                   coalesce(sum(expert_amount), 0) AS expert_amount,
+                   coalesce(sum(indemnity_amount), 0) AS indemnity_amount,
+                   coalesce(sum(reserve_amount), 0) AS reserve_amount,
+                   coalesce(sum(indemnity_amount), 0) + coalesce(sum(reserve_amount), 0) AS incurred_amount
+            FROM fake_claims
+            GROUP BY 1, 2, 3
+        """,
+    },
+    "analytics_exposure": {
+        "sources": ("fake_construction_sites", "fake_client_contracts"),
+        "keys": ("building_category_code", "work_category_code"),
+        "sql": f"""
+            SELECT coalesce(s.building_category_code, '{UNKNOWN}') AS building_category_code,
+                   coalesce(s.work_category_code, '{UNKNOWN}') AS work_category_code,
+                   count(*) AS sites_count,
+                   coalesce(sum(c.active_contracts), 0)::bigint AS active_contracts,
+                   coalesce(sum(c.insured_amount), 0) AS insured_amount,
+                   coalesce(sum(c.annual_premium), 0) AS annual_premium,
+                   coalesce(sum(s.construction_cost), 0) AS construction_cost,
+                   coalesce(sum(s.total_project_value), 0) AS total_project_value
+            FROM fake_construction_sites s
+            LEFT JOIN (
+                SELECT construction_site_id, count(*) AS active_contracts,
+                       sum(insured_amount) AS insured_amount, sum(annual_premium) AS annual_premium
+                FROM fake_client_contracts
+                WHERE status = 'actif'
+                GROUP BY construction_site_id
+            ) c ON c.construction_site_id = s.id
+            GROUP BY 1, 2
+        """,
+    },
+}
+
+# Vues exposées en lecture (Core, sans modèle ORM : create_all ne doit pas les créer)
+premium_monthly = table(
+    "analytics_premium_monthly",
+    column("contract_type_code"), column("status"), column("month"), column("contracts_count"),
+    column("annual_premium"), column("total_premium"), column("insured_amount"),
+)
+claims_monthly = table(
+    "analytics_claims_monthly",
+    column("claim_type"), column("severity"), column("month"), column("claims_count"), column("open_claims"),
+    column("estimated_amount"), column("expert_amount"), column("indemnity_amount"), column("reserve_amount"),
+    column("incurred_amount"),
+)
+exposure = table(
+    "analytics_exposure",
+    column("building_category_code"), column("work_category_code"), column("sites_count"),
+    column("active_contracts"), column("insured_amount"), column("annual_premium"), column("construction_cost"),
+    column("total_project_value"),
+)
+
+
+def create_analytics_views(connection) -> None:
+    """Crée les vues absentes et leur index unique (requis par REFRESH ... CONCURRENTLY)"""
+    for name, view in ANALYTICS_VIEWS.items():
+        connection.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {view['sql']}"))
+        connection.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{name} ON {name} ({', '.join(view['keys'])})"
+        ))
+
+
+# =============================================================================
+# RAFRAÎCHISSEMENT
+# =============================================================================
+
+def _source_versions(db: Session) -> dict:
+    """Version de chaque table source : nombre de lignes et dernière modification"""
+    tables = sorted({source for view in ANALYTICS_VIEWS.values() for source in view["sources"]})
+    rows = db.execute(text(" UNION ALL ".join(
+        f"SELECT '{name}', count(*), max(updated_at) FROM {name}" for name in tables
+    ))).all()
+    return {name: [count, last_update.isoformat() if last_update else None] for name, count, last_update in rows}
+
+
+def _refresh_state(db: Session) -> dict:
+    """Dernier rafraîchissement de chaque vue, enregistré en base par le processus qui l'a fait"""
+    return {
+        row.view_name: {
+            "version": row.source_version,
+            "refreshed_at": row.refreshed_at,
+            "duration_ms": row.duration_ms,
+        }
+        for row in db.query(AnalyticsRefreshModel).all()
+    }
+
+
+def _views_status(state: dict) -> dict:
+    return {
+        name: {"refreshed_at": state[name]["refreshed_at"], "duration_ms": state[name]["duration_ms"]}
+        for name in ANALYTICS_VIEWS if name in state
+    }
+
+
+def refresh_analytics_views(db: Session, force: bool = False) -> dict:
+    """
+    Rafraîchit (CONCURRENTLY) les vues dont une table source a changé depuis le dernier passage.
+    
+    Les versions rafraîchies sont enregistrées dans fake_analytics_refreshes, dans la transaction
+    du rafraîchissement : un seul processus (verrou consultatif) rafraîchit pour tous les workers.
+    Si un autre processus rafraîchit déjà, retourne l'état du dernier passage terminé.
+    """
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ANALYTICS_ADVISORY_LOCK}).scalar():
+        state = _refresh_state(db)
+        db.rollback()
+        return {"skipped": "rafraîchissement en cours dans un autre processus", "views": _views_status(state)}
+    
+    versions = _source_versions(db)
+    state = _refresh_state(db)
+    for name, view in ANALYTICS_VIEWS.items():
+        version = json.dumps([versions[source] for source in view["sources"]])
+        previous = state.get(name)
+        if force or previous is None or previous["version"] != version:
+            start = time.perf_counter()
+            db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+            state[name] = {
+                "version": version,
+                "refreshed_at": datetime.now(timezone.utc),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+            stmt = pg_insert(AnalyticsRefreshModel).values(
+                view_name=name, source_version=version,
+                refreshed_at=state[name]["refreshed_at"], duration_ms=state[name]["duration_ms"]
+            )
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[AnalyticsRefreshModel.view_name],
+                set_={column: stmt.excluded[column] for column in ("source_version", "refreshed_at", "duration_ms")}
+            ))
+    db.commit()
+    return {"views": _views_status(state)}
+
+
+ANALYTICS_SNAPSHOT = Snapshot("analytics", refresh_analytics_views, ANALYTICS_REFRESH_SECONDS)
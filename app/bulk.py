@@ -0,0 +1,308 @@
+"""Import en masse : upsert sur clé métier par lots d'instructions multi-lignes"""
+import json
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+# Nombre de lignes par instruction INSERT ... ON CONFLICT (une transaction par lot)
+BULK_CHUNK_SIZE = 1000
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+
+
+# =============================================================================
+# LECTURE DU FLUX (TABLEAU JSON OU NDJSON)
+# =============================================================================
+
+def _parse_ndjson_line(index: int, line: bytes) -> tuple:
+    try:
+        return index, json.loads(line), None
+    except ValueError as e:
+        return index, None, f"JSON invalide : {e}"
+
+
+async def iter_request_rows(request: Request) -> AsyncIterator[tuple]:
+    """
+    Lit les lignes du corps de la requête : (index, données, erreur).
+    
+    Un flux NDJSON est lu au fil de l'eau (une ligne JSON par enregistrement),
+    un tableau JSON est chargé en une fois.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    
+    if content_type in NDJSON_CONTENT_TYPES:
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield _parse_ndjson_line(index, line)
+                    index += 1
+        if buffer.strip():
+            yield _parse_ndjson_line(index, buffer)
+        return
+    
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Corps JSON invalide")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Un tableau JSON ou un flux NDJSON est attendu")
+    for index, item in enumerate(payload):
+        yield index, item, None
+
+
+# =============================================================================
+# UPSERT PAR LOT
+# =============================================================================
+
+def _key_text(value) -> Optional[str]:
+    """Clé métier renvoyée dans le rapport, telle que reçue (nombre compris)"""
+    return None if value is None else str(value)
+
+
+class BulkUpserter:
+    """
+    Upsert en masse d'une entité sur sa clé métier.
+    
+    - `references` : clés étrangères vérifiées par lot, {champ: modèle référencé}
+    - `lookups` : clés métier acceptées à la place d'une clé étrangère,
+      {champ métier: (champ FK, colonne métier du modèle référencé)}
+    
+    Une ligne nouvelle est créée avec les valeurs par défaut du schéma ; une ligne
+    existante ne reçoit que les champs fournis (les autres colonnes sont conservées).
+    """
+    
+    def __init__(self, model, key: str, create_schema, references: Optional[dict] = None, lookups: Optional[dict] = None):
+        self.model = model
+        self.key = key
+        self.create_schema = create_schema
+        self.references = references or {}
+        self.lookups = lookups or {}
+        # Valeurs par défaut déclarées côté Python (Column(default=...)) : l'instruction SQL ne les applique pas
+        self.column_defaults = {
+            column.name: column.default.arg
+            for column in model.__table__.c
+            if column.default is not None and column.default.is_scalar
+        }
+    
+    def _resolve_lookups(self, db: Session, rows: list) -> None:
+        """Remplace les clés métier de référence par les identifiants (une requête par référence)"""
+        for natural_field, (fk_field, natural_column) in self.lookups.items():
+            wanted = {
+                str(data[natural_field]) for _, data, _ in rows
+                if isinstance(data, dict) and data.get(natural_field) and data.get(fk_field) is None
+            }
+            if not wanted:
+                continue
+            ids = dict(
+                db.query(natural_column, natural_column.class_.id).filter(natural_column.in_(wanted)).all()
+            )
+            for _, data, _ in rows:
+                if isinstance(data, dict) and data.get(fk_field) is None and data.get(natural_field):
+                    data[fk_field] = ids.get(str(data[natural_field]))
+    
+    def _missing_references(self, db: Session, values: list) -> dict:
+        """Identifiants référencés inexistants, par champ (une requête par référence)"""
+        missing = {}
+        for field, ref_model in self.references.items():
+            wanted = {row[field] for row in values if row.get(field) is not None}
+            if not wanted:
+                continue
+            found = {row_id for (row_id,) in db.query(ref_model.id).filter(ref_model.id.in_(wanted)).all()}
+            missing[field] = wanted - found
+        return missing
+    
+    def upsert_chunk(self, db: Session, rows: list) -> list:
+        """Valide puis upsert un lot de lignes (index, données, erreur) ; retourne le statut par ligne"""
+        results = {}
+        pending = {}  # clé métier -> (index, valeurs)
+        
+        self._resolve_lookups(db, rows)
+        
+        for index, data, error in rows:
+            if error is None and not isinstance(data, dict):
+                error = "Un objet JSON est attendu"
+            if error is None:
+                for natural_field, (fk_field, _) in self.lookups.items():
+                    if data.get(fk_field) is None and data.get(natural_field):
+                        error = f"{natural_field} inconnu : {data[natural_field]}"
+            if error is not None:
+                key = _key_text(data.get(self.key)) if isinstance(data, dict) else None
+                results[index] = {"index": index, "key": key, "status": "invalid", "detail": error}
+                continue
+            
+            try:
+                validated = self.create_schema.model_validate(data)
+            except ValidationError as e:
+                results[index] = {"index": index, "key": _key_text(data.get(self.key)), "status": "invalid", "detail": str(e)}
+                continue
+            
+            # Valeurs sérialisables en JSON (énumérations par leur valeur, dates ISO)
+            values = validated.model_dump(mode="json")
+            # Champs fournis : les seuls mis à jour sur une ligne existante
+            fields = frozenset(validated.model_fields_set)
+            key = values[self.key]
+            # Une même instruction ne peut pas modifier deux fois la même ligne : la dernière occurrence l'emporte
+            if key in pending:
+                previous_index, _, _ = pending[key]
+                results[previous_index] = {
+                    "index": previous_index, "key": key, "status": "duplicate",
+                    "detail": "Remplacée par une occurrence ultérieure dans le même lot"
+                }
+            pending[key] = (index, values, fields)
+        
+        missing = self._missing_references(db, [values for _, values, _ in pending.values()])
+        for key, (index, values, _) in list(pending.items()):
+            for field, ids in missing.items():
+                if values.get(field) in ids:
+                    results[index] = {"index": index, "key": key, "status": "invalid", "detail": f"{field} inconnu : {values[field]}"}
+                    del pending[key]
+                    break
+        
+        if pending:
+            results.update(self._execute_upsert(db, pending))
+        
+        return [results[index] for index in sorted(results)]
+    
+    def _upsert_statement(self, columns: tuple, fields: frozenset):
+        """
+        INSERT ... SELECT FROM json_populate_recordset ON CONFLICT (clé métier) DO UPDATE
+        des seuls champs fournis.
+        
+        Le lot est transmis en un seul paramètre JSON, converti par PostgreSQL selon les types
+        de la table : l'instruction reste petite quel que soit le lot (un paramètre par valeur
+        coûte plus cher à construire et à analyser que l'écriture elle-même).
+        """
+        table = self.model.__table__
+        names = ", ".join(columns)
+        updates = [column for column in columns if column in fields and column not in (self.key, "created_at")]
+        assignments = ", ".join(f"{column} = excluded.{column}" for column in updates + ["updated_at"])
+        # xmax = 0 : ligne insérée ; sinon ligne existante mise à jour
+        return text(f"""
+            INSERT INTO {table.name} ({names})
+            SELECT {names} FROM json_populate_recordset(NULL::{table.name}, CAST(:rows AS json))
+            ON CONFLICT ({self.key}) DO UPDATE SET {assignments}
+            RETURNING id, {self.key}, xmax = 0 AS inserted
+        """)
+    
+    def _write(self, db: Session, pending: dict, fields: frozenset, keys: list, now: str) -> list:
+        """Upsert des lignes `keys` en une instruction ; retourne les lignes RETURNING"""
+        rows = [dict(self.column_defaults, **pending[key][1], created_at=now, updated_at=now) for key in keys]
+        return db.execute(self._upsert_statement(tuple(rows[0]), fields), {"rows": json.dumps(rows)}).all()
+    
+    def _execute_upsert(self, db: Session, pending: dict) -> dict:
+        """
+        Une instruction par ensemble de champs fournis, puis commit du lot.
+        
+        Si le lot échoue en base (chaîne trop longue, contrainte CHECK...), il est repris par
+        moitiés, chacune sous un point de sauvegarde, jusqu'aux lignes fautives : seules
+        celles-ci sont en erreur, les autres sont écrites.
+        """
+        now = datetime.utcnow().isoformat()
+        groups = {}
+        for key, (_, _, fields) in pending.items():
+            groups.setdefault(fields, []).append(key)
+        
+        returned = []
+        try:
+            for fields, keys in groups.items():
+                returned.extend(self._write(db, pending, fields, keys, now))
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            return self._execute_isolating(db, pending, groups, now)
+        
+        return self._row_results(pending, returned)
+    
+    def _execute_isolating(self, db: Session, pending: dict, groups: dict, now: str) -> dict:
+        """Reprise d'un lot en échec : lignes fautives isolées par dichotomie, un seul commit"""
+        results = {}
+        returned = []
+        
+        def write_or_split(fields: frozenset, keys: list) -> None:
+            try:
+                with db.begin_nested():
+                    returned.extend(self._write(db, pending, fields, keys, now))
+                return
+            except SQLAlchemyError as e:
+                if len(keys) == 1:
+                    index = pending[keys[0]][0]
+                    detail = str(getattr(e, "orig", None) or e)
+                    results[index] = {"index": index, "key": keys[0], "status": "error", "detail": detail}
+                    return
+            half = len(keys) // 2
+            write_or_split(fields, keys[:half])
+            write_or_split(fields, keys[half:])
+        
+        for fields, keys in groups.items():
+            write_or_split(fields, keys)
+        try:
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            detail = str(getattr(e, "orig", None) or e)
+            for key, (index, _, _) in pending.items():
+                results.setdefault(index, {"index": index, "key": key, "status": "error", "detail": detail})
+            return results
+        
+        results.update(self._row_results(pending, returned))
+        return results
+    
+    @staticmethod
+    def _row_results(pending: dict, returned: list) -> dict:
+        """Statut des lignes écrites d'après RETURNING"""
+        results = {}
+        for row in returned:
+            key = row[1]
+            index, _, _ = pending[key]
+            results[index] = {
+                "index": index, "key": key, "id": row.id,
+                "status": "created" if row.inserted else "updated"
+            }
+        return results
+
+
+async def run_bulk_upsert(
+    request: Request,
+    db: Session,
+    upserter: BulkUpserter,
+    errors_only: bool = False,
+    chunk_size: int = BULK_CHUNK_SIZE
+) -> dict:
+    """Lit le flux et l'upsert par lots ; les lots sont traités hors de la boucle d'événements"""
+    results = []
+    counts = {"created": 0, "updated": 0, "invalid": 0, "duplicates": 0, "failed": 0}
+    total = 0
+    
+    async def flush(chunk: list) -> None:
+        for result in await run_in_threadpool(upserter.upsert_chunk, db, chunk):
+            status = result["status"]
+            if status in ("created", "updated", "invalid"):
+                counts[status] += 1
+            elif status == "duplicate":
+                counts["duplicates"] += 1
+            elif status == "error":
+                counts["failed"] += 1
+            if not errors_only or status not in ("created", "updated"):
+                results.append(result)
+    
+    chunk = []
+    async for row in iter_request_rows(request):
+        chunk.append(row)
+        total += 1
+        if len(chunk) >= chunk_size:
+            await flush(chunk)
+            chunk = []
+    if chunk:
+        await flush(chunk)
+    
+    return {"total": total, **counts, "results": results}
@@ -0,0 +1,424 @@
+"""
+Cache de réponses partagé entre les processus (workers uvicorn).
+
+Deux implémentations de la même interface, choisies par CACHE_URL :
+- MemoryCache (CACHE_URL vide ou memory://) : LRU dans le processus, bornée en octets ;
+  suffit avec un seul worker ou en développement
+- RedisCache (redis://, rediss://, unix://) : serveur compatible Redis (Redis, Valkey, KeyDB...)
+  commun à tous les workers et instances ; la mémoire est bornée côté serveur
+  (maxmemory + politique d'éviction LRU)
+
+Chaque entrée est un JSON déjà sérialisé (bytes) avec une durée de vie et des étiquettes
+d'invalidation (par ex. "client:42") : une écriture invalide toutes les entrées de l'étiquette.
+Chaque étiquette a une génération, incrémentée à chaque invalidation : une valeur calculée
+pendant une invalidation (génération changée depuis le début du calcul) n'est pas enregistrée.
+Un serveur de cache indisponible ne fait pas échouer les requêtes : lecture manquée, écriture ignorée.
+Compteurs par processus (hits, misses, sets, invalidations, evictions, errors) exposés par /health.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+from urllib.parse import urlparse
+
+from fastapi import Response
+
+from app.config import settings
+from app.rows import to_json
+
+# Durée de vie par défaut d'une entrée (secondes)
+CACHE_DEFAULT_TTL = 300
+
+# Durée de vie maximale : les ensembles d'étiquettes (Redis) vivent au moins aussi longtemps que leurs clés
+CACHE_MAX_TTL = 86400
+
+# Taille maximale du cache mémoire (octets, valeurs et clés)
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Taille maximale d'une valeur : au-delà, elle n'est pas mise en cache
+CACHE_MAX_VALUE_BYTES = 1024 * 1024
+
+# Préfixe des clés (base Redis partagée avec d'autres applications)
+CACHE_KEY_PREFIX = "sma_dwh:"
+
+# Délai maximal d'une opération sur le serveur de cache (secondes)
+CACHE_SOCKET_TIMEOUT = 0.25
+
+# Après une erreur, le serveur de cache n'est pas réinterrogé pendant ce délai (secondes)
+CACHE_RETRY_SECONDS = 5
+
+# Étiquette commune à toutes les vues client (invalidation globale après un import ou un upsert en masse)
+CLIENTS_TAG = "clients"
+
+# Nombre maximal de générations d'étiquettes tenues par le cache mémoire (au-delà, remise à zéro)
+CACHE_MAX_GENERATIONS = 100000
+
+# Surcoût estimé d'une entrée du cache mémoire (dictionnaires, tuple, étiquettes)
+_ENTRY_OVERHEAD = 200
+
+
+def client_tag(client_id) -> str:
+    """Étiquette des entrées qui dépendent d'un client (adresses, contrats et chantiers compris)"""
+    return f"client:{client_id}"
+
+
+class CacheBackend:
+    """
+    Interface commune : get / generations / set / delete / invalidate / clear, et compteurs.
+    Les implémentations fournissent _get, _generations, _set, _delete, _invalidate, _clear et _info.
+    """
+    
+    name = "abstract"
+    
+    def __init__(self):
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            "hits": 0, "misses": 0, "sets": 0, "skipped": 0, "discarded": 0,
+            "invalidations": 0, "evictions": 0, "errors": 0
+        }
+        self._down_until = 0.0
+        self.last_error: Optional[str] = None
+    
+    def _count(self, metric: str, value: int = 1) -> None:
+        with self._metrics_lock:
+            self.metrics[metric] += value
+    
+    def _available(self) -> bool:
+        return time.monotonic() >= self._down_until
+    
+    def _failed(self, error: Exception) -> None:
+        # Un cache indisponible ne fait pas échouer la requête : on le contourne quelques secondes
+        self._count("errors")
+        self.last_error = str(error)
+        self._down_until = time.monotonic() + CACHE_RETRY_SECONDS
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Valeur de la clé, ou None (absente, expirée ou cache indisponible)"""
+        value = None
+        if self._available():
+            try:
+                value = self._get(key)
+            except Exception as e:
+                self._failed(e)
+        self._count("misses" if value is None else "hits")
+        return value
+    
+    def generations(self, tags: Iterable[str]) -> Optional[tuple]:
+        """Générations des étiquettes, à lire avant le calcul d'une valeur (None : cache indisponible)"""
+        if not self._available():
+            return None
+        try:
+            return self._generations(tuple(tags))
+        except Exception as e:
+            self._failed(e)
+            return None
+    
+    def set(
+        self, key: str, value: bytes, ttl: float = CACHE_DEFAULT_TTL, tags: Iterable[str] = (),
+        generations: Optional[tuple] = None
+    ) -> None:
+        """
+        Enregistre une valeur pour ttl secondes, rattachée aux étiquettes. Avec `generations`
+        (lues avant le calcul), la valeur est écartée si l'une des étiquettes a été invalidée depuis.
+        """
+        if len(value) > CACHE_MAX_VALUE_BYTES or not self._available():
+            self._count("skipped")
+            return
+        try:
+            stored = self._set(key, value, min(ttl, CACHE_MAX_TTL), tuple(tags), generations)
+        except Exception as e:
+            self._failed(e)
+            return
+        self._count("sets" if stored else "discarded")
+    
+    def delete(self, key: str) -> None:
+        try:
+            self._delete(key)
+        except Exception as e:
+            self._failed(e)
+    
+    def invalidate(self, *tags: str) -> int:
+        """Supprime les entrées rattachées à l'une des étiquettes ; retourne leur nombre"""
+        if not tags:
+            return 0
+        try:
+            removed = self._invalidate(tags)
+        except Exception as e:
+            # Tentée même si le cache est marqué indisponible : une invalidation perdue laisse
+            # des données périmées jusqu'à expiration
+            self._failed(e)
+            return 0
+        self._count("invalidations", removed)
+        return removed
+    
+    def clear(self) -> None:
+        try:
+            self._clear()
+        except Exception as e:
+            self._failed(e)
+    
+    def stats(self) -> dict:
+        """Compteurs du processus et état du backend"""
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        lookups = metrics["hits"] + metrics["misses"]
+        stats = {
+            "backend": self.name,
+            **metrics,
+            "hit_ratio": round(metrics["hits"] / lookups, 4) if lookups else None,
+        }
+        if self._available():
+            try:
+                stats.update(self._info())
+            except Exception as e:
+                # Informations facultatives (INFO absent de certains serveurs compatibles)
+                stats["info_error"] = str(e)
+        if self.last_error:
+            stats["last_error"] = self.last_error
+        return stats
+    
+    def _get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+    
+    def _generations(self, tags: tuple) -> tuple:
+        raise NotImplementedError
+    
+    def _set(self, key: str, value: bytes, ttl: float, tags: tuple, generations: Optional[tuple]) -> bool:
+        """Enregistre la valeur, atomiquement avec la vérification des générations ; False si écartée"""
+        raise NotImplementedError
+    
+    def _delete(self, key: str) -> None:
+        raise NotImplementedError
+    
+    def _invalidate(self, tags: tuple) -> int:
+        raise NotImplementedError
+    
+    def _clear(self) -> None:
+        raise NotImplementedError
+    
+    def _info(self) -> dict:
+        return {}
+
+
+class MemoryCache(CacheBackend):
+    """LRU dans le processus, bornée en octets ; index étiquette -> clés tenu à jour à chaque suppression"""
+    
+    name = "memory"
+    
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # clé -> (expiration, valeur, étiquettes)
+        self._tags = {}                # étiquette -> ensemble de clés
+        self._generations_by_tag = {}  # étiquette -> nombre d'invalidations
+        self._epoch = 0                # Incrémenté à la remise à zéro des générations
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def _get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def _generations(self, tags: tuple) -> tuple:
+        with self._lock:
+            return self._current_generations(tags)
+    
+    def _current_generations(self, tags: tuple) -> tuple:
+        return (self._epoch, *(self._generations_by_tag.get(tag, 0) for tag in tags))
+    
+    def _set(self, key: str, value: bytes, ttl: float, tags: tuple, generations: Optional[tuple]) -> bool:
+        with self._lock:
+            if generations is not None and generations != self._current_generations(tags):
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            self._size += len(key) + len(value) + _ENTRY_OVERHEAD
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            # Éviction des entrées les moins récemment lues
+            evicted = 0
+            while self._size > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+        if evicted:
+            self._count("evictions", evicted)
+        return True
+    
+    def _remove(self, key: str) -> None:
+        _, value, tags = self._entries.pop(key)
+        self._size -= len(key) + len(value) + _ENTRY_OVERHEAD
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+    
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+    
+    def _invalidate(self, tags: tuple) -> int:
+        with self._lock:
+            if len(self._generations_by_tag) + len(tags) > CACHE_MAX_GENERATIONS:
+                # Générations oubliées : les calculs en cours, quelles que soient leurs étiquettes, sont écartés
+                self._generations_by_tag.clear()
+                self._epoch += 1
+            for tag in tags:
+                self._generations_by_tag[tag] = self._generations_by_tag.get(tag, 0) + 1
+            keys = set()
+            for tag in tags:
+                keys.update(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+    
+    def _clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._size = 0
+    
+    def _info(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "size_bytes": self._size, "max_bytes": self.max_bytes}
+
+
+class RedisCache(CacheBackend):
+    """
+    Serveur compatible Redis. Une entrée : SET clé valeur PX ttl ; chaque étiquette est un
+    ensemble (SADD) des clés rattachées, invalidé par SMEMBERS puis DEL des clés et de l'ensemble,
+    et un compteur de génération (INCR avant la suppression des clés). La mise en cache vérifie
+    les générations sous WATCH / MULTI : une invalidation concurrente fait échouer la transaction.
+    Commandes de base uniquement (pas de scripts Lua) : compatible avec les serveurs de substitution.
+    """
+    
+    name = "redis"
+    
+    def __init__(self, url: str, prefix: str = CACHE_KEY_PREFIX):
+        super().__init__()
+        # Dépendance chargée seulement si un serveur de cache est configuré
+        import redis
+        
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(
+            url,
+            socket_timeout=CACHE_SOCKET_TIMEOUT,
+            socket_connect_timeout=CACHE_SOCKET_TIMEOUT,
+            health_check_interval=30
+        )
+    
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+    
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+    
+    def _generation_key(self, tag: str) -> str:
+        return f"{self.prefix}gen:{tag}"
+    
+    def _get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self._key(key))
+    
+    def _generations(self, tags: tuple) -> tuple:
+        if not tags:
+            return ()
+        return tuple(int(raw or 0) for raw in self._client.mget([self._generation_key(tag) for tag in tags]))
+    
+    def _set(self, key: str, value: bytes, ttl: float, tags: tuple, generations: Optional[tuple]) -> bool:
+        import redis
+        
+        with self._client.pipeline(transaction=True) as pipe:
+            try:
+                if generations is not None and tags:
+                    generation_keys = [self._generation_key(tag) for tag in tags]
+                    pipe.watch(*generation_keys)
+                    current = tuple(int(raw or 0) for raw in pipe.mget(generation_keys))
+                    if current != generations:
+                        return False
+                    pipe.multi()
+                pipe.set(self._key(key), value, px=max(int(ttl * 1000), 1))
+                for tag in tags:
+                    # L'ensemble vit au moins aussi longtemps que la plus longue de ses clés
+                    pipe.sadd(self._tag_key(tag), key)
+                    pipe.expire(self._tag_key(tag), CACHE_MAX_TTL)
+                pipe.execute()
+            except redis.WatchError:
+                return False
+        return True
+    
+    def _delete(self, key: str) -> None:
+        self._client.delete(self._key(key))
+    
+    def _invalidate(self, tags: tuple) -> int:
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        pipe = self._client.pipeline(transaction=False)
+        # Génération incrémentée avant la lecture des clés : un calcul concurrent ne sera pas enregistré
+        for tag in tags:
+            pipe.incr(self._generation_key(tag))
+            pipe.expire(self._generation_key(tag), CACHE_MAX_TTL)
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        keys = set()
+        for members in pipe.execute()[2 * len(tags):]:
+            keys.update(member.decode() for member in members)
+        # Les membres expirés entre-temps ne comptent pas : DEL retourne les clés réellement supprimées
+        removed = self._client.delete(*(self._key(key) for key in keys)) if keys else 0
+        self._client.delete(*tag_keys)
+        return removed
+    
+    def _clear(self) -> None:
+        keys = list(self._client.scan_iter(match=self.prefix + "*", count=1000))
+        for start in range(0, len(keys), 1000):
+            self._client.delete(*keys[start:start + 1000])
+    
+    def _info(self) -> dict:
+        memory = self._client.info("memory")
+        return {
+            "used_memory": memory.get("used_memory"),
+            "maxmemory": memory.get("maxmemory"),
+            "maxmemory_policy": memory.get("maxmemory_policy"),
+        }
+
+
+def create_cache(url: Optional[str]) -> CacheBackend:
+    """Backend correspondant à l'URL (vide ou memory:// : mémoire du processus)"""
+    scheme = urlparse(url).scheme if url else "memory"
+    if scheme == "memory":
+        return MemoryCache()
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisCache(url)
+    raise ValueError(f"CACHE_URL : schéma non géré ({scheme}), memory:// ou redis:// attendu")
+
+
+cache = create_cache(settings.CACHE_URL)
+
+
+def cached_response(key: str, compute: Callable[[], object], ttl: float = CACHE_DEFAULT_TTL, tags: Iterable[str] = ()) -> Response:
+    """
+    Réponse JSON servie depuis le cache, ou calculée, sérialisée puis mise en cache.
+    Une exception de compute (404...) n'est pas mise en cache, ni une valeur dont une étiquette
+    a été invalidée pendant le calcul. En-tête X-Cache : HIT ou MISS.
+    """
+    content = cache.get(key)
+    if content is not None:
+        return Response(content=content, media_type="application/json", headers={"X-Cache": "HIT"})
+    tags = tuple(tags)
+    generations = cache.generations(tags)
+    content = to_json(compute()).encode("utf-8")
+    cache.set(key, content, ttl, tags, generations)
+    return Response(content=content, media_type="application/json", headers={"X-Cache": "MISS"})
+
+
+def invalidate_clients(*client_ids) -> None:
+    """Invalide les vues des clients indiqués (ignorés : None)"""
+    cache.invalidate(*{client_tag(client_id) for client_id in client_ids if client_id is not None})
@@ -1,25 +1,192 @@
 """Configuration de la base de données"""
-from sqlalchemy import create_engine
+import threading
+import time
+from contextlib import suppress
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.config import settings
+from app.config import POOL_MIN_CONNECTIONS, settings
+
+# Part des connexions d'un worker ouvertes seulement en pic (max_overflow), fermées ensuite
+POOL_OVERFLOW_RATIO = 0.25
+
+# Verrou consultatif : une seule initialisation du schéma à la fois (workers démarrés ensemble)
+INIT_DB_ADVISORY_LOCK = 4100
+
+
+def pool_options(workers: int, budget: int) -> dict:
+    """
+    Taille du pool de chaque processus : le budget global de connexions (par serveur PostgreSQL)
+    est réparti entre les workers, dont une part d'ouverture en pic (overflow).
+    Lève ValueError si le budget ne couvre pas le minimum de chaque worker.
+    """
+    workers = max(workers, 1)
+    if workers * POOL_MIN_CONNECTIONS > budget:
+        raise ValueError(
+            f"DATABASE_CONNECTION_BUDGET={budget} insuffisant pour {workers} workers "
+            f"({POOL_MIN_CONNECTIONS} connexions minimum chacun, soit {workers * POOL_MIN_CONNECTIONS}) : "
+            f"réduire WEB_CONCURRENCY ou augmenter le budget (et max_connections de PostgreSQL)"
+        )
+    per_worker = budget // workers
+    overflow = int(per_worker * POOL_OVERFLOW_RATIO)
+    return {"pool_size": per_worker - overflow, "max_overflow": overflow}
+
+
+POOL_OPTIONS = pool_options(settings.WEB_CONCURRENCY, settings.DATABASE_CONNECTION_BUDGET)
 
 # Moteur SQLAlchemy
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
-    echo=True  # Active les logs SQL (désactiver en production)
+    echo=settings.SQL_ECHO,  # Logs SQL (désactivés en mode serveur de production)
+    **POOL_OPTIONS
 )
 
+# Moteur de la réplique en lecture ; sans réplique configurée, le primaire lui-même
+replica_engine = create_engine(
+    settings.DATABASE_REPLICA_URL,
+    pool_pre_ping=True,
+    connect_args={"connect_timeout": 2},  # Réplique injoignable : repli rapide sur le primaire
+    echo=settings.SQL_ECHO,
+    **POOL_OPTIONS
+) if settings.DATABASE_REPLICA_URL else engine
+
 # Session locale
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Session sur la réplique (lecture seule)
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
 # Base pour les modèles
 Base = declarative_base()
 
 
-def get_db():
-    """Dépendance pour obtenir une session de base de données"""
+# =============================================================================
+# ROUTAGE PRIMAIRE / RÉPLIQUE
+# =============================================================================
+
+# Au-delà de ce retard de rejeu, la réplique n'est plus utilisée (secondes). C'est aussi la durée
+# de vie du cookie de lecture-après-écriture : passé ce délai, une réplique utilisable a rejoué l'écriture
+REPLICA_MAX_LAG_SECONDS = 30
+
+# Durée de validité de l'état de la réplique gardé en mémoire (secondes)
+REPLICA_STATUS_TTL_SECONDS = 1.0
+
+# Délai avant une nouvelle tentative lorsque la réplique est injoignable (secondes)
+REPLICA_RETRY_SECONDS = 10
+
+# Position WAL (LSN) de la dernière écriture du client : une lecture ne va sur la réplique
+# qu'une fois cette position rejouée (cookie posé après chaque écriture, ou en-tête renvoyé par le client)
+READ_YOUR_WRITES_COOKIE = "primary_lsn"
+READ_YOUR_WRITES_HEADER = "X-Primary-LSN"
+
+# Méthodes servies par la réplique
+READ_METHODS = ("GET", "HEAD")
+
+_REPLICA_STATUS_SQL = text("""
+    SELECT pg_is_in_recovery() AS in_recovery,
+           pg_last_wal_replay_lsn()::text AS replay_lsn,
+           CASE WHEN pg_last_wal_receive_lsn() IS NULL OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+           END AS lag_seconds
+""")
+
+_replica_status = {"checked_at": None}
+_replica_status_lock = threading.Lock()
+
+
+def replica_configured() -> bool:
+    return replica_engine is not engine
+
+
+def parse_lsn(value: Optional[str]) -> Optional[int]:
+    """Position WAL 'X/Y' (hexadécimal) en entier comparable, None si invalide"""
+    try:
+        high, low = value.split("/")
+        return (int(high, 16) << 32) + int(low, 16)
+    except (AttributeError, ValueError):
+        return None
+
+
+def current_wal_lsn() -> Optional[str]:
+    """Position WAL courante du primaire"""
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()
+
+
+def replica_status(max_age: float = REPLICA_STATUS_TTL_SECONDS) -> dict:
+    """
+    État de la réplique (available, in_recovery, replay_lsn, lag_seconds), mesuré au plus une fois
+    par max_age secondes (REPLICA_RETRY_SECONDS si elle était injoignable). Une base qui n'est pas en recovery (configuration pointant sur le primaire)
+    est à jour par définition.
+    """
+    with _replica_status_lock:
+        checked_at = _replica_status["checked_at"]
+        if not _replica_status.get("available", True):
+            max_age = max(max_age, REPLICA_RETRY_SECONDS)
+        if checked_at is not None and time.monotonic() - checked_at < max_age:
+            return dict(_replica_status)
+        try:
+            with replica_engine.connect() as connection:
+                row = connection.execute(_REPLICA_STATUS_SQL).one()
+            status = {
+                "available": True,
+                "in_recovery": row.in_recovery,
+                "replay_lsn": row.replay_lsn,
+                "lag_seconds": round(float(row.lag_seconds or 0), 3),
+                "error": None,
+            }
+        except Exception as e:
+            status = {"available": False, "in_recovery": None, "replay_lsn": None, "lag_seconds": None,
+                      "error": f"{type(e).__name__}: {e}"}
+        _replica_status.clear()
+        _replica_status.update(status, checked_at=time.monotonic())
+        return dict(_replica_status)
+
+
+def _replica_up_to(status: dict, required_lsn: Optional[int]) -> bool:
+    if not status["available"] or status["lag_seconds"] > REPLICA_MAX_LAG_SECONDS:
+        return False
+    replay_lsn = parse_lsn(status["replay_lsn"])
+    return required_lsn is None or replay_lsn is None or replay_lsn >= required_lsn
+
+
+def replica_usable(required_lsn: Optional[int] = None) -> bool:
+    """La réplique est joignable, peu en retard, et a rejoué la position required_lsn"""
+    if not replica_configured():
+        return False
+    status = replica_status()
+    if required_lsn is not None and status["available"] and not _replica_up_to(status, required_lsn):
+        # L'état en mémoire peut précéder le rejeu de l'écriture attendue : nouvelle mesure
+        status = replica_status(max_age=0)
+    return _replica_up_to(status, required_lsn)
+
+
+def read_session():
+    """Session pour une lecture sans exigence de fraîcheur (rapports, instantanés) : réplique si utilisable"""
+    return ReplicaSessionLocal() if replica_usable() else SessionLocal()
+
+
+def get_db(request: Request):
+    """
+    Dépendance pour obtenir une session de base de données : réplique pour les lectures (GET, HEAD),
+    primaire pour les écritures et pour les lectures qui suivent une écriture non encore rejouée
+    """
+    use_replica = request.method in READ_METHODS and replica_usable(parse_lsn(
+        request.headers.get(READ_YOUR_WRITES_HEADER) or request.cookies.get(READ_YOUR_WRITES_COOKIE)
+    ))
+    db = ReplicaSessionLocal() if use_replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_primary_db():
+    """Dépendance : session sur le primaire, quelle que soit la méthode (lectures qui écrivent)"""
     db = SessionLocal()
     try:
         yield db
@@ -27,7 +194,40 @@ def get_db():
         db.close()
 
 
+def replica_health() -> dict:
+    """Retard de la réplique pour /health : secondes de rejeu et octets de WAL non rejoués"""
+    if not replica_configured():
+        return {"configured": False}
+    status = replica_status(max_age=0)
+    report = {
+        "configured": True,
+        "available": status["available"],
+        "in_recovery": status["in_recovery"],
+        "replay_lsn": status["replay_lsn"],
+        "lag_seconds": status["lag_seconds"],
+        "lag_bytes": None,
+        "serving_reads": _replica_up_to(status, None),
+    }
+    if status["error"]:
+        report["error"] = status["error"]
+    replay_lsn = parse_lsn(status["replay_lsn"])
+    if replay_lsn is not None:
+        with suppress(Exception):
+            report["lag_bytes"] = max(parse_lsn(current_wal_lsn()) - replay_lsn, 0)
+    return report
+
+
 def init_db():
-    """Initialise la base de données (crée les tables)"""
+    """Initialise la base de données (crée les tables) ; les initialisations concurrentes s'attendent"""
     import app.models  # Import nécessaire pour que SQLAlchemy découvre les modèles
-    Base.metadata.create_all(bind=engine)
+    from app.accumulation import create_accumulation_triggers
+    from app.analytics import create_analytics_views
+    from app.site_tiles import create_site_tiles_triggers
+    from app.sync_feed import create_sync_triggers
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": INIT_DB_ADVISORY_LOCK})
+        Base.metadata.create_all(bind=connection)
+        create_analytics_views(connection)
+        create_site_tiles_triggers(connection)
+        create_accumulation_triggers(connection)
+        create_sync_triggers(connection)
@@ -0,0 +1,136 @@
+"""
+Impact d'un événement (tempête, inondation...) : contrats actifs dont le risque est situé dans
+une emprise, avec montant assuré et sinistres ouverts.
+
+Une seule requête ensembliste : chantiers (et, pour les contrats sans chantier, adresses des
+clients) dans l'emprise via l'index GiST de position, jointure aux contrats actifs et aux
+sinistres ouverts agrégés par contrat. Le résultat est diffusé ligne à ligne (curseur serveur),
+les totaux étant calculés au fil de l'eau et envoyés en fin de réponse.
+"""
+from typing import Iterator
+
+from sqlalchemy import String, cast, func, literal, select, union_all
+
+from app.database import read_session
+from app.geo import within_footprint
+from app.models import ClaimModel, ClientAddressModel, ClientContractModel, ConstructionSiteModel
+from app.rows import to_json
+from app.statistics import OPEN_CLAIM_STATUSES
+
+# Lignes lues par aller-retour avec la base pendant la diffusion
+EVENT_IMPACT_BATCH_SIZE = 2000
+
+
+def impact_statement(footprint: dict, include_addresses: bool = True):
+    """Contrats actifs localisés dans l'emprise, avec leurs sinistres ouverts"""
+    contract, site, address, claim = ClientContractModel, ConstructionSiteModel, ClientAddressModel, ClaimModel
+    
+    located = select(
+        contract.id.label("contract_id"),
+        literal("site").label("location_type"),
+        site.id.label("location_id"),
+        site.site_reference.label("location_reference"),
+        site.city, site.department, site.latitude, site.longitude
+    ).join_from(site, contract, contract.construction_site_id == site.id).where(
+        contract.status == "actif",
+        site.is_active.isnot(False),
+        within_footprint(site, footprint)
+    )
+    if include_addresses:
+        # Contrats sans chantier : une adresse du client dans l'emprise (principale en priorité)
+        by_address = select(
+            contract.id.label("contract_id"),
+            literal("address").label("location_type"),
+            address.id.label("location_id"),
+            cast(address.address_type, String).label("location_reference"),
+            address.city, address.department, address.latitude, address.longitude
+        ).join_from(address, contract, contract.client_id == address.client_id).where(
+            contract.status == "actif",
+            contract.construction_site_id.is_(None),
+            address.is_active.isnot(False),
+            within_footprint(address, footprint)
+        ).distinct(contract.id).order_by(contract.id, address.is_primary.desc(), address.id)
+        located = union_all(located, select(by_address.subquery()))
+    located = located.cte("located")
+    
+    open_claims = select(
+        claim.contract_id,
+        func.count().label("open_claims_count"),
+        func.coalesce(func.sum(claim.estimated_amount), 0).label("open_claims_estimated"),
+        func.coalesce(func.sum(claim.reserve_amount), 0).label("open_claims_reserve")
+    ).where(
+        claim.status.in_(OPEN_CLAIM_STATUSES),
+        claim.contract_id.in_(select(located.c.contract_id))
+    ).group_by(claim.contract_id).subquery("open_claims")
+    
+    return select(
+        contract.contract_number,
+        contract.contract_type_code,
+        contract.client_id,
+        contract.insured_amount,
+        located.c.location_type,
+        located.c.location_id,
+        located.c.location_reference,
+        located.c.city,
+        located.c.department,
+        located.c.latitude,
+        located.c.longitude,
+        func.coalesce(open_claims.c.open_claims_count, 0).label("open_claims_count"),
+        func.coalesce(open_claims.c.open_claims_estimated, 0).label("open_claims_estimated"),
+        func.coalesce(open_claims.c.open_claims_reserve, 0).label("open_claims_reserve")
+    ).join_from(located, contract, contract.id == located.c.contract_id).outerjoin(
+        open_claims, open_claims.c.contract_id == contract.id
+    ).order_by(located.c.department, contract.contract_number)
+
+
+def iter_event_impact(footprint: dict, include_addresses: bool = True) -> Iterator[str]:
+    """
+    Réponse JSON diffusée : {"footprint": ..., "contracts": [...], "summary": {...}}.
+    Utilise sa propre session (réplique si utilisable) : la réponse est diffusée après la fermeture
+    de celle de la requête.
+    """
+    summary = {
+        "contracts_count": 0, "sites_count": 0, "addresses_count": 0, "insured_amount": 0.0,
+        "open_claims_count": 0, "open_claims_estimated": 0.0, "open_claims_reserve": 0.0,
+        "by_department": {},
+    }
+    locations = {"site": set(), "address": set()}
+    db = read_session()
+    try:
+        yield '{"footprint":' + to_json(footprint) + ',"contracts":['
+        result = db.execute(
+            impact_statement(footprint, include_addresses).execution_options(
+                stream_results=True, yield_per=EVENT_IMPACT_BATCH_SIZE
+            )
+        )
+        keys = list(result.keys())
+        separator = ""
+        for partition in result.partitions():
+            chunk = []
+            for row in partition:
+                item = dict(zip(keys, row))
+                chunk.append(to_json(item))
+                insured = item["insured_amount"] or 0
+                locations[item["location_type"]].add(item["location_id"])
+                summary["contracts_count"] += 1
+                summary["insured_amount"] += insured
+                summary["open_claims_count"] += item["open_claims_count"]
+                summary["open_claims_estimated"] += item["open_claims_estimated"]
+                summary["open_claims_reserve"] += item["open_claims_reserve"]
+                department = summary["by_department"].setdefault(
+                    item["department"] or "non_renseigne", {"contracts_count": 0, "insured_amount": 0.0}
+                )
+                department["contracts_count"] += 1
+                department["insured_amount"] += insured
+            yield separator + ",".join(chunk)
+            separator = ","
+        
+        summary["sites_count"] = len(locations["site"])
+        summary["addresses_count"] = len(locations["address"])
+        for name in ("insured_amount", "open_claims_estimated", "open_claims_reserve"):
+            summary[name] = round(summary[name], 2)
+        for department in summary["by_department"].values():
+            department["insured_amount"] = round(department["insured_amount"], 2)
+        yield '],"summary":' + to_json(summary) + "}"
+    finally:
+        db.close()
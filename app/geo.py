@@ -0,0 +1,164 @@
+"""
+Requêtes géographiques sur les chantiers et les adresses (rayon, rectangle).
+
+Sans PostGIS : les coordonnées restent en colonnes latitude/longitude (float) et sont
+indexées par un index GiST sur l'expression point(longitude, latitude) (type géométrique
+natif de PostgreSQL). Une recherche par rayon filtre d'abord sur le rectangle englobant
+(opérateur <@, servi par l'index), puis calcule la distance orthodromique exacte
+(haversine) sur les seules lignes candidates et trie par distance.
+"""
+import math
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Numeric, cast, func, literal, literal_column, or_
+
+# Rayon terrestre moyen (km)
+EARTH_RADIUS_KM = 6371.0088
+
+# Longueur d'un degré de latitude (km)
+KM_PER_DEGREE = 111.32
+
+# Rayon maximal d'une recherche de proximité (km)
+MAX_RADIUS_KM = 500
+
+# Nombre maximal de sommets d'une emprise GeoJSON (tous anneaux confondus)
+MAX_FOOTPRINT_VERTICES = 20000
+
+
+def location_point(model):
+    """Expression point(longitude, latitude) : identique à celle de l'index GiST du modèle"""
+    return func.point(model.longitude, model.latitude)
+
+
+def radius_bbox(lat: float, lon: float, radius_km: float) -> tuple:
+    """Rectangle (min_lon, min_lat, max_lon, max_lat) englobant un cercle"""
+    lat_delta = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    lon_delta = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return (
+        max(lon - lon_delta, -180.0), max(lat - lat_delta, -90.0),
+        min(lon + lon_delta, 180.0), min(lat + lat_delta, 90.0),
+    )
+
+
+def parse_bbox(bbox: str) -> tuple:
+    """Paramètre bbox=min_lon,min_lat,max_lon,max_lat (ordre GeoJSON)"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox : 4 nombres attendus (min_lon,min_lat,max_lon,max_lat)")
+    if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise HTTPException(status_code=400, detail="bbox : coordonnées hors limites ou inversées")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def within_bbox(model, bbox: tuple):
+    """Filtre « dans le rectangle » servi par l'index GiST (point <@ box)"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return location_point(model).op("<@")(
+        func.box(func.point(min_lon, min_lat), func.point(max_lon, max_lat))
+    )
+
+
+def distance_km(model, lat: float, lon: float):
+    """Distance orthodromique (haversine, km) entre la position du modèle et un point"""
+    lat_rad = func.radians(model.latitude)
+    origin_lat = math.radians(lat)
+    half_dlat = (lat_rad - origin_lat) / 2
+    half_dlon = (func.radians(model.longitude) - math.radians(lon)) / 2
+    haversine = (
+        func.power(func.sin(half_dlat), 2)
+        + math.cos(origin_lat) * func.cos(lat_rad) * func.power(func.sin(half_dlon), 2)
+    )
+    return 2 * literal(EARTH_RADIUS_KM) * func.asin(func.least(1.0, func.sqrt(haversine)))
+
+
+def within_radius(model, lat: float, lon: float, radius_km: float):
+    """Filtre « à moins de radius_km » : rectangle englobant (index GiST) puis distance exacte"""
+    return within_bbox(model, radius_bbox(lat, lon, radius_km)) & (distance_km(model, lat, lon) <= radius_km)
+
+
+def near(statement, model, lat: float, lon: float, radius_km: float):
+    """
+    Restreint un select() aux lignes situées à moins de radius_km du point, triées par distance,
+    et lui ajoute la colonne distance_km (arrondie au mètre)
+    """
+    distance = distance_km(model, lat, lon)
+    return (
+        statement
+        .add_columns(func.round(cast(distance, Numeric), 3).label("distance_km"))
+        .where(within_radius(model, lat, lon, radius_km))
+        .order_by(distance, model.id)
+    )
+
+
+# =============================================================================
+# EMPRISES GEOJSON
+# =============================================================================
+
+def _position(position) -> tuple:
+    try:
+        lon, lat = float(position[0]), float(position[1])
+    except (TypeError, ValueError, IndexError, KeyError):
+        raise HTTPException(status_code=400, detail="GeoJSON : positions [longitude, latitude] attendues")
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise HTTPException(status_code=400, detail="GeoJSON : coordonnées hors limites")
+    return lon, lat
+
+
+def _ring(coordinates) -> list:
+    if not isinstance(coordinates, list) or len(coordinates) < 3:
+        raise HTTPException(status_code=400, detail="GeoJSON : un anneau de polygone compte au moins 3 positions")
+    return [_position(position) for position in coordinates]
+
+
+def parse_footprint(geojson: dict, radius_km: Optional[float] = None) -> dict:
+    """
+    Emprise d'un événement : Polygon / MultiPolygon GeoJSON (géométrie ou Feature), ou Point et
+    rayon (radius_km, ou propriété radius_km de la Feature).
+    Retourne {"type": "circle", lat, lon, radius_km} ou {"type": "polygons", "polygons": [[contour, trous...]]}.
+    """
+    if geojson.get("type") == "Feature":
+        radius_km = radius_km or (geojson.get("properties") or {}).get("radius_km")
+        geojson = geojson.get("geometry") or {}
+    geometry_type = geojson.get("type")
+    coordinates = geojson.get("coordinates")
+    
+    if geometry_type == "Point":
+        if not isinstance(radius_km, (int, float)) or not 0 < radius_km <= MAX_RADIUS_KM:
+            raise HTTPException(status_code=400, detail=f"Point : radius_km requis (0 à {MAX_RADIUS_KM} km)")
+        lon, lat = _position(coordinates)
+        return {"type": "circle", "lat": lat, "lon": lon, "radius_km": float(radius_km)}
+    if geometry_type == "Polygon":
+        polygons = [coordinates]
+    elif geometry_type == "MultiPolygon":
+        polygons = coordinates
+    else:
+        raise HTTPException(status_code=400, detail="GeoJSON : Point (avec radius_km), Polygon ou MultiPolygon attendu")
+    
+    if not isinstance(polygons, list) or not polygons or not all(isinstance(rings, list) and rings for rings in polygons):
+        raise HTTPException(status_code=400, detail="GeoJSON : coordonnées de polygone invalides")
+    polygons = [[_ring(ring) for ring in rings] for rings in polygons]
+    if sum(len(ring) for rings in polygons for ring in rings) > MAX_FOOTPRINT_VERTICES:
+        raise HTTPException(status_code=400, detail=f"GeoJSON : {MAX_FOOTPRINT_VERTICES} sommets maximum")
+    return {"type": "polygons", "polygons": polygons}
+
+
+def _polygon(ring: list):
+    # Littéral construit à partir de nombres validés (float) : pas de texte utilisateur dans la requête
+    return literal_column("'" + ",".join(f"({lon!r},{lat!r})" for lon, lat in ring) + "'::polygon")
+
+
+def within_footprint(model, footprint: dict):
+    """Filtre « dans l'emprise » servi par l'index GiST (point <@ polygon, trous exclus, ou rayon)"""
+    if footprint["type"] == "circle":
+        return within_radius(model, footprint["lat"], footprint["lon"], footprint["radius_km"])
+    point = location_point(model)
+    conditions = []
+    for outer, *holes in footprint["polygons"]:
+        condition = point.op("<@")(_polygon(outer))
+        for hole in holes:
+            condition = condition & ~point.op("<@")(_polygon(hole))
+        conditions.append(condition)
+    return or_(*conditions)
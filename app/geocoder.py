@@ -0,0 +1,411 @@
+"""
+Géocodage hors ligne par code postal et commune.
+
+La table des centroïdes de communes (data/communes.bin) est un fichier binaire compact,
+projeté en mémoire (mmap) : aucun chargement au démarrage, pages partagées entre les
+processus par le cache du système. Elle est construite une fois à partir de la base
+officielle des codes postaux (CSV La Poste / data.gouv.fr) :
+
+    python geocode_backfill.py --build-table laposte_hexasmal.csv
+
+Format (petit-boutiste) : en-tête, tableau des codes postaux (uint32) trié, enregistrements de
+taille fixe dans le même ordre (position, nom), puis les noms. Une recherche est une dichotomie
+(bisect, en C) sur le tableau des codes, lu directement dans la projection.
+
+Précision du résultat :
+- commune : code postal et nom de commune (ou libellé d'acheminement) reconnus
+- code_postal : centroïde des communes du code postal
+- departement : centre du département (repli, code postal inconnu de la table)
+"""
+import csv
+import mmap
+import sys
+import os
+import struct
+import time
+import unicodedata
+from bisect import bisect_left
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+# Table des centroïdes (générée par geocode_backfill.py --build-table)
+GEOCODER_TABLE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "communes.bin")
+
+# Nombre de couples (code postal, ville) gardés en cache (les adresses d'un lot se répètent)
+GEOCODER_CACHE_SIZE = 100000
+
+# Lignes lues puis mises à jour par transaction lors du renseignement des coordonnées
+GEOCODER_BACKFILL_CHUNK_SIZE = 5000
+
+# Précisions, de la plus fine à la plus grossière
+PRECISIONS = ("commune", "code_postal", "departement")
+
+TABLE_MAGIC = b"SGEO"
+TABLE_VERSION = 1
+
+# Magie, version, nombre d'enregistrements, taille du bloc des noms
+_HEADER = struct.Struct("<4sHII")
+
+# Latitude et longitude (micro-degrés), position et longueur du nom
+_RECORD = struct.Struct("<iiIB")
+
+_MICRO_DEGREES = 1e6
+
+
+# Centre approximatif de chaque département (repli lorsque le code postal est absent de la table)
+DEPARTEMENT_GPS = {
+    "01": {"lat": 46.0667, "lon": 5.3333},  # Ain
+    "02": {"lat": 49.5667, "lon": 3.6167},  # Aisne
+    "03": {"lat": 46.5667, "lon": 3.3333},  # Allier
+    "04": {"lat": 44.1000, "lon": 6.2333},  # Alpes-de-Haute-Provence
+    "05": {"lat": 44.6667, "lon": 6.0833},  # Hautes-Alpes
+    "06": {"lat": 43.9333, "lon": 7.2167},  # Alpes-Maritimes
+    "07": {"lat": 44.7333, "lon": 4.6000},  # Ardèche
+    "08": {"lat": 49.7667, "lon": 4.7167},  # Ardennes
+    "09": {"lat": 42.9667, "lon": 1.6000},  # Ariège
+    "10": {"lat": 48.3000, "lon": 4.0833},  # Aube
+    "11": {"lat": 43.2167, "lon": 2.3500},  # Aude
+    "12": {"lat": 44.3500, "lon": 2.5833},  # Aveyron
+    "13": {"lat": 43.5333, "lon": 5.4500},  # Bouches-du-Rhône
+    "14": {"lat": 49.1833, "lon": -0.3667},  # Calvados
+    "15": {"lat": 45.0333, "lon": 2.4333},  # Cantal
+    "16": {"lat": 45.6500, "lon": 0.1500},  # Charente
+    "17": {"lat": 45.7500, "lon": -0.6333},  # Charente-Maritime
+    "18": {"lat": 47.0833, "lon": 2.4000},  # Cher
+    "19": {"lat": 45.2667, "lon": 1.7667},  # Corrèze
+    "21": {"lat": 47.3167, "lon": 5.0167},  # Côte-d'Or
+    "22": {"lat": 48.5167, "lon": -2.7667},  # Côtes-d'Armor
+    "23": {"lat": 46.1667, "lon": 1.8667},  # Creuse
+    "24": {"lat": 45.1833, "lon": 0.7167},  # Dordogne
+    "25": {"lat": 47.2333, "lon": 6.0333},  # Doubs
+    "26": {"lat": 44.7333, "lon": 5.0500},  # Drôme
+    "27": {"lat": 49.0250, "lon": 0.9500},  # Eure
+    "28": {"lat": 48.4472, "lon": 1.4889},  # Eure-et-Loir
+    "29": {"lat": 48.2667, "lon": -4.0833},  # Finistère
+    "30": {"lat": 43.8333, "lon": 4.3667},  # Gard
+    "31": {"lat": 43.6047, "lon": 1.4442},  # Haute-Garonne
+    "32": {"lat": 43.6500, "lon": 0.5833},  # Gers
+    "33": {"lat": 44.8378, "lon": -0.5792},  # Gironde
+    "34": {"lat": 43.6108, "lon": 3.8767},  # Hérault
+    "35": {"lat": 48.1173, "lon": -1.6778},  # Ille-et-Vilaine
+    "36": {"lat": 46.8108, "lon": 1.6900},  # Indre
+    "37": {"lat": 47.3936, "lon": 0.6889},  # Indre-et-Loire
+    "38": {"lat": 45.1885, "lon": 5.7245},  # Isère
+    "39": {"lat": 46.6689, "lon": 5.5550},  # Jura
+    "40": {"lat": 43.8958, "lon": -0.5000},  # Landes
+    "41": {"lat": 47.5889, "lon": 1.3358},  # Loir-et-Cher
+    "42": {"lat": 45.4397, "lon": 4.3872},  # Loire
+    "43": {"lat": 45.0439, "lon": 3.8850},  # Haute-Loire
+    "44": {"lat": 47.2184, "lon": -1.5536},  # Loire-Atlantique
+    "45": {"lat": 47.9028, "lon": 1.9086},  # Loiret
+    "46": {"lat": 44.4472, "lon": 1.4414},  # Lot
+    "47": {"lat": 44.2028, "lon": 0.6197},  # Lot-et-Garonne
+    "48": {"lat": 44.5186, "lon": 3.5008},  # Lozère
+    "49": {"lat": 47.4739, "lon": -0.5542},  # Maine-et-Loire
+    "50": {"lat": 49.1167, "lon": -1.0833},  # Manche
+    "51": {"lat": 48.9569, "lon": 4.3658},  # Marne
+    "52": {"lat": 48.1128, "lon": 5.1397},  # Haute-Marne
+    "53": {"lat": 48.0706, "lon": -0.7703},  # Mayenne
+    "54": {"lat": 48.6844, "lon": 6.1844},  # Meurthe-et-Moselle
+    "55": {"lat": 49.1611, "lon": 5.3847},  # Meuse
+    "56": {"lat": 47.7467, "lon": -2.7597},  # Morbihan
+    "57": {"lat": 49.1197, "lon": 6.1769},  # Moselle
+    "58": {"lat": 47.0000, "lon": 3.5333},  # Nièvre
+    "59": {"lat": 50.6292, "lon": 3.0573},  # Nord
+    "60": {"lat": 49.4167, "lon": 2.0833},  # Oise
+    "61": {"lat": 48.4333, "lon": 0.0833},  # Orne
+    "62": {"lat": 50.5167, "lon": 2.6333},  # Pas-de-Calais
+    "63": {"lat": 45.7667, "lon": 3.0833},  # Puy-de-Dôme
+    "64": {"lat": 43.3000, "lon": -0.3667},  # Pyrénées-Atlantiques
+    "65": {"lat": 43.2333, "lon": 0.0833},  # Hautes-Pyrénées
+    "66": {"lat": 42.5000, "lon": 2.7500},  # Pyrénées-Orientales
+    "67": {"lat": 48.5833, "lon": 7.7500},  # Bas-Rhin
+    "68": {"lat": 47.7500, "lon": 7.3333},  # Haut-Rhin
+    "69": {"lat": 45.7640, "lon": 4.8357},  # Rhône
+    "70": {"lat": 47.6167, "lon": 6.1500},  # Haute-Saône
+    "71": {"lat": 46.6500, "lon": 4.7667},  # Saône-et-Loire
+    "72": {"lat": 48.0061, "lon": 0.1996},  # Sarthe
+    "73": {"lat": 45.5647, "lon": 6.3767},  # Savoie
+    "74": {"lat": 46.0672, "lon": 6.3769},  # Haute-Savoie
+    "75": {"lat": 48.8566, "lon": 2.3522},  # Paris
+    "76": {"lat": 49.4433, "lon": 1.0993},  # Seine-Maritime
+    "77": {"lat": 48.8424, "lon": 2.9978},  # Seine-et-Marne
+    "78": {"lat": 48.8033, "lon": 2.1333},  # Yvelines
+    "79": {"lat": 46.3239, "lon": -0.4642},  # Deux-Sèvres
+    "80": {"lat": 49.8944, "lon": 2.2958},  # Somme
+    "81": {"lat": 43.9286, "lon": 2.1478},  # Tarn
+    "82": {"lat": 44.0167, "lon": 1.3500},  # Tarn-et-Garonne
+    "83": {"lat": 43.4667, "lon": 6.2333},  # Var
+    "84": {"lat": 44.0000, "lon": 5.1333},  # Vaucluse
+    "85": {"lat": 46.6708, "lon": -1.4264},  # Vendée
+    "86": {"lat": 46.5819, "lon": 0.3339},  # Vienne
+    "87": {"lat": 45.8333, "lon": 1.2667},  # Haute-Vienne
+    "88": {"lat": 48.1706, "lon": 6.4514},  # Vosges
+    "89": {"lat": 47.7986, "lon": 3.5672},  # Yonne
+    "90": {"lat": 47.6406, "lon": 6.8631},  # Territoire de Belfort
+    "91": {"lat": 48.6308, "lon": 2.4286},  # Essonne
+    "92": {"lat": 48.8922, "lon": 2.2392},  # Hauts-de-Seine
+    "93": {"lat": 48.9103, "lon": 2.4839},  # Seine-Saint-Denis
+    "94": {"lat": 48.7917, "lon": 2.4856},  # Val-de-Marne
+    "95": {"lat": 49.0400, "lon": 2.1003},  # Val-d'Oise
+}
+
+_ABBREVIATIONS = {"SAINT": "ST", "SAINTE": "STE"}
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Nom de commune comparable : majuscules sans accents ni ponctuation, SAINT(E) abrégé, CEDEX retiré"""
+    ascii_name = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii").upper()
+    words = "".join(char if char.isalnum() else " " for char in ascii_name).split()
+    if "CEDEX" in words:
+        words = words[:words.index("CEDEX")]
+    return " ".join(_ABBREVIATIONS.get(word, word) for word in words)
+
+
+def _postal_code(value) -> Optional[str]:
+    code = "".join(str(value or "").split())
+    if len(code) == 4 and code.isdigit():
+        # Zéro initial perdu par un tableur (01000 -> 1000)
+        code = "0" + code
+    return code if len(code) == 5 and code.isdigit() else None
+
+
+def _department(postal_code: str) -> str:
+    return postal_code[:3] if postal_code.startswith(("97", "98")) else postal_code[:2]
+
+
+# =============================================================================
+# TABLE DES CENTROÏDES
+# =============================================================================
+
+class CentroidTable:
+    """Table des centroïdes de communes, projetée en mémoire (lecture seule)"""
+    
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise ValueError("Table de géocodage : architecture petit-boutiste requise")
+        with open(path, "rb") as table:
+            self._buffer = mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, names_size = _HEADER.unpack_from(self._buffer, 0)
+        if magic != TABLE_MAGIC or version != TABLE_VERSION:
+            raise ValueError(f"{path} : table de géocodage invalide ou d'une autre version")
+        self._records_offset = _HEADER.size + 4 * self.count
+        self._names_offset = self._records_offset + self.count * _RECORD.size
+        if len(self._buffer) != self._names_offset + names_size:
+            raise ValueError(f"{path} : table de géocodage tronquée")
+        self._codes = memoryview(self._buffer)[_HEADER.size:self._records_offset].cast("I")
+    
+    def entries(self, postal_code: int) -> list:
+        """Communes d'un code postal : (nom normalisé, latitude, longitude)"""
+        entries = []
+        index = bisect_left(self._codes, postal_code)
+        while index < self.count and self._codes[index] == postal_code:
+            latitude, longitude, name_offset, name_length = _RECORD.unpack_from(
+                self._buffer, self._records_offset + index * _RECORD.size
+            )
+            start = self._names_offset + name_offset
+            entries.append((
+                self._buffer[start:start + name_length].decode("ascii"),
+                latitude / _MICRO_DEGREES,
+                longitude / _MICRO_DEGREES,
+            ))
+            index += 1
+        return entries
+
+
+@lru_cache(maxsize=1)
+def get_table() -> Optional[CentroidTable]:
+    """Table des centroïdes, ouverte à la première utilisation (None si elle n'a pas été construite)"""
+    if not os.path.exists(GEOCODER_TABLE_PATH):
+        return None
+    return CentroidTable(GEOCODER_TABLE_PATH)
+
+
+@lru_cache(maxsize=GEOCODER_CACHE_SIZE)
+def geocode(postal_code: Optional[str], city: Optional[str] = None) -> Optional[tuple]:
+    """(latitude, longitude, précision) d'un code postal et d'une ville, None si inconnu"""
+    code = _postal_code(postal_code)
+    if code is None:
+        return None
+    
+    table = get_table()
+    entries = table.entries(int(code)) if table is not None else []
+    if entries:
+        name = normalize_name(city)
+        for entry_name, latitude, longitude in entries:
+            if entry_name == name:
+                return latitude, longitude, "commune"
+        # Centroïde des communes du code postal (une commune peut figurer sous plusieurs noms)
+        points = {(latitude, longitude) for _, latitude, longitude in entries}
+        return (
+            round(sum(point[0] for point in points) / len(points), 6),
+            round(sum(point[1] for point in points) / len(points), 6),
+            "code_postal",
+        )
+    
+    department = DEPARTEMENT_GPS.get(_department(code))
+    if department:
+        return department["lat"], department["lon"], "departement"
+    return None
+
+
+# =============================================================================
+# CONSTRUCTION DE LA TABLE
+# =============================================================================
+
+# Colonnes reconnues du CSV source (noms normalisés) : base officielle des codes postaux
+# (La Poste) ou fichier communes-departement-region (data.gouv.fr)
+_SOURCE_NAME_COLUMNS = (
+    "nom_de_la_commune", "nom_commune_postal", "nom_commune", "nom_commune_complet",
+    "libelle_d_acheminement", "libelle_acheminement", "ligne_5",
+)
+_SOURCE_COORDINATES_COLUMNS = ("coordonnees_gps", "coordonnees_geographiques", "geopoint")
+
+
+def _column_key(name: str) -> str:
+    return "_".join(normalize_name(name).lower().split())
+
+
+def _source_coordinates(row: dict, columns: dict) -> Optional[tuple]:
+    try:
+        if "latitude" in columns and "longitude" in columns:
+            latitude, longitude = float(row[columns["latitude"]]), float(row[columns["longitude"]])
+        else:
+            column = next(columns[name] for name in _SOURCE_COORDINATES_COLUMNS if name in columns)
+            latitude, longitude = (float(value) for value in row[column].split(","))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
+
+
+def build_table(source_path: str, path: Optional[str] = None, encoding: str = "utf-8-sig") -> int:
+    """
+    Construit la table des centroïdes à partir d'un CSV (séparateur ; , ou tabulation) comportant
+    le code postal, le nom de la commune et ses coordonnées. Retourne le nombre d'entrées.
+    Chaque nom (commune, libellé d'acheminement, lieu-dit) devient une entrée du code postal.
+    """
+    path = path or GEOCODER_TABLE_PATH
+    entries = {}
+    with open(source_path, newline="", encoding=encoding) as source:
+        dialect = csv.Sniffer().sniff(source.read(65536), delimiters=";,\t")
+        source.seek(0)
+        reader = csv.DictReader(source, dialect=dialect)
+        columns = {_column_key(name): name for name in reader.fieldnames or ()}
+        names = [columns[name] for name in _SOURCE_NAME_COLUMNS if name in columns]
+        if "code_postal" not in columns or not names:
+            raise ValueError("CSV source : colonnes code_postal et nom de commune attendues")
+        if not ({"latitude", "longitude"} <= columns.keys() or any(name in columns for name in _SOURCE_COORDINATES_COLUMNS)):
+            raise ValueError("CSV source : colonnes latitude et longitude (ou coordonnees_gps) attendues")
+        
+        for row in reader:
+            code = _postal_code(row[columns["code_postal"]])
+            coordinates = _source_coordinates(row, columns)
+            if code is None or coordinates is None:
+                continue
+            for column in names:
+                name = normalize_name(row[column])[:255]
+                if name:
+                    entries.setdefault((int(code), name), coordinates)
+    
+    codes = []
+    records = []
+    names_blob = bytearray()
+    for (code, name), (latitude, longitude) in sorted(entries.items()):
+        encoded = name.encode("ascii")
+        codes.append(code)
+        records.append(_RECORD.pack(
+            round(latitude * _MICRO_DEGREES), round(longitude * _MICRO_DEGREES), len(names_blob), len(encoded)
+        ))
+        names_blob += encoded
+    
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as table:
+        table.write(_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, len(records), len(names_blob)))
+        table.write(struct.pack(f"<{len(codes)}I", *codes))
+        table.writelines(records)
+        table.write(names_blob)
+    # Remplacement atomique : un processus qui projette l'ancienne table la conserve jusqu'à son redémarrage
+    os.replace(temporary_path, path)
+    get_table.cache_clear()
+    geocode.cache_clear()
+    return len(records)
+
+
+# =============================================================================
+# RENSEIGNEMENT DES COORDONNÉES
+# =============================================================================
+
+def backfill_coordinates(
+    db: Session,
+    model,
+    chunk_size: int = GEOCODER_BACKFILL_CHUNK_SIZE,
+    overwrite: bool = False,
+    min_precision: str = "code_postal",
+    progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Renseigne latitude / longitude d'une table (adresses ou chantiers) à partir du code postal et de la ville.
+    
+    Parcours par id croissant, chunk_size lignes par transaction, mise à jour du lot en une instruction.
+    Seules les lignes sans coordonnées sont traitées, sauf overwrite ; les résultats moins précis que
+    min_precision sont ignorés. updated_at est mis à jour pour que les clients synchronisés reçoivent la position.
+    """
+    accepted = PRECISIONS[:PRECISIONS.index(min_precision) + 1]
+    statement = select(model.id, model.postal_code, model.city).order_by(model.id).limit(chunk_size)
+    if not overwrite:
+        statement = statement.where(model.latitude.is_(None) | model.longitude.is_(None))
+    update = text(f"""
+        UPDATE {model.__tablename__} AS t
+        SET latitude = v.latitude, longitude = v.longitude, updated_at = :updated_at
+        FROM unnest(
+            CAST(:ids AS integer[]), CAST(:latitudes AS double precision[]), CAST(:longitudes AS double precision[])
+        ) AS v(id, latitude, longitude)
+        WHERE t.id = v.id AND t.id BETWEEN :first_id AND :last_id
+    """)
+    
+    stats = {
+        "table": model.__tablename__, "scanned": 0, "updated": 0, "skipped": 0,
+        "by_precision": {precision: 0 for precision in accepted},
+    }
+    start = time.perf_counter()
+    last_id = 0
+    while True:
+        rows = db.execute(statement.where(model.id > last_id)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        
+        ids, latitudes, longitudes = [], [], []
+        for row in rows:
+            result = geocode(row.postal_code, row.city)
+            if result is None or result[2] not in accepted:
+                stats["skipped"] += 1
+                continue
+            ids.append(row.id)
+            latitudes.append(result[0])
+            longitudes.append(result[1])
+            stats["by_precision"][result[2]] += 1
+        if ids:
+            # Bornes du lot : parcours de l'index de clé primaire au lieu d'une jointure sur toute la table
+            db.execute(update, {
+                "ids": ids, "latitudes": latitudes, "longitudes": longitudes,
+                "first_id": ids[0], "last_id": ids[-1], "updated_at": datetime.utcnow()
+            })
+        db.commit()
+        
+        stats["scanned"] += len(rows)
+        stats["updated"] += len(ids)
+        if progress is not None:
+            progress(stats)
+        if len(rows) < chunk_size:
+            break
+    
+    stats["duration_seconds"] = round(time.perf_counter() - start, 1)
+    return stats
@@ -0,0 +1,81 @@
+"""Requêtes HTTP conditionnelles (ETag / Last-Modified) pour les endpoints de lecture"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func
+
+
+def build_etag(*parts) -> str:
+    """Construit un ETag faible à partir des éléments de version d'une ressource"""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return f'W/"{hashlib.md5(raw.encode("utf-8")).hexdigest()}"'
+
+
+def http_date(value: Optional[datetime]) -> Optional[str]:
+    """Formate une date (UTC naïve en base) au format HTTP"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    """En-têtes de validation à renvoyer avec la ressource (200 ou 304)"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Vérifie If-None-Match (prioritaire) puis If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        # Comparaison faible : on ignore le préfixe W/
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+        # Les dates HTTP ont une précision à la seconde
+        return modified.replace(microsecond=0) <= since
+
+    return False
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime] = None
+) -> Optional[Response]:
+    """
+    Positionne les en-têtes de cache sur la réponse.
+    Retourne une réponse 304 si la version du client est à jour, sinon None.
+    """
+    headers = cache_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def collection_version(query, model) -> tuple:
+    """Version agrégée d'une liste filtrée : (nombre de lignes, dernière mise à jour)"""
+    count, last_update = query.with_entities(
+        func.count(model.id), func.max(model.updated_at)
+    ).order_by(None).one()
+    return count, last_update
@@ -0,0 +1,252 @@
+"""
+Documents composés : ressources liées incluses dans la réponse via ?include=
+
+Exemple : GET /claims/{n}?include=contract.client,contract.construction_site,guarantees
+Chaque relation est résolue par lot (une requête par relation et par niveau, quel que
+soit le nombre d'enregistrements parents) ; la profondeur, le nombre de chemins et le
+nombre total d'enregistrements inclus sont bornés.
+"""
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import schemas
+from app.models import (
+    ClaimModel, ClientAddressModel, ClientContractModel, ClientModel, ConstructionSiteModel, GuaranteeModel
+)
+from app.projections import CLAIM_HEAVY_COLUMNS, defer_heavy_columns
+
+# Bornes du coût d'une inclusion
+INCLUDE_MAX_DEPTH = 3  # contract.client.addresses
+INCLUDE_MAX_PATHS = 10
+INCLUDE_MAX_RECORDS = 500  # Enregistrements inclus au total (toutes relations confondues)
+
+
+# =============================================================================
+# CHARGEURS PAR LOT
+# =============================================================================
+
+def _load_by_id(model, attribute: str):
+    """Relation vers un enregistrement (clé étrangère portée par le parent)"""
+    def load(db: Session, parents: list, limit: int) -> dict:
+        ids = {getattr(parent, attribute) for parent in parents} - {None}
+        if not ids:
+            return {}
+        related = {record.id: record for record in db.query(model).filter(model.id.in_(ids)).all()}
+        return {parent.id: related.get(getattr(parent, attribute)) for parent in parents}
+    return load
+
+
+def _load_children(model, foreign_key: str, order_by, options: Callable = None):
+    """Relation vers une liste d'enregistrements (clé étrangère portée par l'enfant)"""
+    def load(db: Session, parents: list, limit: int) -> dict:
+        column = getattr(model, foreign_key)
+        query = db.query(model).filter(column.in_([parent.id for parent in parents]))
+        if options:
+            query = options(query)
+        children = {parent.id: [] for parent in parents}
+        for record in query.order_by(column, order_by).limit(limit).all():
+            children[getattr(record, foreign_key)].append(record)
+        return children
+    return load
+
+
+def _load_contract_guarantees(db: Session, parents: list, limit: int) -> dict:
+    """Garanties des contrats (jointure sur guarantee_id, index couvrant)"""
+    rows = db.execute(text("""
+        SELECT cg.id, cg.contract_id, coalesce(g.code, cg.guarantee_code) AS code, g.name,
+               cg.custom_ceiling, cg.custom_franchise, cg.is_included, cg.annual_premium, cg.updated_at
+        FROM fake_contract_guarantees cg
+        LEFT JOIN fake_ref_guarantees g ON g.id = cg.guarantee_id
+        WHERE cg.contract_id = ANY(:contract_ids)
+        ORDER BY cg.contract_id, 2
+        LIMIT :limit
+    """), {"contract_ids": [parent.id for parent in parents], "limit": limit})
+    guarantees = {parent.id: [] for parent in parents}
+    for row in rows:
+        guarantees[row.contract_id].append(row)
+    return guarantees
+
+
+def _load_activated_guarantees(db: Session, parents: list, limit: int) -> dict:
+    """Garanties du référentiel activées sur les sinistres"""
+    codes = {code for parent in parents for code in (parent.activated_guarantees or [])}
+    if not codes:
+        return {parent.id: [] for parent in parents}
+    related = {
+        record.code: record
+        for record in db.query(GuaranteeModel).filter(GuaranteeModel.code.in_(codes)).limit(limit).all()
+    }
+    return {
+        parent.id: [related[code] for code in (parent.activated_guarantees or []) if code in related]
+        for parent in parents
+    }
+
+
+# =============================================================================
+# GRAPHE DES RELATIONS
+# =============================================================================
+
+def _serialize_contract_guarantee(row) -> dict:
+    return {
+        "code": row.code,
+        "name": row.name or row.code,
+        "ceiling": row.custom_ceiling,
+        "franchise": row.custom_franchise,
+        "included": bool(row.is_included),
+        "annual_premium": row.annual_premium,
+    }
+
+
+# Sérialisation d'un enregistrement inclus, par type de ressource
+SERIALIZERS = {
+    "claim": lambda record: jsonable_encoder(schemas.ClaimSummary.from_orm(record)),
+    "contract": lambda record: jsonable_encoder(schemas.ClientContract.from_orm(record)),
+    "client": lambda record: jsonable_encoder(schemas.Client.from_orm(record)),
+    "address": lambda record: jsonable_encoder(schemas.ClientAddress.from_orm(record)),
+    "site": lambda record: jsonable_encoder(schemas.ConstructionSite.from_orm(record)),
+    "guarantee": lambda record: jsonable_encoder(schemas.Guarantee.from_orm(record)),
+    "contract_guarantee": _serialize_contract_guarantee,
+}
+
+# Relations disponibles par type de ressource : nom -> (type cible, liste ?, chargeur)
+RELATIONS = {
+    "claim": {
+        "contract": ("contract", False, _load_by_id(ClientContractModel, "contract_id")),
+        "construction_site": ("site", False, _load_by_id(ConstructionSiteModel, "construction_site_id")),
+        "guarantees": ("guarantee", True, _load_activated_guarantees),
+    },
+    "contract": {
+        "client": ("client", False, _load_by_id(ClientModel, "client_id")),
+        "construction_site": ("site", False, _load_by_id(ConstructionSiteModel, "construction_site_id")),
+        "guarantees": ("contract_guarantee", True, _load_contract_guarantees),
+        "claims": ("claim", True, _load_children(
+            ClaimModel, "contract_id", ClaimModel.declaration_date.desc(),
+            lambda query: defer_heavy_columns(query, ClaimModel, CLAIM_HEAVY_COLUMNS, [])
+        )),
+    },
+    "client": {
+        "contracts": ("contract", True, _load_children(ClientContractModel, "client_id", ClientContractModel.id)),
+        "addresses": ("address", True, _load_children(ClientAddressModel, "client_id", ClientAddressModel.id)),
+    },
+    "site": {},
+    "address": {},
+    "guarantee": {},
+    "contract_guarantee": {},
+}
+
+
+# =============================================================================
+# RÉSOLUTION
+# =============================================================================
+
+def parse_include(include: Optional[str], resource: str) -> dict:
+    """
+    Valide ?include= et le convertit en arbre de relations :
+    "contract.client,guarantees" -> {"contract": {"client": {}}, "guarantees": {}}
+    """
+    if not include:
+        return {}
+    paths = [path.strip() for path in include.split(",") if path.strip()]
+    if len(paths) > INCLUDE_MAX_PATHS:
+        raise HTTPException(status_code=400, detail=f"include : {INCLUDE_MAX_PATHS} chemins maximum")
+    
+    tree = {}
+    for path in paths:
+        names = path.split(".")
+        if len(names) > INCLUDE_MAX_DEPTH:
+            raise HTTPException(status_code=400, detail=f"include : profondeur maximale {INCLUDE_MAX_DEPTH} ({path})")
+        node, current = tree, resource
+        for name in names:
+            if name not in RELATIONS[current]:
+                available = ", ".join(RELATIONS[current]) or "aucune"
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"include : relation inconnue '{name}' dans '{path}' (disponibles : {available})"
+                )
+            current = RELATIONS[current][name][0]
+            node = node.setdefault(name, {})
+    return tree
+
+
+class IncludeResolver:
+    """Résout un arbre d'inclusions pour des enregistrements d'un même type"""
+    
+    def __init__(self, db: Session, max_records: int = INCLUDE_MAX_RECORDS):
+        self.db = db
+        self.remaining = max_records
+        self.truncated = []  # Chemins dont les listes ont été tronquées
+        self.versions = []  # (type, id, updated_at) des enregistrements inclus, pour l'ETag
+    
+    def resolve(self, resource: str, records: list, tree: dict, prefix: str = "") -> dict:
+        """Retourne {id parent: {relation: valeur sérialisée}}"""
+        embedded = {record.id: {} for record in records}
+        for name, subtree in tree.items():
+            target, many, load = RELATIONS[resource][name]
+            path = f"{prefix}{name}"
+            if self.remaining > 0:
+                related = load(self.db, records, self.remaining + 1)
+            else:
+                related = {}
+                self.truncated.append(path)
+            
+            # Budget global : on tronque au-delà du nombre d'enregistrements autorisé
+            children = []
+            seen = set()
+            for record in records:
+                value = related.get(record.id)
+                values = value if many else [value]
+                kept = []
+                for child in values or []:
+                    if child is None:
+                        continue
+                    # L'identifiant entre dans les versions (ETag) : il doit être stable d'une requête à l'autre
+                    if getattr(child, "id", None) is None:
+                        raise ValueError(f"Enregistrement inclus sans identifiant ({path}) : sélectionner sa colonne id")
+                    key = (target, child.id)
+                    if key not in seen:
+                        if self.remaining <= 0:
+                            if path not in self.truncated:
+                                self.truncated.append(path)
+                            continue
+                        seen.add(key)
+                        self.remaining -= 1
+                        children.append(child)
+                        self.versions.append((target, key[1], getattr(child, "updated_at", None)))
+                    kept.append(child)
+                related[record.id] = kept if many else (kept[0] if kept else None)
+            
+            nested = self.resolve(target, children, subtree, f"{path}.") if subtree and children else {}
+            serialize = SERIALIZERS[target]
+            
+            def render(child):
+                data = serialize(child)
+                if subtree:
+                    data.update(nested.get(child.id, {}))
+                return data
+            
+            for record in records:
+                value = related.get(record.id)
+                if many:
+                    embedded[record.id][name] = [render(child) for child in value or []]
+                else:
+                    embedded[record.id][name] = render(value) if value is not None else None
+        return embedded
+    
+    def etag_parts(self) -> list:
+        return sorted(self.versions, key=lambda version: (version[0], str(version[1])))
+
+
+def include_related(db: Session, resource: str, record, tree: dict) -> tuple:
+    """
+    Ressources liées d'un enregistrement : (champs à ajouter à la réponse, parties d'ETag).
+    Les chemins tronqués sont signalés dans le champ `include_truncated`.
+    """
+    resolver = IncludeResolver(db)
+    embedded = resolver.resolve(resource, [record], tree)[record.id]
+    if resolver.truncated:
+        embedded["include_truncated"] = resolver.truncated
+    return embedded, resolver.etag_parts()
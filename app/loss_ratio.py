@@ -0,0 +1,191 @@
+"""
+Ratios sinistres / primes (S/P) par client, chantier, type de contrat, courtier et année de survenance.
+
+S/P = (indemnités versées + provisions) des sinistres / primes acquises des contrats.
+Prime acquise d'un contrat : prime annuelle au prorata de la période couverte écoulée
+(de la date d'effet jusqu'à aujourd'hui, l'échéance ou la résiliation). Par année de
+survenance, seule la part de cette période comprise dans l'année est retenue.
+
+Chaque dimension est calculée par une requête SQL agrégée et gardée en mémoire
+(stale-while-revalidate) : un appel à l'endpoint ne reparcourt pas les sinistres et les contrats.
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.snapshots import Snapshot
+
+# Durée de validité d'un calcul avant rafraîchissement en tâche de fond (secondes)
+LOSS_RATIO_REFRESH_SECONDS = 600
+
+UNKNOWN = "non_renseigne"
+
+# Période couverte de chaque contrat, bornée à aujourd'hui
+_CONTRACT_PERIODS = f"""
+    periods AS (
+        SELECT c.id, c.client_id, c.construction_site_id, c.contract_type_code,
+               coalesce(c.broker_code, '{UNKNOWN}') AS broker_code, c.broker_name,
+               coalesce(c.annual_premium, 0) AS annual_premium,
+               coalesce(c.effective_date, c.issue_date, c.created_at::date) AS start_date,
+               least(current_date, coalesce(c.cancellation_date, c.expiry_date, current_date)) AS end_date
+        FROM fake_client_contracts c
+    )
+"""
+
+# Primes acquises et charge sinistres par contrat
+_PER_CONTRACT = f"""
+    WITH {_CONTRACT_PERIODS},
+    claims AS (
+        SELECT contract_id, count(*) AS claims_count,
+               coalesce(sum(indemnity_amount), 0) AS indemnity_amount,
+               coalesce(sum(reserve_amount), 0) AS reserve_amount
+        FROM fake_claims
+        GROUP BY contract_id
+    ),
+    per_contract AS (
+        SELECT p.*,
+               p.annual_premium * greatest(p.end_date - p.start_date, 0) / 365.0 AS earned_premium,
+               coalesce(cl.claims_count, 0) AS claims_count,
+               coalesce(cl.indemnity_amount, 0) AS indemnity_amount,
+               coalesce(cl.reserve_amount, 0) AS reserve_amount
+        FROM periods p
+        LEFT JOIN claims cl ON cl.contract_id = p.id
+    )
+"""
+
+_AGGREGATES = """
+    count(*) AS contracts_count,
+    sum(pc.claims_count) AS claims_count,
+    sum(pc.earned_premium) AS earned_premium,
+    sum(pc.indemnity_amount) AS indemnity_amount,
+    sum(pc.reserve_amount) AS reserve_amount
+"""
+
+# Dimension -> requête (clé, libellé, agrégats)
+LOSS_RATIO_QUERIES = {
+    "client": f"""
+        {_PER_CONTRACT}
+        SELECT pc.client_id::text AS key,
+               max(coalesce(cl.company_name, trim(concat(cl.first_name, ' ', cl.last_name)))) AS label,
+               {_AGGREGATES}
+        FROM per_contract pc
+        JOIN fake_clients cl ON cl.id = pc.client_id
+        GROUP BY pc.client_id
+    """,
+    "construction_site": f"""
+        {_PER_CONTRACT}
+        SELECT coalesce(pc.construction_site_id::text, '{UNKNOWN}') AS key,
+               max(s.site_reference) AS label,
+               {_AGGREGATES}
+        FROM per_contract pc
+        LEFT JOIN fake_construction_sites s ON s.id = pc.construction_site_id
+        GROUP BY 1
+    """,
+    "contract_type": f"""
+        {_PER_CONTRACT}
+        SELECT pc.contract_type_code AS key,
+               max(t.name) AS label,
+               {_AGGREGATES}
+        FROM per_contract pc
+        LEFT JOIN fake_ref_insurance_contract_types t ON t.code = pc.contract_type_code
+        GROUP BY 1
+    """,
+    "broker": f"""
+        {_PER_CONTRACT}
+        SELECT pc.broker_code AS key,
+               max(pc.broker_name) AS label,
+               {_AGGREGATES}
+        FROM per_contract pc
+        GROUP BY 1
+    """,
+    # Année de survenance : sinistres par année d'incident, primes acquises réparties par année
+    "accident_year": f"""
+        WITH {_CONTRACT_PERIODS},
+        earned AS (
+            SELECT y.year, count(*) AS contracts_count,
+                   sum(p.annual_premium * greatest(
+                       least(p.end_date, make_date(y.year + 1, 1, 1)) - greatest(p.start_date, make_date(y.year, 1, 1)), 0
+                   ) / 365.0) AS earned_premium
+            FROM periods p
+            CROSS JOIN LATERAL generate_series(
+                extract(year FROM p.start_date)::int, extract(year FROM p.end_date)::int
+            ) AS y(year)
+            WHERE p.end_date > p.start_date
+            GROUP BY y.year
+        ),
+        incurred AS (
+            SELECT extract(year FROM incident_date)::int AS year, count(*) AS claims_count,
+                   coalesce(sum(indemnity_amount), 0) AS indemnity_amount,
+                   coalesce(sum(reserve_amount), 0) AS reserve_amount
+            FROM fake_claims
+            GROUP BY 1
+        )
+        SELECT coalesce(e.year, i.year)::text AS key,
+               coalesce(e.year, i.year)::text AS label,
+               coalesce(e.contracts_count, 0) AS contracts_count,
+               coalesce(i.claims_count, 0) AS claims_count,
+               coalesce(e.earned_premium, 0) AS earned_premium,
+               coalesce(i.indemnity_amount, 0) AS indemnity_amount,
+               coalesce(i.reserve_amount, 0) AS reserve_amount
+        FROM earned e
+        FULL JOIN incurred i ON i.year = e.year
+    """,
+}
+
+LOSS_RATIO_DIMENSIONS = tuple(LOSS_RATIO_QUERIES)
+
+
+def compute_loss_ratios(db: Session, dimension: str) -> dict:
+    """S/P d'une dimension, triés par S/P décroissant (sans prime acquise en dernier), et totaux"""
+    items = []
+    totals = {"contracts_count": 0, "claims_count": 0, "earned_premium": 0.0, "indemnity_amount": 0.0, "reserve_amount": 0.0}
+    for row in db.execute(text(LOSS_RATIO_QUERIES[dimension])).mappings():
+        earned = float(row["earned_premium"] or 0)
+        indemnity = float(row["indemnity_amount"] or 0)
+        reserve = float(row["reserve_amount"] or 0)
+        incurred = indemnity + reserve
+        items.append({
+            "key": row["key"],
+            "label": row["label"],
+            "contracts_count": int(row["contracts_count"]),
+            "claims_count": int(row["claims_count"]),
+            "earned_premium": round(earned, 2),
+            "indemnity_amount": round(indemnity, 2),
+            "reserve_amount": round(reserve, 2),
+            "incurred_amount": round(incurred, 2),
+            "loss_ratio": round(incurred / earned, 4) if earned > 0 else None,
+        })
+        if dimension != "accident_year":
+            totals["contracts_count"] += int(row["contracts_count"])
+        totals["claims_count"] += int(row["claims_count"])
+        totals["earned_premium"] += earned
+        totals["indemnity_amount"] += indemnity
+        totals["reserve_amount"] += reserve
+    
+    if dimension == "accident_year":
+        # Un contrat couvre plusieurs années : le total de contrats ne se somme pas
+        items.sort(key=lambda item: item["key"])
+        totals.pop("contracts_count")
+    else:
+        items.sort(key=lambda item: (item["loss_ratio"] is None, -(item["loss_ratio"] or 0), -item["incurred_amount"]))
+    
+    incurred = totals["indemnity_amount"] + totals["reserve_amount"]
+    totals.update({
+        "earned_premium": round(totals["earned_premium"], 2),
+        "indemnity_amount": round(totals["indemnity_amount"], 2),
+        "reserve_amount": round(totals["reserve_amount"], 2),
+        "incurred_amount": round(incurred, 2),
+        "loss_ratio": round(incurred / totals["earned_premium"], 4) if totals["earned_premium"] > 0 else None,
+    })
+    return {"items": items, "totals": totals}
+
+
+# Un instantané par dimension, calculé à la première demande puis rafraîchi en tâche de fond
+LOSS_RATIO_SNAPSHOTS = {
+    dimension: Snapshot(
+        f"loss_ratio_{dimension}",
+        lambda db, dimension=dimension: compute_loss_ratios(db, dimension),
+        LOSS_RATIO_REFRESH_SECONDS,
+        replica=True
+    )
+    for dimension in LOSS_RATIO_DIMENSIONS
+}
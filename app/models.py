@@ -2,13 +2,18 @@
 Modèles pour les contrats clients d'assurance construction
 Ces modèles permettent de créer des contrats personnalisés combinant les éléments du référentiel
 """
-from sqlalchemy import Column, String, Text, Boolean, Integer, Float, DateTime, ForeignKey, JSON, Table, Date
+from sqlalchemy import Column, String, Text, Boolean, Integer, BigInteger, Float, DateTime, ForeignKey, JSON, Table, Date, Index, text
+from sqlalchemy import Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime, date
 import enum
 
 from app.database import Base
 
+# Identifiant de la transaction courante (xid8 sur 64 bits, jamais réutilisé) : colonnes sync_xid
+CURRENT_XID_SQL = "pg_current_xact_id()::text::bigint"
+
 
 # =============================================================================
 # ÉNUMÉRATIONS
@@ -40,6 +45,23 @@ class AddressTypeEnum(str, enum.Enum):
     CONSTRUCTION_SITE = "chantier"  # Chantier (1 à 10 max)
 
 
+class ContractHistoryActionEnum(str, enum.Enum):
+    """Types de modification tracés dans l'historique des contrats"""
+    CREATION = "creation"
+    MODIFICATION = "modification"
+    STATUS_CHANGE = "changement_statut"
+    RENEWAL = "renouvellement"
+    CANCELLATION = "resiliation"
+
+
+def db_enum(enum_class, name: str) -> SQLEnum:
+    """
+    Type énuméré natif PostgreSQL (4 octets par valeur au lieu d'un varchar).
+    Construit à partir des valeurs : les attributs restent des chaînes côté Python.
+    """
+    return SQLEnum(*[member.value for member in enum_class], name=name)
+
+
 # =============================================================================
 # TABLES D'ASSOCIATION
 # =============================================================================
@@ -50,14 +72,20 @@ contract_guarantees = Table(
     Base.metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('contract_id', Integer, ForeignKey('fake_client_contracts.id')),
-    Column('guarantee_id', Integer, ForeignKey('fake_ref_guarantees.id'), nullable=True),
-    Column('guarantee_code', String(30), nullable=True),  # Code si pas de guarantee_id
+    Column('guarantee_id', Integer, ForeignKey('fake_ref_guarantees.id'), nullable=True),  # Clé de jointure
+    Column('guarantee_code', String(30), nullable=True),  # Code dénormalisé (repli si guarantee_id absent)
     Column('custom_ceiling', Float, nullable=True),
     Column('custom_franchise', Float, nullable=True),
     Column('is_included', Boolean, default=True),
     Column('annual_premium', Float, nullable=True),
     Column('created_at', DateTime, default=datetime.utcnow),
-    Column('updated_at', DateTime, default=datetime.utcnow)
+    Column('updated_at', DateTime, default=datetime.utcnow),
+    # Index couvrant : garanties d'un contrat lues en index-only scan (voir migrate_guarantee_ids.py)
+    Index(
+        'ix_fake_contract_guarantees_contract_guarantee', 'contract_id', 'guarantee_id',
+        postgresql_include=['id', 'guarantee_code', 'custom_ceiling', 'custom_franchise',
+                            'is_included', 'annual_premium', 'updated_at']
+    )
 )
 
 # Association contrat <-> clauses applicables
@@ -78,12 +106,16 @@ contract_clauses = Table(
 class ClientAddressModel(Base):
     """Adresses des clients (siège, entrepôts, chantiers)"""
     __tablename__ = "fake_client_addresses"
+    __table_args__ = (
+        # Recherche par rayon / rectangle (app/geo.py)
+        Index("ix_fake_client_addresses_location", text("point(longitude, latitude)"), postgresql_using="gist"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     client_id = Column(Integer, ForeignKey("fake_clients.id"), nullable=False)
     
     # Type d'adresse
-    address_type = Column(String(30), nullable=False)  # AddressTypeEnum
+    address_type = Column(db_enum(AddressTypeEnum, "address_type_enum"), nullable=False)
     
     # Identification
     name = Column(String(100), nullable=True)  # Nom de l'adresse (ex: "Entrepôt Nord", "Chantier Lyon")
@@ -155,12 +187,15 @@ class ClientAddressModel(Base):
 class ClientModel(Base):
     """Modèle pour les clients (assurés)"""
     __tablename__ = "fake_clients"
+    __table_args__ = (
+        Index("ix_fake_clients_sync_xid_id", "sync_xid", "id"),  # Flux /sync/changes
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     
     # Identité
     client_number = Column(String(20), unique=True, nullable=False, index=True)
-    client_type = Column(String(30), nullable=False)  # ClientTypeEnum
+    client_type = Column(db_enum(ClientTypeEnum, "client_type_enum"), nullable=False)
     
     # Personne physique
     civility = Column(String(10), nullable=True)  # M., Mme, etc.
@@ -195,6 +230,7 @@ class ClientModel(Base):
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False, server_default=text(CURRENT_XID_SQL))  # Transaction de la dernière écriture (app/sync_feed.py)
     
     # Relations
     contracts = relationship("ClientContractModel", back_populates="client")
@@ -237,6 +273,11 @@ class ClientModel(Base):
 class ConstructionSiteModel(Base):
     """Modèle pour les chantiers / ouvrages assurés"""
     __tablename__ = "fake_construction_sites"
+    __table_args__ = (
+        Index("ix_fake_construction_sites_sync_xid_id", "sync_xid", "id"),  # Flux /sync/changes
+        # Recherche par rayon / rectangle (app/geo.py)
+        Index("ix_fake_construction_sites_location", text("point(longitude, latitude)"), postgresql_using="gist"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     
@@ -294,6 +335,7 @@ class ConstructionSiteModel(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False, server_default=text(CURRENT_XID_SQL))  # Transaction de la dernière écriture (app/sync_feed.py)
     
     # Relations
     contracts = relationship("ClientContractModel", back_populates="construction_site")
@@ -309,6 +351,14 @@ class ConstructionSiteModel(Base):
 class ClientContractModel(Base):
     """Contrat d'assurance construction client"""
     __tablename__ = "fake_client_contracts"
+    __table_args__ = (
+        Index("ix_fake_client_contracts_sync_xid_id", "sync_xid", "id"),  # Flux /sync/changes
+        # Recherche par contenance (@>) : /contracts?clause=
+        Index(
+            "ix_fake_client_contracts_selected_clauses", "selected_clauses",
+            postgresql_using="gin", postgresql_ops={"selected_clauses": "jsonb_path_ops"}
+        ),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     
@@ -323,14 +373,14 @@ class ClientContractModel(Base):
     client_id = Column(Integer, ForeignKey("fake_clients.id"), nullable=False)
     client = relationship("ClientModel", back_populates="contracts")
     
-    construction_site_id = Column(Integer, ForeignKey("fake_construction_sites.id"), nullable=True)
+    construction_site_id = Column(Integer, ForeignKey("fake_construction_sites.id"), nullable=True, index=True)
     construction_site = relationship("ConstructionSiteModel", back_populates="contracts")
     
     # Relation historique
     history = relationship("ContractHistoryModel", back_populates="contract", cascade="all, delete-orphan")
     
     # Statut
-    status = Column(String(30), default="brouillon")  # ContractStatusEnum
+    status = Column(db_enum(ContractStatusEnum, "contract_status_enum"), default="brouillon")
     
     # Dates du contrat
     issue_date = Column(Date, nullable=True)  # Date d'émission
@@ -349,7 +399,7 @@ class ClientContractModel(Base):
     is_renewable = Column(Boolean, default=False)  # Tacite reconduction
     
     # Garanties sélectionnées (JSON simplifié pour faciliter la consultation)
-    selected_guarantees = Column(JSON, nullable=True)  # Liste des codes de garanties avec paramètres
+    selected_guarantees = Column(JSONB, nullable=True)  # Liste des codes de garanties avec paramètres
     """
     Format: [
         {"code": "GAR_DEC_01", "ceiling": 1000000, "franchise": 5000, "included": true},
@@ -358,7 +408,7 @@ class ClientContractModel(Base):
     """
     
     # Clauses applicables
-    selected_clauses = Column(JSON, nullable=True)  # Liste des codes de clauses avec variables
+    selected_clauses = Column(JSONB, nullable=True)  # Liste des codes de clauses avec variables
     """
     Format: [
         {"code": "CL_FRAN_01", "variables": {"montant_franchise": 5000}},
@@ -367,7 +417,7 @@ class ClientContractModel(Base):
     """
     
     # Exclusions spécifiques
-    specific_exclusions = Column(JSON, nullable=True)  # Exclusions ajoutées manuellement
+    specific_exclusions = Column(JSONB, nullable=True)  # Exclusions ajoutées manuellement
     
     # Conditions particulières
     special_conditions = Column(Text, nullable=True)
@@ -378,7 +428,7 @@ class ClientContractModel(Base):
     underwriter = Column(String(200), nullable=True)  # Souscripteur
     
     # Pièces jointes (références)
-    attached_documents = Column(JSON, nullable=True)  # IDs des documents attachés
+    attached_documents = Column(JSONB, nullable=True)  # IDs des documents attachés
     
     # Notes et commentaires
     internal_notes = Column(Text, nullable=True)
@@ -389,6 +439,7 @@ class ClientContractModel(Base):
     updated_by = Column(String(36), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False, server_default=text(CURRENT_XID_SQL))  # Transaction de la dernière écriture (app/sync_feed.py)
     
     def __repr__(self):
         return f"<ClientContract(number={self.contract_number}, type={self.contract_type_code})>"
@@ -419,7 +470,7 @@ class ContractHistoryModel(Base):
     contract = relationship("ClientContractModel", back_populates="history")
     
     # Type de modification
-    action = Column(String(50), nullable=False)  # create, update, status_change, etc.
+    action = Column(db_enum(ContractHistoryActionEnum, "contract_history_action_enum"), nullable=False)
     field_changed = Column(String(100), nullable=True)
     old_value = Column(Text, nullable=True)
     new_value = Column(Text, nullable=True)
@@ -551,6 +602,7 @@ class InsuranceContractTypeModel(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False, server_default=text(CURRENT_XID_SQL))  # Transaction de la dernière écriture (app/sync_feed.py)
     
     # Relations
     guarantees = relationship("GuaranteeModel", back_populates="contract_type")
@@ -596,6 +648,7 @@ class GuaranteeModel(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False, server_default=text(CURRENT_XID_SQL))  # Transaction de la dernière écriture (app/sync_feed.py)
     
     def __repr__(self):
         return f"<Guarantee(code={self.code}, name={self.name})>"
@@ -604,6 +657,17 @@ class GuaranteeModel(Base):
 class ContractClauseModel(Base):
     """Clauses contractuelles d'assurance construction"""
     __tablename__ = "fake_ref_contract_clauses"
+    __table_args__ = (
+        # Recherche par contenance (@>) : /referentials/clauses?contract_type=&guarantee=
+        Index(
+            "ix_fake_ref_contract_clauses_applies_to_contract_types", "applies_to_contract_types",
+            postgresql_using="gin", postgresql_ops={"applies_to_contract_types": "jsonb_path_ops"}
+        ),
+        Index(
+            "ix_fake_ref_contract_clauses_applies_to_guarantees", "applies_to_guarantees",
+            postgresql_using="gin", postgresql_ops={"applies_to_guarantees": "jsonb_path_ops"}
+        ),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     code = Column(String(30), unique=True, nullable=False, index=True)
@@ -615,8 +679,8 @@ class ContractClauseModel(Base):
     subcategory = Column(String(50), nullable=True)
     
     # Applicabilité
-    applies_to_contract_types = Column(JSON, nullable=True)  # Liste des codes de types de contrats
-    applies_to_guarantees = Column(JSON, nullable=True)  # Liste des codes de garanties
+    applies_to_contract_types = Column(JSONB, nullable=True)  # Liste des codes de types de contrats
+    applies_to_guarantees = Column(JSONB, nullable=True)  # Liste des codes de garanties
     
     # Caractéristiques
     is_mandatory = Column(Boolean, default=False)  # Clause obligatoire ou non
@@ -633,6 +697,7 @@ class ContractClauseModel(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False, server_default=text(CURRENT_XID_SQL))  # Transaction de la dernière écriture (app/sync_feed.py)
     
     def __repr__(self):
         return f"<ContractClause(code={self.code}, title={self.title})>"
@@ -657,6 +722,7 @@ class BuildingCategoryModel(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False, server_default=text(CURRENT_XID_SQL))  # Transaction de la dernière écriture (app/sync_feed.py)
     
     def __repr__(self):
         return f"<BuildingCategory(code={self.code}, name={self.name})>"
@@ -685,6 +751,7 @@ class WorkCategoryModel(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False, server_default=text(CURRENT_XID_SQL))  # Transaction de la dernière écriture (app/sync_feed.py)
     
     def __repr__(self):
         return f"<WorkCategory(code={self.code}, name={self.name})>"
@@ -716,6 +783,7 @@ class ProfessionModel(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False, server_default=text(CURRENT_XID_SQL))  # Transaction de la dernière écriture (app/sync_feed.py)
     
     def __repr__(self):
         return f"<Profession(code={self.code}, name={self.name})>"
@@ -767,8 +835,8 @@ class ExclusionModel(Base):
     category = Column(String(50), nullable=False)  # légale, contractuelle, technique
     
     # Applicabilité
-    applies_to_guarantees = Column(JSON, nullable=True)  # Codes des garanties
-    applies_to_contract_types = Column(JSON, nullable=True)  # Codes des contrats
+    applies_to_guarantees = Column(JSONB, nullable=True)  # Codes des garanties
+    applies_to_contract_types = Column(JSONB, nullable=True)  # Codes des contrats
     
     # Caractéristiques
     is_legal = Column(Boolean, default=False)  # Exclusion légale non négociable
@@ -1424,6 +1492,14 @@ class ClaimSeverityEnum(str, enum.Enum):
 class ClaimModel(Base):
     """Sinistre construction relié à un contrat"""
     __tablename__ = "fake_claims"
+    __table_args__ = (
+        Index("ix_fake_claims_sync_xid_id", "sync_xid", "id"),  # Flux /sync/changes
+        # Recherche par contenance (@>) : /claims?activated_guarantee=
+        Index(
+            "ix_fake_claims_activated_guarantees", "activated_guarantees",
+            postgresql_using="gin", postgresql_ops={"activated_guarantees": "jsonb_path_ops"}
+        ),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     
@@ -1439,9 +1515,9 @@ class ClaimModel(Base):
     construction_site = relationship("ConstructionSiteModel", backref="claims")
     
     # Type et gravité
-    claim_type = Column(String(30), nullable=False)  # ClaimTypeEnum
-    severity = Column(String(20), nullable=True)  # ClaimSeverityEnum
-    status = Column(String(30), default="declare")  # ClaimStatusEnum
+    claim_type = Column(db_enum(ClaimTypeEnum, "claim_type_enum"), nullable=False)
+    severity = Column(db_enum(ClaimSeverityEnum, "claim_severity_enum"), nullable=True)
+    status = Column(db_enum(ClaimStatusEnum, "claim_status_enum"), default="declare")
     
     # Dates
     incident_date = Column(DateTime, nullable=False)  # Date du sinistre
@@ -1472,13 +1548,13 @@ class ClaimModel(Base):
     expert_company = Column(String(200), nullable=True)  # Cabinet d'expertise
     
     # Garanties activées
-    activated_guarantees = Column(JSON, nullable=True)  # Codes des garanties activées
+    activated_guarantees = Column(JSONB, nullable=True)  # Codes des garanties activées
     """
     Format: ["GAR_DEC_01", "GAR_BIEN_02"]
     """
     
     # Documents
-    attached_documents = Column(JSON, nullable=True)  # Liste des documents
+    attached_documents = Column(JSONB, nullable=True)  # Liste des documents
     """
     Format: [
         {"type": "constat", "name": "constat_huissier.pdf", "date": "2024-01-15"},
@@ -1493,7 +1569,7 @@ class ClaimModel(Base):
     
     # Responsabilité
     third_party_involved = Column(Boolean, default=False)  # Tiers impliqué
-    third_party_info = Column(JSON, nullable=True)  # Infos sur le tiers
+    third_party_info = Column(JSONB, nullable=True)  # Infos sur le tiers
     police_report_number = Column(String(50), nullable=True)  # N° de dépôt de plainte
     
     # Réparations
@@ -1512,6 +1588,7 @@ class ClaimModel(Base):
     updated_by = Column(String(36), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_xid = Column(BigInteger, nullable=False, server_default=text(CURRENT_XID_SQL))  # Transaction de la dernière écriture (app/sync_feed.py)
     
     def __repr__(self):
         return f"<Claim(number={self.claim_number}, type={self.claim_type}, status={self.status})>"
@@ -1527,3 +1604,135 @@ class ClaimModel(Base):
     def is_open(self):
         """Vérifie si le sinistre est toujours ouvert"""
         return self.status not in [ClaimStatusEnum.SETTLED.value, ClaimStatusEnum.CLOSED.value, ClaimStatusEnum.REJECTED.value]
+
+
+# =============================================================================
+# IMPORT DE PORTEFEUILLE
+# =============================================================================
+
+class ImportRejectionModel(Base):
+    """Ligne rejetée lors d'un import de portefeuille (rapport de rejets)"""
+    __tablename__ = "fake_import_rejections"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    batch_id = Column(String(36), nullable=False, index=True)  # Identifiant de l'import
+    line_number = Column(Integer, nullable=False)  # Ligne du fichier (en-tête = ligne 1)
+    errors = Column(Text, nullable=False)  # Motifs de rejet séparés par " ; "
+    raw_data = Column(JSON, nullable=True)  # Valeurs brutes de la ligne
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<ImportRejection(batch={self.batch_id}, line={self.line_number})>"
+
+
+# =============================================================================
+# TUILES DE CARTE DES CHANTIERS
+# =============================================================================
+
+class SiteTileModel(Base):
+    """Agrégat des chantiers actifs d'une tuile de carte z/x/y (voir app/site_tiles.py)"""
+    __tablename__ = "fake_site_tiles"
+    
+    zoom = Column(Integer, primary_key=True)
+    x = Column(Integer, primary_key=True)
+    y = Column(Integer, primary_key=True)
+    sites_count = Column(Integer, nullable=False)
+    total_construction_cost = Column(Float, nullable=False, default=0)
+    # Rectangle englobant des chantiers de la tuile
+    min_lon = Column(Float, nullable=False)
+    min_lat = Column(Float, nullable=False)
+    max_lon = Column(Float, nullable=False)
+    max_lat = Column(Float, nullable=False)
+    # Sommes des coordonnées (barycentre = somme / nombre, agrégeable d'un zoom à l'autre)
+    sum_lon = Column(Float, nullable=False)
+    sum_lat = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<SiteTile({self.zoom}/{self.x}/{self.y}, sites={self.sites_count})>"
+
+
+class SiteTileChangeModel(Base):
+    """Tuile (zoom maximal) dont les chantiers ont changé depuis la dernière mise à jour"""
+    __tablename__ = "fake_site_tile_changes"
+    
+    x = Column(Integer, primary_key=True)
+    y = Column(Integer, primary_key=True)
+
+
+# =============================================================================
+# CUMULS CATASTROPHE NATURELLE
+# =============================================================================
+
+class SiteExposureModel(Base):
+    """Exposition assurée d'un chantier couvert par des contrats actifs (voir app/accumulation.py)"""
+    __tablename__ = "fake_site_exposures"
+    
+    site_id = Column(Integer, primary_key=True)
+    # Cellule de cumul
+    department = Column(String(20), nullable=False)
+    seismic_zone = Column(Integer, nullable=False)
+    flood_zone = Column(Boolean, nullable=False)
+    contracts_count = Column(Integer, nullable=False)
+    site_value = Column(Float, nullable=True)  # Valeur du projet, à défaut coût de construction
+    # Sommes sur les contrats actifs du chantier (brutes) et plafonnées à la valeur du chantier
+    insured_amount_gross = Column(Float, nullable=False)
+    guarantee_ceiling_gross = Column(Float, nullable=False)
+    insured_amount = Column(Float, nullable=False)
+    guarantee_ceiling = Column(Float, nullable=False)
+
+
+class AccumulationCellModel(Base):
+    """Cumul des expositions par département x zone sismique x zone inondable"""
+    __tablename__ = "fake_accumulation_cells"
+    
+    department = Column(String(20), primary_key=True)
+    seismic_zone = Column(Integer, primary_key=True)
+    flood_zone = Column(Boolean, primary_key=True)
+    sites_count = Column(Integer, nullable=False)
+    shared_sites_count = Column(Integer, nullable=False)  # Chantiers couverts par plusieurs contrats
+    contracts_count = Column(Integer, nullable=False)
+    insured_amount_gross = Column(Float, nullable=False)
+    guarantee_ceiling_gross = Column(Float, nullable=False)
+    insured_amount = Column(Float, nullable=False)
+    guarantee_ceiling = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AccumulationChangeModel(Base):
+    """Chantier dont l'exposition doit être recalculée"""
+    __tablename__ = "fake_accumulation_changes"
+    
+    site_id = Column(Integer, primary_key=True)
+
+
+# =============================================================================
+# VUES ANALYTIQUES
+# =============================================================================
+
+class AnalyticsRefreshModel(Base):
+    """Dernier rafraîchissement d'une vue matérialisée, commun à tous les processus (voir app/analytics.py)"""
+    __tablename__ = "fake_analytics_refreshes"
+    
+    view_name = Column(String(63), primary_key=True)
+    source_version = Column(Text, nullable=False)  # Nombre de lignes et dernière modification des tables sources
+    refreshed_at = Column(DateTime(timezone=True), nullable=False)
+    duration_ms = Column(Float, nullable=False)
+
+
+# =============================================================================
+# SYNCHRONISATION HORS LIGNE
+# =============================================================================
+
+class SyncTombstoneModel(Base):
+    """Suppression physique d'une entité synchronisée (voir app/sync_feed.py)"""
+    __tablename__ = "fake_sync_tombstones"
+    __table_args__ = (
+        Index("ix_fake_sync_tombstones_entity_sync_xid_id", "entity", "sync_xid", "id"),  # Flux /sync/changes
+    )
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    entity = Column(String(40), nullable=False)  # Nom de l'entité dans /sync/changes
+    entity_id = Column(Integer, nullable=False)
+    sync_xid = Column(BigInteger, nullable=False)  # Transaction de la suppression
+    deleted_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,133 @@
+"""
+Pagination des listes : total exact, estimé ou absent (?count=exact|estimated|none).
+
+- exact : COUNT(*) sur la requête filtrée (parcours complet du filtre à chaque page)
+- estimated : total mis en cache quelques secondes par jeu de filtres ; à défaut, estimation
+  du planificateur (EXPLAIN), remplacée par un COUNT exact quand elle est petite
+- none : pas de total, `has_more` seul
+Dans tous les cas la page est lue avec limit + 1 lignes pour calculer `has_more`.
+"""
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.schemas import CountModeEnum
+
+# Durée de vie d'un total mis en cache (secondes) et nombre de jeux de filtres conservés
+COUNT_CACHE_TTL = 30
+COUNT_CACHE_MAX_ENTRIES = 1000
+
+# En dessous de cette estimation, le COUNT exact est assez rapide pour remplacer l'estimation
+ESTIMATE_EXACT_THRESHOLD = 10000
+
+COUNT_DESCRIPTION = (
+    "Total : exact (COUNT), estimated (statistiques du planificateur / cache court) "
+    "ou none (pas de total, has_more seulement)"
+)
+
+
+# =============================================================================
+# ESTIMATION DU PLANIFICATEUR
+# =============================================================================
+
+class _ExplainJson(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) d'une requête, paramètres liés comme pour la requête elle-même"""
+    inherit_cache = False
+    
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_ExplainJson, "postgresql")
+def _compile_explain_json(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def planner_estimate(db: Session, query) -> int:
+    """Nombre de lignes estimé par le planificateur (sans exécuter la requête)"""
+    plan = db.execute(_ExplainJson(query.order_by(None).statement)).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+# =============================================================================
+# CACHE DES TOTAUX PAR JEU DE FILTRES
+# =============================================================================
+
+class CountCache:
+    """Totaux récents, indexés par requête SQL compilée et paramètres"""
+    
+    def __init__(self, ttl: float = COUNT_CACHE_TTL, max_entries: int = COUNT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(db: Session, query) -> tuple:
+        compiled = query.order_by(None).statement.compile(dialect=db.get_bind().dialect)
+        return str(compiled), repr(sorted(compiled.params.items()))
+    
+    def get(self, key: tuple) -> Optional[tuple]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+    
+    def set(self, key: tuple, total: int, estimated: bool) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (now + self.ttl, (total, estimated))
+
+
+COUNT_CACHE = CountCache()
+
+
+# =============================================================================
+# PAGINATION
+# =============================================================================
+
+def count_total(db: Session, query, mode: CountModeEnum) -> tuple:
+    """Total de la requête filtrée selon le mode : (total ou None, total estimé ?)"""
+    if mode == CountModeEnum.NONE:
+        return None, False
+    if mode == CountModeEnum.EXACT:
+        return query.order_by(None).count(), False
+    
+    key = COUNT_CACHE.key(db, query)
+    cached = COUNT_CACHE.get(key)
+    if cached is not None:
+        return cached
+    total = planner_estimate(db, query)
+    estimated = True
+    if total < ESTIMATE_EXACT_THRESHOLD:
+        total, estimated = query.order_by(None).count(), False
+    COUNT_CACHE.set(key, total, estimated)
+    return total, estimated
+
+
+def fetch_page(query, skip: int, limit: int) -> tuple:
+    """Lit une page et une ligne de plus : (éléments, page suivante ?)"""
+    rows = query.offset(skip).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+def page_metadata(total: Optional[int], estimated: bool, has_more: bool, skip: int, limit: int, mode: CountModeEnum) -> dict:
+    """Métadonnées de pagination communes aux listes"""
+    return {
+        "total": total,
+        "total_estimated": estimated,
+        "count": mode.value,
+        "has_more": has_more,
+        "skip": skip,
+        "limit": limit,
+        "page": (skip // limit) + 1,
+        "pages": (total + limit - 1) // limit if total is not None else None,
+    }
@@ -0,0 +1,416 @@
+"""
+Import de portefeuille (CSV / XLSX) via COPY dans une table de staging non journalisée.
+
+Étapes, dans une seule transaction :
+1. COPY du fichier dans une table UNLOGGED (toutes colonnes en texte)
+2. Conversion et validation ensemblistes en SQL (formats, longueurs, codes référentiels)
+3. Rapport des lignes rejetées dans fake_import_rejections
+4. Fusion des lignes valides dans fake_clients / fake_construction_sites /
+   fake_client_contracts en une seule instruction (INSERT ... ON CONFLICT)
+
+Format attendu : une ligne par contrat, avec les colonnes du client et du chantier.
+
+Une seule transaction, éventuellement longue : le flux de synchronisation hors ligne ne s'appuie
+pas sur updated_at mais sur la transaction d'écriture (sync_xid, app/sync_feed.py) et ne publie
+les lignes fusionnées qu'après le commit, sans risque de les laisser derrière un curseur client.
+"""
+import csv
+import io
+import time
+import uuid
+from datetime import date, datetime
+
+from sqlalchemy import Date, Float, Integer, String, text
+from sqlalchemy import Enum as SQLEnum
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.models import (
+    ClientModel, ClientContractModel, ConstructionSiteModel, ContractStatusEnum, ClientTypeEnum,
+    InsuranceContractTypeModel, BuildingCategoryModel, WorkCategoryModel, ProfessionModel,
+    ImportRejectionModel
+)
+
+
+# =============================================================================
+# COLONNES DU FICHIER
+# =============================================================================
+
+# Colonne du fichier -> (modèle cible, colonne du modèle)
+CLIENT_COLUMNS = {
+    name: (ClientModel, name) for name in (
+        "client_number", "client_type", "civility", "first_name", "last_name", "birth_date",
+        "company_name", "legal_form", "siret", "siren", "email", "phone", "mobile",
+        "address_line1", "address_line2", "postal_code", "city", "country", "profession_code"
+    )
+}
+
+SITE_COLUMNS = {
+    "site_reference": (ConstructionSiteModel, "site_reference"),
+    "site_name": (ConstructionSiteModel, "site_name"),
+    "site_address_line1": (ConstructionSiteModel, "address_line1"),
+    "site_address_line2": (ConstructionSiteModel, "address_line2"),
+    "site_postal_code": (ConstructionSiteModel, "postal_code"),
+    "site_city": (ConstructionSiteModel, "city"),
+    "building_category_code": (ConstructionSiteModel, "building_category_code"),
+    "work_category_code": (ConstructionSiteModel, "work_category_code"),
+    "construction_cost": (ConstructionSiteModel, "construction_cost"),
+    "opening_date": (ConstructionSiteModel, "opening_date"),
+    "planned_completion_date": (ConstructionSiteModel, "planned_completion_date"),
+}
+
+CONTRACT_COLUMNS = {
+    name: (ClientContractModel, name) for name in (
+        "contract_number", "external_reference", "contract_type_code", "status",
+        "issue_date", "effective_date", "expiry_date", "insured_amount", "annual_premium",
+        "total_premium", "franchise_amount", "duration_years", "broker_name", "broker_code", "underwriter"
+    )
+}
+
+IMPORT_COLUMNS = {**CLIENT_COLUMNS, **SITE_COLUMNS, **CONTRACT_COLUMNS}
+
+REQUIRED_COLUMNS = ("client_number", "client_type", "contract_number", "contract_type_code")
+
+# Colonnes obligatoires du chantier lorsqu'une référence chantier est fournie
+SITE_REQUIRED_COLUMNS = ("site_name", "site_address_line1", "site_postal_code", "site_city")
+
+# Encodage du fichier -> encodage PostgreSQL pour COPY
+COPY_ENCODINGS = {"utf-8": "UTF8", "latin-1": "LATIN1", "cp1252": "WIN1252"}
+
+# Mémoire de travail de la transaction d'import (tris DISTINCT ON, jointures de hachage)
+IMPORT_WORK_MEM = "256MB"
+
+
+# =============================================================================
+# LECTURE DU FICHIER
+# =============================================================================
+
+def _normalize_header(header: list) -> list:
+    return [str(name or "").strip().lstrip("\ufeff").lower() for name in header]
+
+
+def _check_header(header: list) -> None:
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"Colonnes obligatoires absentes : {', '.join(missing)}")
+    duplicated = sorted({name for name in header if name and header.count(name) > 1})
+    if duplicated:
+        raise ValueError(f"Colonnes en double : {', '.join(duplicated)}")
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+class _RowsAsCsv:
+    """Expose un itérateur de lignes comme un fichier CSV lisible par COPY"""
+    
+    def __init__(self, rows, width: int):
+        self._rows = rows
+        self._width = width
+        self._out = io.StringIO()
+        self._writer = csv.writer(self._out, lineterminator="\n")
+        self._pending = ""
+    
+    def read(self, size: int = 65536) -> str:
+        if size is None or size < 0:
+            size = 1 << 20
+        while len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            cells = [_cell_text(value) for value in row[:self._width]]
+            if not any(cells):
+                continue  # Lignes vides en fin de feuille
+            self._writer.writerow(cells + [""] * (self._width - len(cells)))
+            self._pending += self._out.getvalue()
+            self._out.seek(0)
+            self._out.truncate()
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+def _open_csv(fileobj, encoding: str) -> tuple:
+    """Lit l'en-tête CSV ; le reste du fichier est transmis tel quel à COPY"""
+    first_line = fileobj.readline()
+    if isinstance(first_line, bytes):
+        first_line = first_line.decode(encoding)
+    delimiter = max((";", ",", "\t"), key=first_line.count)
+    header = _normalize_header(next(csv.reader([first_line], delimiter=delimiter)))
+    options = f"FORMAT csv, DELIMITER E'{delimiter}', ENCODING '{COPY_ENCODINGS[encoding]}'"
+    return header, fileobj, options
+
+
+def _open_xlsx(fileobj, sheet: str = None) -> tuple:
+    """Lit une feuille XLSX en mode flux et la convertit en CSV pour COPY"""
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("L'import XLSX nécessite le paquet openpyxl (pip install openpyxl)")
+    
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    if sheet and sheet not in workbook.sheetnames:
+        raise ValueError(f"Feuille inconnue : {sheet}")
+    rows = workbook[sheet].iter_rows(values_only=True) if sheet else workbook.active.iter_rows(values_only=True)
+    header = _normalize_header(next(rows, None) or [])
+    return header, _RowsAsCsv(rows, len(header)), "FORMAT csv"
+
+
+# =============================================================================
+# SQL DE VALIDATION ET DE FUSION
+# =============================================================================
+
+def _conversion(file_column: str) -> tuple:
+    """
+    Conversion tolérante d'une colonne de staging : (texte normalisé, valeur typée, libellé d'erreur).
+    Dates ISO ou JJ/MM/AAAA, nombres à virgule et séparateurs de milliers ; NULL si invalide.
+    Expressions SQL en ligne : une fonction SQL appelée par ligne coûte plusieurs fois plus cher.
+    """
+    model, attribute = IMPORT_COLUMNS[file_column]
+    column_type = model.__table__.c[attribute].type
+    raw = f"s.{file_column}"
+    value = f"n.{file_column}"
+    
+    if isinstance(column_type, Date):
+        normalized = (
+            f"nullif(CASE WHEN strpos({raw}, '/') > 0 "
+            rf"THEN regexp_replace(btrim({raw}), '^(\d{{2}})/(\d{{2}})/(\d{{4}})$', '\3-\2-\1') "
+            f"ELSE btrim({raw}) END, '')"
+        )
+        year = f"substr({value}, 1, 4)::int"
+        days_in_month = (
+            f"CASE substr({value}, 6, 2) WHEN '02' THEN "
+            f"CASE WHEN {year} % 4 = 0 AND ({year} % 100 <> 0 OR {year} % 400 = 0) THEN 29 ELSE 28 END "
+            f"WHEN '04' THEN 30 WHEN '06' THEN 30 WHEN '09' THEN 30 WHEN '11' THEN 30 ELSE 31 END"
+        )
+        typed = (
+            rf"CASE WHEN {value} ~ '^\d{{4}}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])$' THEN "
+            f"CASE WHEN substr({value}, 9, 2)::int <= {days_in_month} THEN {value}::date END END"
+        )
+        return normalized, typed, "date invalide"
+    if isinstance(column_type, Float):
+        normalized = f"nullif(replace(translate({raw}, E' \\t\u00a0\u202f', ''), ',', '.'), '')"
+        typed = rf"CASE WHEN {value} ~ '^-?\d+(\.\d+)?$' THEN {value}::double precision END"
+        return normalized, typed, "nombre invalide"
+    if isinstance(column_type, Integer):
+        normalized = f"nullif(btrim({raw}), '')"
+        typed = rf"CASE WHEN {value} ~ '^-?\d{{1,9}}$' THEN {value}::integer END"
+        return normalized, typed, "entier invalide"
+    return f"nullif(btrim({raw}), '')", value, None
+
+
+def _checked_table_sql(staging: str, checked: str, provided: set) -> str:
+    """
+    Table des lignes converties avec la liste de leurs erreurs, en une passe sur la staging.
+    Les sous-requêtes OFFSET 0 évitent que le planificateur recalcule les expressions.
+    """
+    normalized, typed, checks = [], [], []
+    for name, (model, attribute) in IMPORT_COLUMNS.items():
+        column_type = model.__table__.c[attribute].type
+        if name not in provided:
+            # Les énumérations restent du texte jusqu'à la fusion (contrôle par liste de valeurs)
+            sql_type = "text" if isinstance(column_type, SQLEnum) else column_type.compile(dialect=postgresql.dialect())
+            typed.append(f"NULL::{sql_type} AS {name}")
+            continue
+        normalized_value, typed_value, error = _conversion(name)
+        normalized.append(f"{normalized_value} AS {name}")
+        typed.append(f"{typed_value} AS {name}")
+        if error:
+            typed.append(f"n.{name} AS {name}__text")
+            checks.append(f"CASE WHEN t.{name}__text IS NOT NULL AND t.{name} IS NULL THEN '{name} : {error}' END")
+        elif isinstance(column_type, String) and not isinstance(column_type, SQLEnum) and column_type.length:
+            checks.append(
+                f"CASE WHEN length(t.{name}) > {column_type.length} "
+                f"THEN '{name} : {column_type.length} caractères maximum' END"
+            )
+    
+    site_incomplete = " OR ".join(f"t.{name} IS NULL" for name in SITE_REQUIRED_COLUMNS)
+    checks += [
+        "CASE WHEN t.client_number IS NULL THEN 'client_number manquant' END",
+        "CASE WHEN t.client_type IS NULL OR NOT (t.client_type = ANY(:client_types)) THEN 'client_type invalide' END",
+        "CASE WHEN t.contract_number IS NULL THEN 'contract_number manquant' END",
+        "CASE WHEN ct.code IS NULL THEN 'contract_type_code inconnu' END",
+        "CASE WHEN t.status IS NOT NULL AND NOT (t.status = ANY(:statuses)) THEN 'status invalide' END",
+        "CASE WHEN t.profession_code IS NOT NULL AND pr.code IS NULL THEN 'profession_code inconnu' END",
+        "CASE WHEN t.building_category_code IS NOT NULL AND bc.code IS NULL THEN 'building_category_code inconnu' END",
+        "CASE WHEN t.work_category_code IS NOT NULL AND wc.code IS NULL THEN 'work_category_code inconnu' END",
+        f"CASE WHEN t.site_reference IS NOT NULL AND ({site_incomplete}) "
+        f"THEN 'chantier incomplet ({', '.join(SITE_REQUIRED_COLUMNS)} obligatoires)' END",
+        "CASE WHEN t.contract_number IS NOT NULL "
+        "AND row_number() OVER (PARTITION BY t.contract_number ORDER BY t.line_number DESC) > 1 "
+        "THEN 'contract_number en double dans le fichier (dernière ligne conservée)' END",
+    ]
+    
+    return f"""
+        CREATE UNLOGGED TABLE {checked} AS
+        SELECT t.*, array_remove(ARRAY[{", ".join(checks)}]::text[], NULL) AS errors
+        FROM (
+            SELECT n.line_number, {", ".join(typed)}
+            FROM (SELECT s.line_number, {", ".join(normalized)} FROM {staging} s OFFSET 0) n
+            OFFSET 0
+        ) t
+        LEFT JOIN {InsuranceContractTypeModel.__tablename__} ct ON ct.code = t.contract_type_code
+        LEFT JOIN {ProfessionModel.__tablename__} pr ON pr.code = t.profession_code
+        LEFT JOIN {BuildingCategoryModel.__tablename__} bc ON bc.code = t.building_category_code
+        LEFT JOIN {WorkCategoryModel.__tablename__} wc ON wc.code = t.work_category_code
+    """
+
+
+def _upsert_sql(target, mapping: dict, provided: set, source: str, key: str, extra: dict,
+                defaults: dict = None, always_updated: tuple = ()) -> str:
+    """
+    INSERT ... SELECT ... ON CONFLICT (clé) DO UPDATE.
+    
+    Seules les colonnes présentes dans le fichier (et `always_updated`) sont
+    mises à jour : une colonne absente n'efface pas la valeur existante.
+    """
+    defaults = defaults or {}
+    insert_columns = [attribute for _, attribute in mapping.values()] + list(extra)
+    select_values = []
+    for name, (model, attribute) in mapping.items():
+        value = f"coalesce(c.{name}, {defaults[name]})" if name in defaults else f"c.{name}"
+        column_type = model.__table__.c[attribute].type
+        if isinstance(column_type, SQLEnum):
+            # Pas de conversion implicite text -> enum en INSERT ... SELECT
+            value = f"CAST({value} AS {column_type.name})"
+        select_values.append(value)
+    select_values += list(extra.values())
+    updated = list(always_updated) + [
+        attribute for name, (_, attribute) in mapping.items()
+        if name in provided and attribute != key
+    ] + ["updated_at"]
+    set_clause = ", ".join(f"{attribute} = EXCLUDED.{attribute}" for attribute in updated)
+    return f"""
+        INSERT INTO {target.__tablename__} ({", ".join(insert_columns)})
+        SELECT {", ".join(select_values)}
+        {source}
+        ON CONFLICT ({key}) DO UPDATE SET {set_clause}
+    """
+
+
+def _merge_sql(checked: str, provided: set) -> str:
+    """Fusion clients, chantiers puis contrats en une seule instruction (CTE modifiantes)"""
+    clients = _upsert_sql(
+        ClientModel, CLIENT_COLUMNS, provided,
+        "FROM (SELECT DISTINCT ON (client_number) * FROM clean ORDER BY client_number, line_number DESC) c",
+        "client_number",
+        {"is_active": "true", "created_at": ":now", "updated_at": ":now"},
+        defaults={"country": "'France'"}
+    )
+    sites = _upsert_sql(
+        ConstructionSiteModel, SITE_COLUMNS, provided,
+        "FROM (SELECT DISTINCT ON (site_reference) * FROM clean WHERE site_reference IS NOT NULL "
+        "ORDER BY site_reference, line_number DESC) c",
+        "site_reference",
+        {"is_active": "true", "created_at": ":now", "updated_at": ":now"}
+    )
+    contracts = _upsert_sql(
+        ClientContractModel, CONTRACT_COLUMNS, provided,
+        "FROM clean c JOIN upserted_clients uc ON uc.client_number = c.client_number "
+        "LEFT JOIN upserted_sites us ON us.site_reference = c.site_reference",
+        "contract_number",
+        {"client_id": "uc.id", "construction_site_id": "us.id", "is_renewable": "false",
+         "created_at": ":now", "updated_at": ":now"},
+        defaults={"status": "'brouillon'", "duration_years": "10"},
+        # Le rattachement client / chantier suit le fichier (chantier seulement si la colonne est fournie)
+        always_updated=("client_id", "construction_site_id") if "site_reference" in provided else ("client_id",)
+    )
+    
+    return f"""
+        WITH clean AS (SELECT * FROM {checked} WHERE cardinality(errors) = 0),
+        upserted_clients AS ({clients} RETURNING id, client_number, (xmax = 0) AS inserted),
+        upserted_sites AS ({sites} RETURNING id, site_reference, (xmax = 0) AS inserted),
+        upserted_contracts AS ({contracts} RETURNING (xmax = 0) AS inserted)
+        SELECT
+            (SELECT count(*) FILTER (WHERE inserted) FROM upserted_clients) AS clients_created,
+            (SELECT count(*) FILTER (WHERE NOT inserted) FROM upserted_clients) AS clients_updated,
+            (SELECT count(*) FILTER (WHERE inserted) FROM upserted_sites) AS sites_created,
+            (SELECT count(*) FILTER (WHERE NOT inserted) FROM upserted_sites) AS sites_updated,
+            (SELECT count(*) FILTER (WHERE inserted) FROM upserted_contracts) AS contracts_created,
+            (SELECT count(*) FILTER (WHERE NOT inserted) FROM upserted_contracts) AS contracts_updated
+    """
+
+
+# =============================================================================
+# PIPELINE
+# =============================================================================
+
+def import_portfolio(db: Session, fileobj, filename: str, sheet: str = None, encoding: str = "utf-8") -> dict:
+    """
+    Importe un fichier de portefeuille (CSV ou XLSX) ; lève ValueError si le fichier est inexploitable.
+    
+    Tout l'import est transactionnel : en cas d'erreur, rien n'est fusionné.
+    """
+    started = time.monotonic()
+    if encoding not in COPY_ENCODINGS:
+        raise ValueError(f"Encodage non géré : {encoding} ({', '.join(COPY_ENCODINGS)})")
+    
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        header, source, copy_options = _open_xlsx(fileobj, sheet)
+    else:
+        header, source, copy_options = _open_csv(fileobj, encoding)
+    _check_header(header)
+    
+    # Les colonnes inconnues sont chargées puis ignorées
+    staging_columns = [name if name in IMPORT_COLUMNS else f"ignored_{i}" for i, name in enumerate(header)]
+    ignored = [name for name in header if name and name not in IMPORT_COLUMNS]
+    provided = {name for name in header if name in IMPORT_COLUMNS}
+    
+    batch_id = str(uuid.uuid4())
+    staging = f"import_staging_{batch_id.replace('-', '')[:16]}"
+    checked = f"{staging}_checked"
+    
+    try:
+        db.execute(text(f"SET LOCAL work_mem = '{IMPORT_WORK_MEM}'"))
+        columns_ddl = ", ".join(f"{name} text" for name in staging_columns)
+        db.execute(text(f"CREATE UNLOGGED TABLE {staging} (line_number bigserial, {columns_ddl})"))
+        
+        # 1. Chargement brut par COPY
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert(f"COPY {staging} ({', '.join(staging_columns)}) FROM STDIN WITH ({copy_options})", source)
+        total_rows = cursor.rowcount
+        db.execute(text(f"ANALYZE {staging}"))
+        
+        # 2. Conversion, résolution des codes et validation en une passe
+        db.execute(
+            text(_checked_table_sql(staging, checked, provided)),
+            {
+                "client_types": [value.value for value in ClientTypeEnum],
+                "statuses": [value.value for value in ContractStatusEnum],
+            }
+        )
+        
+        # 3. Rapport des lignes rejetées (numéro de ligne du fichier, en-tête = ligne 1)
+        # Horodatage pris après le chargement : updated_at au plus près du commit
+        now = datetime.utcnow()
+        rejected_rows = db.execute(text(f"""
+            INSERT INTO {ImportRejectionModel.__tablename__} (batch_id, line_number, errors, raw_data, created_at)
+            SELECT :batch_id, k.line_number + 1, array_to_string(k.errors, ' ; '),
+                   json_strip_nulls(row_to_json(s)), :now
+            FROM {checked} k JOIN {staging} s ON s.line_number = k.line_number
+            WHERE cardinality(k.errors) > 0
+        """), {"batch_id": batch_id, "now": now}).rowcount
+        
+        # 4. Fusion des lignes valides
+        merged = db.execute(text(_merge_sql(checked, provided)), {"now": now}).mappings().one()
+        
+        db.execute(text(f"DROP TABLE {checked}, {staging}"))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    
+    return {
+        "batch_id": batch_id,
+        "total_rows": total_rows,
+        "rejected_rows": rejected_rows,
+        **merged,
+        "ignored_columns": ignored,
+        "duration_seconds": round(time.monotonic() - started, 2),
+    }
@@ -0,0 +1,50 @@
+"""Projections de liste : colonnes lourdes différées, rechargées à la demande via ?expand="""
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import defer
+
+# Colonnes texte / JSON non affichées dans les listes (chargées seulement si demandées)
+CLAIM_HEAVY_COLUMNS = (
+    "description", "circumstances", "expert_conclusions", "internal_notes", "rejection_reason",
+    "attached_documents", "third_party_info",
+)
+CONTRACT_HEAVY_COLUMNS = (
+    "special_conditions", "internal_notes", "client_notes",
+    "selected_guarantees", "selected_clauses", "specific_exclusions", "attached_documents",
+)
+
+EXPAND_ALL = "all"
+
+
+def parse_expand(expand: Optional[str], heavy_columns: tuple) -> list:
+    """Colonnes lourdes demandées (?expand=description,internal_notes ou ?expand=all)"""
+    if not expand:
+        return []
+    requested = {field.strip() for field in expand.split(",") if field.strip()}
+    if EXPAND_ALL in requested:
+        return list(heavy_columns)
+    unknown = sorted(requested - set(heavy_columns))
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"expand inconnu : {', '.join(unknown)} (valeurs possibles : {', '.join(heavy_columns)}, {EXPAND_ALL})"
+        )
+    return [column for column in heavy_columns if column in requested]
+
+
+def defer_heavy_columns(query, model, heavy_columns: tuple, expanded: list):
+    """
+    Exclut du SELECT les colonnes lourdes non demandées.
+    raiseload : un accès oublié lève une erreur au lieu d'une requête par ligne.
+    """
+    return query.options(*[
+        defer(getattr(model, column), raiseload=True)
+        for column in heavy_columns if column not in expanded
+    ])
+
+
+def expanded_values(item, expanded: list) -> dict:
+    """Valeurs sérialisables des colonnes lourdes demandées"""
+    return {column: jsonable_encoder(getattr(item, column)) for column in expanded}
@@ -1,10 +1,14 @@
 """Routes API pour la gestion des adresses"""
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
+from app.cache import invalidate_clients
 from app.database import get_db
+from app.geo import MAX_RADIUS_KM, near, parse_bbox, within_bbox
 from app.models import ClientAddressModel
+from app.rows import rows_response, table_columns
 
 router = APIRouter(prefix="/addresses", tags=["Addresses"])
 
@@ -14,46 +18,30 @@ router = APIRouter(prefix="/addresses", tags=["Addresses"])
 def get_all_addresses(
     skip: int = 0,
     limit: int = 100,
+    bbox: Optional[str] = Query(None, description="Rectangle min_lon,min_lat,max_lon,max_lat"),
     db: Session = Depends(get_db)
 ):
-    """Récupérer toutes les adresses"""
-    addresses = db.query(ClientAddressModel).offset(skip).limit(limit).all()
-    
-    return [
-        {
-            "id": addr.id,
-            "client_id": addr.client_id,
-            "address_type": addr.address_type,
-            "name": addr.name,
-            "reference": addr.reference,
-            "address_line1": addr.address_line1,
-            "address_line2": addr.address_line2,
-            "address_line3": addr.address_line3,
-            "postal_code": addr.postal_code,
-            "city": addr.city,
-            "department": addr.department,
-            "region": addr.region,
-            "country": addr.country,
-            "latitude": addr.latitude,
-            "longitude": addr.longitude,
-            "contact_name": addr.contact_name,
-            "contact_phone": addr.contact_phone,
-            "contact_email": addr.contact_email,
-            "warehouse_surface_m2": addr.warehouse_surface_m2,
-            "warehouse_capacity": addr.warehouse_capacity,
-            "stored_materials": addr.stored_materials,
-            "site_start_date": addr.site_start_date,
-            "site_end_date": addr.site_end_date,
-            "site_status": addr.site_status,
-            "display_order": addr.display_order,
-            "is_active": addr.is_active,
-            "is_primary": addr.is_primary,
-            "notes": addr.notes,
-            "created_at": addr.created_at,
-            "updated_at": addr.updated_at
-        }
-        for addr in addresses
-    ]
+    """Récupérer toutes les adresses (lecture Core, sans instances ORM)"""
+    statement = select(*table_columns(ClientAddressModel))
+    if bbox:
+        statement = statement.where(within_bbox(ClientAddressModel, parse_bbox(bbox)))
+    return rows_response(db, statement.order_by(ClientAddressModel.id).offset(skip).limit(limit))
+
+
+@router.get("/near", response_model=List[dict])
+def get_addresses_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=MAX_RADIUS_KM),
+    address_type: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Adresses situées à moins de radius_km du point, de la plus proche à la plus éloignée"""
+    statement = select(*table_columns(ClientAddressModel))
+    if address_type:
+        statement = statement.where(ClientAddressModel.address_type == address_type)
+    return rows_response(db, near(statement, ClientAddressModel, lat, lon, radius_km).limit(limit))
 
 
 @router.get("/{address_id}", response_model=dict)
@@ -105,6 +93,8 @@ def delete_address(address_id: int, db: Session = Depends(get_db)):
     if not db_address:
         raise HTTPException(status_code=404, detail="Adresse non trouvée")
     
+    client_id = db_address.client_id
     db.delete(db_address)
     db.commit()
+    invalidate_clients(client_id)
     return None
@@ -0,0 +1,197 @@
+"""Routes API analytiques : lecture des vues matérialisées uniquement (jamais des tables de production)"""
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import schemas
+from app.accumulation import refresh_accumulation
+from app.analytics import ANALYTICS_SNAPSHOT, claims_monthly, exposure, premium_monthly, refresh_analytics_views
+from app.database import get_db, get_primary_db
+from app.event_impact import iter_event_impact
+from app.geo import parse_footprint
+from app.http_cache import build_etag, conditional_response
+from app.loss_ratio import LOSS_RATIO_SNAPSHOTS
+from app.models import AccumulationCellModel
+from app.rows import rows_response
+
+router = APIRouter(prefix="/analytics", tags=["Analytique"])
+
+
+def _month_range(statement, view, month_from: Optional[date], month_to: Optional[date]):
+    if month_from:
+        statement = statement.where(view.c.month >= month_from.replace(day=1))
+    if month_to:
+        statement = statement.where(view.c.month <= month_to)
+    return statement
+
+
+@router.get("/premiums")
+def get_premium_volume(
+    contract_type_code: Optional[str] = None,
+    status: Optional[str] = None,
+    month_from: Optional[date] = Query(None, description="Premier mois inclus (AAAA-MM-JJ)"),
+    month_to: Optional[date] = Query(None, description="Dernier mois inclus (AAAA-MM-JJ)"),
+    db: Session = Depends(get_db)
+):
+    """Volume de primes par type de contrat, statut et mois (date d'effet)"""
+    statement = select(premium_monthly)
+    if contract_type_code:
+        statement = statement.where(premium_monthly.c.contract_type_code == contract_type_code)
+    if status:
+        statement = statement.where(premium_monthly.c.status == status)
+    statement = _month_range(statement, premium_monthly, month_from, month_to)
+    return rows_response(db, statement.order_by(
+        premium_monthly.c.month, premium_monthly.c.contract_type_code, premium_monthly.c.status
+    ))
+
+
+@router.get("/claims-cost")
+def get_claims_cost(
+    claim_type: Optional[str] = None,
+    severity: Optional[str] = None,
+    month_from: Optional[date] = Query(None, description="Premier mois inclus (AAAA-MM-JJ)"),
+    month_to: Optional[date] = Query(None, description="Dernier mois inclus (AAAA-MM-JJ)"),
+    db: Session = Depends(get_db)
+):
+    """Coût des sinistres (estimé, expertisé, indemnisé, provisionné) par type, gravité et mois de déclaration"""
+    statement = select(claims_monthly)
+    if claim_type:
+        statement = statement.where(claims_monthly.c.claim_type == claim_type)
+    if severity:
+        statement = statement.where(claims_monthly.c.severity == severity)
+    statement = _month_range(statement, claims_monthly, month_from, month_to)
+    return rows_response(db, statement.order_by(
+        claims_monthly.c.month, claims_monthly.c.claim_type, claims_monthly.c.severity
+    ))
+
+
+@router.get("/exposure")
+def get_exposure(
+    building_category: Optional[str] = None,
+    work_category: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Exposition (chantiers, contrats actifs, capitaux assurés, coût de construction) par catégorie"""
+    statement = select(exposure)
+    if building_category:
+        statement = statement.where(exposure.c.building_category_code == building_category)
+    if work_category:
+        statement = statement.where(exposure.c.work_category_code == work_category)
+    return rows_response(db, statement.order_by(exposure.c.building_category_code, exposure.c.work_category_code))
+
+
+@router.get("/loss-ratio")
+def get_loss_ratio(
+    request: Request,
+    response: Response,
+    dimension: schemas.LossRatioDimensionEnum = schemas.LossRatioDimensionEnum.CONTRACT_TYPE,
+    key: Optional[str] = Query(None, description="Valeur de la dimension (id client, id chantier, code type, code courtier, année)"),
+    min_earned_premium: float = Query(0, ge=0, description="Prime acquise minimale (écarte les S/P non significatifs)"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Ratios sinistres / primes : (indemnités + provisions) / primes acquises, par dimension.
+    
+    Triés par S/P décroissant (par année pour `accident_year`). Calculés par une requête agrégée
+    par dimension et servis depuis la mémoire, recalculés en tâche de fond après
+    LOSS_RATIO_REFRESH_SECONDS secondes.
+    """
+    snapshot = LOSS_RATIO_SNAPSHOTS[dimension.value]
+    data = snapshot.get()
+    etag = build_etag("loss_ratio", dimension.value, snapshot.generated_at.isoformat(), sorted(request.query_params.multi_items()))
+    not_modified = conditional_response(request, response, etag)
+    if not_modified:
+        return not_modified
+    
+    items = data["items"]
+    if key is not None:
+        items = [item for item in items if item["key"] == key]
+    if min_earned_premium:
+        items = [item for item in items if item["earned_premium"] >= min_earned_premium]
+    
+    return {
+        "dimension": dimension.value,
+        "generated_at": snapshot.generated_at,
+        "stale": snapshot.is_stale,
+        "totals": data["totals"],
+        "total_items": len(items),
+        "skip": skip,
+        "limit": limit,
+        "items": items[skip:skip + limit],
+    }
+
+
+# Montants cumulés (bruts : somme des contrats, nets : plafonnés à la valeur de chaque chantier)
+ACCUMULATION_AMOUNTS = ("insured_amount_gross", "guarantee_ceiling_gross", "insured_amount", "guarantee_ceiling")
+
+
+@router.get("/accumulation")
+def get_accumulation(
+    department: Optional[str] = None,
+    seismic_zone: Optional[int] = Query(None, ge=0, le=5, description="Zone sismique 1 à 5 (0 : non renseignée)"),
+    flood_zone: Optional[bool] = None,
+    limit: int = Query(1000, ge=1, le=5000),
+    db: Session = Depends(get_primary_db)
+):
+    """
+    Cumuls catastrophe par département x zone sismique x zone inondable, du plus exposé au moins exposé.
+    
+    Exposition des contrats actifs par chantier : brute (somme des montants assurés / plafonds de
+    garanties) et nette (plafonnée à la valeur du chantier, chaque chantier n'étant compté qu'une fois
+    même s'il est couvert par plusieurs contrats). Les modifications en attente sont appliquées avant lecture.
+    """
+    refresh_accumulation(db)
+    
+    columns = AccumulationCellModel.__table__.c
+    statement = select(*[column for column in columns if column.key != "updated_at"])
+    if department:
+        statement = statement.where(columns.department == department)
+    if seismic_zone is not None:
+        statement = statement.where(columns.seismic_zone == seismic_zone)
+    if flood_zone is not None:
+        statement = statement.where(columns.flood_zone == flood_zone)
+    cells = [dict(row) for row in db.execute(statement.order_by(columns.insured_amount.desc())).mappings()]
+    
+    totals = {
+        name: sum(cell[name] for cell in cells)
+        for name in ("sites_count", "shared_sites_count", "contracts_count")
+    }
+    totals.update({name: round(sum(cell[name] for cell in cells), 2) for name in ACCUMULATION_AMOUNTS})
+    return {
+        "totals": totals,
+        "total_cells": len(cells),
+        "cells": [
+            {**cell, **{name: round(cell[name], 2) for name in ACCUMULATION_AMOUNTS}}
+            for cell in cells[:limit]
+        ],
+    }
+
+
+@router.post("/event-impact")
+def get_event_impact(event: schemas.EventImpactRequest):
+    """
+    Contrats actifs touchés par un événement (emprise GeoJSON : Polygon / MultiPolygon, ou Point et radius_km).
+    
+    Localisation par le chantier du contrat, ou pour les contrats sans chantier par les adresses du
+    client (`include_addresses`). Chaque contrat est accompagné de son montant assuré et de ses sinistres
+    ouverts. La liste est diffusée au fil de la lecture ; les totaux (`summary`) terminent la réponse.
+    """
+    footprint = parse_footprint(event.footprint, event.radius_km)
+    return StreamingResponse(iter_event_impact(footprint, event.include_addresses), media_type="application/json")
+
+
+@router.get("/status")
+def get_analytics_status():
+    """Dernier rafraîchissement de chaque vue analytique"""
+    return {**ANALYTICS_SNAPSHOT.get(), "refresh_interval": ANALYTICS_SNAPSHOT.refresh_interval}
+
+
+@router.post("/refresh")
+def refresh_analytics(force: bool = Query(False, description="Rafraîchir même si les tables sources n'ont pas changé"), db: Session = Depends(get_db)):
+    """Rafraîchit immédiatement les vues dont les tables sources ont changé"""
+    return refresh_analytics_views(db, force=force)
@@ -1,18 +1,29 @@
 """Routes API pour la gestion des sinistres construction"""
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, select, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from typing import List, Optional
 from datetime import datetime
 
 from app.database import get_db
+from app.bulk import BulkUpserter, run_bulk_upsert
 from app import schemas
-from app.models import ClaimModel, ClientContractModel, ClientModel
+from app.http_cache import build_etag, cache_headers, conditional_response, is_not_modified
+from app.includes import include_related, parse_include
+from app.pagination import COUNT_DESCRIPTION, count_total, fetch_page, page_metadata
+from app.projections import CLAIM_HEAVY_COLUMNS, parse_expand, defer_heavy_columns, expanded_values
+from app.statistics import compute_claims_stats
+from app.models import (
+    ClaimModel, ClientContractModel, ClientModel, ConstructionSiteModel, GuaranteeModel, contract_guarantees
+)
 
 router = APIRouter(prefix="/claims", tags=["Sinistres"])
 
+EXPAND_DESCRIPTION = f"Colonnes lourdes à inclure, séparées par des virgules, ou 'all' : {', '.join(CLAIM_HEAVY_COLUMNS)}"
+
 
 @router.post("/", response_model=schemas.Claim, status_code=status.HTTP_201_CREATED)
 @router.post("", response_model=schemas.Claim, status_code=status.HTTP_201_CREATED)
@@ -35,18 +46,46 @@ def create_claim(claim: schemas.ClaimCreate, db: Session = Depends(get_db)):
     return db_claim
 
 
+# Upsert en masse sur le numéro de sinistre (contract_number accepté à la place de contract_id)
+CLAIM_BULK_UPSERT = BulkUpserter(
+    ClaimModel, "claim_number", schemas.ClaimCreate,
+    references={"contract_id": ClientContractModel, "construction_site_id": ConstructionSiteModel},
+    lookups={"contract_number": ("contract_id", ClientContractModel.contract_number)}
+)
+
+
+@router.post("/bulk", response_model=schemas.BulkUpsertResponse)
+async def bulk_upsert_claims(
+    request: Request,
+    errors_only: bool = Query(False, description="Ne retourner que les lignes en échec"),
+    db: Session = Depends(get_db)
+):
+    """
+    Créer ou mettre à jour des sinistres en masse.
+    
+    Corps : tableau JSON ou flux NDJSON (`Content-Type: application/x-ndjson`).
+    Le contrat peut être désigné par `contract_id` ou `contract_number`. Les
+    lignes sont upsertées sur `claim_number` (une instruction et un commit par lot).
+    """
+    return await run_bulk_upsert(request, db, CLAIM_BULK_UPSERT, errors_only)
+
+
 @router.get("/")
 @router.get("")
 def list_claims(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     contract_id: Optional[int] = None,
-    status: Optional[str] = None,
-    claim_type: Optional[str] = None,
-    severity: Optional[str] = None,
+    status: Optional[schemas.ClaimStatusEnum] = None,
+    claim_type: Optional[schemas.ClaimTypeEnum] = None,
+    severity: Optional[schemas.ClaimSeverityEnum] = None,
+    activated_guarantee: Optional[str] = Query(None, description="Code d'une garantie activée (ex: GAR_DEC_01)"),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    count: schemas.CountModeEnum = Query(schemas.CountModeEnum.EXACT, description=COUNT_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
-    """Liste des sinistres avec filtres et pagination"""
+    """Liste des sinistres avec filtres et pagination (projection de liste, voir `expand` et `count`)"""
+    expanded = parse_expand(expand, CLAIM_HEAVY_COLUMNS)
     query = db.query(ClaimModel)
     
     if contract_id:
@@ -61,13 +100,21 @@ def list_claims(
     if severity:
         query = query.filter(ClaimModel.severity == severity)
     
-    total = query.count()
-    items = query.order_by(ClaimModel.declaration_date.desc()).offset(skip).limit(limit).all()
+    if activated_guarantee:
+        # Contenance JSONB (@>) : index GIN jsonb_path_ops
+        query = query.filter(ClaimModel.activated_guarantees.contains([activated_guarantee]))
+    
+    total, estimated = count_total(db, query, count)
+    items, has_more = fetch_page(
+        defer_heavy_columns(query, ClaimModel, CLAIM_HEAVY_COLUMNS, expanded).order_by(ClaimModel.declaration_date.desc()),
+        skip, limit
+    )
     
     # Enrichir avec les informations client
     items_dict = []
     for item in items:
-        claim_dict = jsonable_encoder(schemas.Claim.from_orm(item))
+        claim_dict = jsonable_encoder(schemas.ClaimSummary.from_orm(item))
+        claim_dict.update(expanded_values(item, expanded))
         
         # Récupérer le contrat et le client
         contract = db.query(ClientContractModel).filter(ClientContractModel.id == item.contract_id).first()
@@ -87,25 +134,23 @@ def list_claims(
     
     return JSONResponse(content={
         "items": items_dict,
-        "total": total,
-        "skip": skip,
-        "limit": limit,
-        "page": (skip // limit) + 1,
-        "pages": (total + limit - 1) // limit
+        **page_metadata(total, estimated, has_more, skip, limit, count)
     })
 
 
-@router.get("/search", response_model=List[schemas.Claim])
+@router.get("/search", response_model=List[dict])
 def search_claims(
     query: Optional[str] = Query(None, description="Numéro de sinistre, titre, N° contrat, N° client ou nom client"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
-    """Recherche de sinistres par numéro, titre, contrat ou client"""
+    """Recherche de sinistres par numéro, titre, contrat ou client (projection de liste, voir `expand`)"""
     if not query:
         raise HTTPException(status_code=400, detail="Le paramètre 'query' est requis")
     
+    expanded = parse_expand(expand, CLAIM_HEAVY_COLUMNS)
     search_filter = f"%{query}%"
     
     # Recherche dans les sinistres avec jointure sur contrat et client
@@ -122,12 +167,14 @@ def search_claims(
         (ClientModel.first_name.ilike(search_filter)) |
         (ClientModel.last_name.ilike(search_filter)) |
         (ClientModel.company_name.ilike(search_filter))
-    ).offset(skip).limit(limit).all()
+    )
+    claims = defer_heavy_columns(claims, ClaimModel, CLAIM_HEAVY_COLUMNS, expanded).offset(skip).limit(limit).all()
     
     # Enrichir avec les informations client
     result = []
     for claim in claims:
-        claim_dict = jsonable_encoder(schemas.Claim.from_orm(claim))
+        claim_dict = jsonable_encoder(schemas.ClaimSummary.from_orm(claim))
+        claim_dict.update(expanded_values(claim, expanded))
         
         # Récupérer le contrat et le client
         contract = db.query(ClientContractModel).filter(ClientContractModel.id == claim.contract_id).first()
@@ -148,66 +195,157 @@ def search_claims(
     return JSONResponse(content=result)
 
 
-@router.get("/contract/{contract_id}", response_model=List[schemas.Claim])
+@router.get("/contract/{contract_id}", response_model=List[dict])
 def get_claims_by_contract(
     contract_id: int,
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
-    """Récupère tous les sinistres d'un contrat"""
-    contract = db.query(ClientContractModel).filter(ClientContractModel.id == contract_id).first()
+    """Récupère tous les sinistres d'un contrat (projection de liste, voir `expand`)"""
+    expanded = parse_expand(expand, CLAIM_HEAVY_COLUMNS)
+    contract = db.query(ClientContractModel.id).filter(ClientContractModel.id == contract_id).first()
     if not contract:
         raise HTTPException(status_code=404, detail="Contrat non trouvé")
     
-    claims = db.query(ClaimModel).filter(ClaimModel.contract_id == contract_id).order_by(
-        ClaimModel.declaration_date.desc()
-    ).all()
+    claims = defer_heavy_columns(
+        db.query(ClaimModel).filter(ClaimModel.contract_id == contract_id),
+        ClaimModel, CLAIM_HEAVY_COLUMNS, expanded
+    ).order_by(ClaimModel.declaration_date.desc()).all()
     
-    return claims
+    return [
+        {**jsonable_encoder(schemas.ClaimSummary.from_orm(claim)), **expanded_values(claim, expanded)}
+        for claim in claims
+    ]
 
 
 @router.get("/stats", response_model=dict)
 def get_claims_statistics(db: Session = Depends(get_db)):
     """Statistiques sur les sinistres"""
-    total = db.query(ClaimModel).count()
-    open_claims = db.query(ClaimModel).filter(
-        ClaimModel.status.in_(["declare", "pris_en_compte", "en_cours_expertise", "attente_pieces", "accepte"])
-    ).count()
-    settled = db.query(ClaimModel).filter(ClaimModel.status == "regle").count()
-    rejected = db.query(ClaimModel).filter(ClaimModel.status == "refuse").count()
-    
-    # Montants
-    total_estimated = db.query(ClaimModel).with_entities(
-        func.sum(ClaimModel.estimated_amount)
-    ).scalar() or 0
-    
-    total_indemnity = db.query(ClaimModel).with_entities(
-        func.sum(ClaimModel.indemnity_amount)
-    ).scalar() or 0
-    
-    # Par type
-    by_type = {}
-    for claim_type in ["structurel", "degats_des_eaux", "incendie", "intemperies", "vol", "vandalisme", "malfacons", "rc", "autre"]:
-        count = db.query(ClaimModel).filter(ClaimModel.claim_type == claim_type).count()
-        by_type[claim_type] = count
-    
-    return {
-        "total_claims": total,
-        "open_claims": open_claims,
-        "settled_claims": settled,
-        "rejected_claims": rejected,
-        "total_estimated_amount": total_estimated,
-        "total_indemnity_amount": total_indemnity,
-        "claims_by_type": by_type
-    }
+    return compute_claims_stats(db)
+
+
+# Garanties du contrat du sinistre, agrégées en JSON dans la requête principale
+_guarantee_code = func.coalesce(GuaranteeModel.code, contract_guarantees.c.guarantee_code)
+_guarantees_join = contract_guarantees.outerjoin(
+    GuaranteeModel, GuaranteeModel.id == contract_guarantees.c.guarantee_id
+)
+CLAIM_CONTRACT_GUARANTEES = select(
+    func.coalesce(
+        func.json_agg(aggregate_order_by(
+            func.json_build_object(
+                "code", _guarantee_code,
+                "name", func.coalesce(GuaranteeModel.name, _guarantee_code),
+                "ceiling", contract_guarantees.c.custom_ceiling,
+                "franchise", contract_guarantees.c.custom_franchise,
+                "included", contract_guarantees.c.is_included,
+                "annual_premium", contract_guarantees.c.annual_premium
+            ),
+            _guarantee_code
+        )),
+        literal_column("'[]'::json")
+    )
+).select_from(_guarantees_join).where(
+    contract_guarantees.c.contract_id == ClaimModel.contract_id
+).scalar_subquery()
+
+# Version des garanties (nombre, dernière mise à jour) pour l'ETag
+CLAIM_CONTRACT_GUARANTEES_COUNT = select(func.count()).where(
+    contract_guarantees.c.contract_id == ClaimModel.contract_id
+).scalar_subquery()
+CLAIM_CONTRACT_GUARANTEES_UPDATED_AT = select(func.max(contract_guarantees.c.updated_at)).where(
+    contract_guarantees.c.contract_id == ClaimModel.contract_id
+).scalar_subquery()
+# Libellés lus dans le référentiel des garanties : sa dernière mise à jour fait partie de la version
+CLAIM_REFERENTIAL_GUARANTEES_UPDATED_AT = select(func.max(GuaranteeModel.updated_at)).select_from(
+    _guarantees_join
+).where(
+    contract_guarantees.c.contract_id == ClaimModel.contract_id
+).scalar_subquery()
+
+
+@router.get("/{claim_number}/context", response_model=schemas.ClaimContext)
+def get_claim_context(claim_number: str, request: Request, db: Session = Depends(get_db)):
+    """
+    Sinistre, contrat (avec garanties), client et chantier en une seule requête SQL,
+    pour l'écran de détail d'un sinistre.
+    """
+    row = db.query(
+        ClaimModel,
+        CLAIM_CONTRACT_GUARANTEES.label("guarantees"),
+        CLAIM_CONTRACT_GUARANTEES_COUNT.label("guarantees_count"),
+        CLAIM_CONTRACT_GUARANTEES_UPDATED_AT.label("guarantees_updated_at"),
+        CLAIM_REFERENTIAL_GUARANTEES_UPDATED_AT.label("referential_updated_at")
+    ).options(
+        joinedload(ClaimModel.construction_site),
+        joinedload(ClaimModel.contract).joinedload(ClientContractModel.client),
+        joinedload(ClaimModel.contract).joinedload(ClientContractModel.construction_site)
+    ).filter(ClaimModel.claim_number == claim_number).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Sinistre non trouvé")
+    
+    claim = row.ClaimModel
+    contract = claim.contract
+    client = contract.client
+    site = claim.construction_site or contract.construction_site
+    
+    versions = [claim.updated_at, contract.updated_at, client.updated_at, site.updated_at if site else None]
+    last_modified = max(
+        (d for d in versions + [row.guarantees_updated_at, row.referential_updated_at] if d),
+        default=None
+    )
+    etag = build_etag(
+        "claim-context", claim.id, contract.id, client.id, site.id if site else None,
+        *versions, row.guarantees_count, row.guarantees_updated_at, row.referential_updated_at
+    )
+    headers = cache_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    
+    contract_dict = jsonable_encoder(schemas.ClientContract.from_orm(contract))
+    contract_dict["guarantees"] = row.guarantees
+    return JSONResponse(content={
+        "claim": jsonable_encoder(schemas.Claim.from_orm(claim)),
+        "contract": contract_dict,
+        "client": jsonable_encoder(schemas.Client.from_orm(client)),
+        "construction_site": jsonable_encoder(schemas.ConstructionSite.from_orm(site)) if site else None
+    }, headers=headers)
 
 
 @router.get("/{claim_number}", response_model=schemas.Claim)
-def get_claim(claim_number: str, db: Session = Depends(get_db)):
-    """Récupérer un sinistre par son numéro"""
-    claim = db.query(ClaimModel).filter(ClaimModel.claim_number == claim_number).first()
-    if not claim:
+def get_claim(
+    claim_number: str,
+    request: Request,
+    response: Response,
+    include: Optional[str] = Query(
+        None, description="Ressources liées à inclure (ex: contract.client,contract.construction_site,guarantees)"
+    ),
+    db: Session = Depends(get_db)
+):
+    """Récupérer un sinistre par son numéro, avec ses ressources liées si `include` est fourni"""
+    tree = parse_include(include, "claim")
+    version = db.query(ClaimModel.id, ClaimModel.updated_at).filter(
+        ClaimModel.claim_number == claim_number
+    ).first()
+    if not version:
         raise HTTPException(status_code=404, detail="Sinistre non trouvé")
-    return claim
+    
+    if tree:
+        claim = db.query(ClaimModel).filter(ClaimModel.id == version.id).first()
+        embedded, versions = include_related(db, "claim", claim, tree)
+        # La version du document composé couvre toutes les ressources incluses
+        etag = build_etag("claim", version.id, version.updated_at, include, versions)
+        headers = cache_headers(etag, version.updated_at)
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        content = {**jsonable_encoder(schemas.Claim.from_orm(claim)), **embedded}
+        return JSONResponse(content=content, headers=headers)
+    
+    etag = build_etag("claim", version.id, version.updated_at)
+    not_modified = conditional_response(request, response, etag, version.updated_at)
+    if not_modified:
+        return not_modified
+    
+    return db.query(ClaimModel).filter(ClaimModel.id == version.id).first()
 
 
 @router.put("/{claim_number}", response_model=schemas.Claim)
@@ -1,16 +1,26 @@
 """Routes API pour la gestion des clients"""
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import unicodedata
 import re
 
-from app.database import get_db
+from app.database import get_db, get_primary_db
+from app.bulk import BulkUpserter, run_bulk_upsert
+from app.cache import CLIENTS_TAG, cache, cached_response, client_tag, invalidate_clients
 from app import schemas
+from app.http_cache import build_etag, cache_headers, conditional_response, is_not_modified
+from app.includes import include_related, parse_include
 from app.models import ClientModel, ClientAddressModel
 
 router = APIRouter(prefix="/clients", tags=["Clients"])
 
+# Durée de vie de la vue complète d'un client en cache (secondes) : filet de sécurité
+# pour les écritures faites hors de l'API (scripts, SQL direct)
+CLIENT_FULL_CACHE_TTL = 300
+
 
 # =============================================================================
 # FONCTIONS UTILITAIRES POUR RECHERCHE PHONÉTIQUE
@@ -96,12 +106,35 @@ def create_client(client: schemas.ClientCreate, db: Session = Depends(get_db)):
     return db_client
 
 
+# Upsert en masse sur le numéro client
+CLIENT_BULK_UPSERT = BulkUpserter(ClientModel, "client_number", schemas.ClientCreate)
+
+
+@router.post("/bulk", response_model=schemas.BulkUpsertResponse)
+async def bulk_upsert_clients(
+    request: Request,
+    errors_only: bool = Query(False, description="Ne retourner que les lignes en échec"),
+    db: Session = Depends(get_db)
+):
+    """
+    Créer ou mettre à jour des clients en masse.
+    
+    Corps : tableau JSON ou flux NDJSON (`Content-Type: application/x-ndjson`).
+    Chaque ligne est validée comme pour la création puis upsertée sur
+    `client_number` par lots (une instruction et un commit par lot).
+    Retourne le statut de chaque ligne : created, updated, invalid, duplicate, error.
+    """
+    result = await run_bulk_upsert(request, db, CLIENT_BULK_UPSERT, errors_only)
+    cache.invalidate(CLIENTS_TAG)
+    return result
+
+
 @router.get("/", response_model=List[schemas.Client])
 @router.get("", response_model=List[schemas.Client])
 def list_clients(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    client_type: Optional[str] = None,
+    client_type: Optional[schemas.ClientTypeEnum] = None,
     is_active: Optional[bool] = None,
     search: Optional[str] = None,
     db: Session = Depends(get_db)
@@ -199,8 +232,23 @@ def search_clients(
 
 
 @router.get("/{client_id}/full", response_model=dict)
-def get_client_full(client_id: int, db: Session = Depends(get_db)):
-    """Récupérer un client avec toutes ses relations (adresses, contrats, etc.)"""
+def get_client_full(client_id: int, db: Session = Depends(get_primary_db)):
+    """
+    Récupérer un client avec toutes ses relations (adresses, contrats, etc.).
+    Vue mise en cache (partagée entre workers), invalidée par les écritures sur le client,
+    ses adresses, ses contrats et leurs chantiers. Calculée sur le primaire : une réplique
+    en retard remettrait en cache une version antérieure à l'invalidation.
+    """
+    return cached_response(
+        f"client_full:{client_id}",
+        lambda: build_client_full(db, client_id),
+        CLIENT_FULL_CACHE_TTL,
+        tags=(CLIENTS_TAG, client_tag(client_id))
+    )
+
+
+def build_client_full(db: Session, client_id: int) -> dict:
+    """Vue complète d'un client (404 si absent)"""
     from sqlalchemy.orm import joinedload
     from app.models import ClientContractModel, ClientAddressModel, ContractHistoryModel
     
@@ -320,21 +368,56 @@ def get_client_full(client_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/{client_id}", response_model=schemas.Client)
-def get_client(client_id: int, db: Session = Depends(get_db)):
-    """Récupérer un client par son ID (informations de base uniquement)"""
-    client = db.query(ClientModel).filter(ClientModel.id == client_id).first()
-    if not client:
+def get_client(
+    client_id: int,
+    request: Request,
+    response: Response,
+    include: Optional[str] = Query(
+        None, description="Ressources liées à inclure (ex: contracts.construction_site,contracts.guarantees,addresses)"
+    ),
+    db: Session = Depends(get_db)
+):
+    """Récupérer un client par son ID (informations de base, ressources liées si `include` est fourni)"""
+    tree = parse_include(include, "client")
+    # Lecture de la version seule pour répondre 304 sans charger le client
+    version = db.query(ClientModel.id, ClientModel.updated_at).filter(ClientModel.id == client_id).first()
+    if not version:
         raise HTTPException(status_code=404, detail="Client non trouvé")
-    return client
+    
+    if tree:
+        client = db.query(ClientModel).filter(ClientModel.id == version.id).first()
+        embedded, versions = include_related(db, "client", client, tree)
+        # La version du document composé couvre toutes les ressources incluses
+        etag = build_etag("client", version.id, version.updated_at, include, versions)
+        headers = cache_headers(etag, version.updated_at)
+        if is_not_modified(request, etag):
+            return Response(status_code=304, headers=headers)
+        content = {**jsonable_encoder(schemas.Client.from_orm(client)), **embedded}
+        return JSONResponse(content=content, headers=headers)
+    
+    etag = build_etag("client", version.id, version.updated_at)
+    not_modified = conditional_response(request, response, etag, version.updated_at)
+    if not_modified:
+        return not_modified
+    
+    return db.query(ClientModel).filter(ClientModel.id == client_id).first()
 
 
 @router.get("/number/{client_number}", response_model=schemas.Client)
-def get_client_by_number(client_number: str, db: Session = Depends(get_db)):
+def get_client_by_number(client_number: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Récupérer un client par son numéro"""
-    client = db.query(ClientModel).filter(ClientModel.client_number == client_number).first()
-    if not client:
+    version = db.query(ClientModel.id, ClientModel.updated_at).filter(
+        ClientModel.client_number == client_number
+    ).first()
+    if not version:
         raise HTTPException(status_code=404, detail="Client non trouvé")
-    return client
+    
+    etag = build_etag("client", version.id, version.updated_at)
+    not_modified = conditional_response(request, response, etag, version.updated_at)
+    if not_modified:
+        return not_modified
+    
+    return db.query(ClientModel).filter(ClientModel.id == version.id).first()
 
 
 @router.put("/{client_id}", response_model=schemas.Client)
@@ -349,6 +432,7 @@ def update_client(client_id: int, client_update: schemas.ClientUpdate, db: Sessi
         setattr(db_client, field, value)
     
     db.commit()
+    invalidate_clients(client_id)
     db.refresh(db_client)
     return db_client
 
@@ -362,6 +446,7 @@ def delete_client(client_id: int, db: Session = Depends(get_db)):
     
     db_client.is_active = False
     db.commit()
+    invalidate_clients(client_id)
     return None
 
 
@@ -383,6 +468,7 @@ def create_client_address(client_id: int, address: schemas.ClientAddressCreate,
     )
     db.add(db_address)
     db.commit()
+    invalidate_clients(client_id)
     db.refresh(db_address)
     return db_address
 
@@ -390,7 +476,7 @@ def create_client_address(client_id: int, address: schemas.ClientAddressCreate,
 @router.get("/{client_id}/addresses", response_model=List[schemas.ClientAddress])
 def list_client_addresses(
     client_id: int,
-    address_type: Optional[str] = None,
+    address_type: Optional[schemas.AddressTypeEnum] = None,
     is_active: Optional[bool] = True,
     db: Session = Depends(get_db)
 ):
@@ -427,6 +513,7 @@ def update_client_address(address_id: int, address_update: schemas.ClientAddress
         setattr(db_address, field, value)
     
     db.commit()
+    invalidate_clients(db_address.client_id)
     db.refresh(db_address)
     return db_address
 
@@ -438,6 +525,8 @@ def delete_client_address(address_id: int, db: Session = Depends(get_db)):
     if not db_address:
         raise HTTPException(status_code=404, detail="Adresse non trouvée")
     
+    client_id = db_address.client_id
     db.delete(db_address)
     db.commit()
+    invalidate_clients(client_id)
     return None
@@ -1,18 +1,27 @@
 """Routes API pour la gestion des contrats"""
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, func
 from typing import List, Optional
 import uuid
 from datetime import date
 
 from app.database import get_db
+from app.bulk import BulkUpserter, run_bulk_upsert
 from app import schemas
-from app.models import ClientContractModel, ClientModel, ConstructionSiteModel, contract_guarantees
+from app.cache import CLIENTS_TAG, cache, invalidate_clients
+from app.http_cache import build_etag, cache_headers, conditional_response, is_not_modified
+from app.includes import include_related, parse_include
+from app.pagination import COUNT_DESCRIPTION, count_total, fetch_page, page_metadata
+from app.projections import CONTRACT_HEAVY_COLUMNS, parse_expand, defer_heavy_columns, expanded_values
+from app.statistics import compute_contract_stats
+from app.models import ClientContractModel, ClientModel, ConstructionSiteModel, GuaranteeModel, contract_guarantees
 
 router = APIRouter(prefix="/contracts", tags=["Contrats"])
 
+EXPAND_DESCRIPTION = f"Colonnes lourdes à inclure, séparées par des virgules, ou 'all' : {', '.join(CONTRACT_HEAVY_COLUMNS)}"
+
 
 @router.post("/", response_model=schemas.ClientContract, status_code=status.HTTP_201_CREATED)
 @router.post("", response_model=schemas.ClientContract, status_code=status.HTTP_201_CREATED)
@@ -40,22 +49,54 @@ def create_contract(contract: schemas.ClientContractCreate, db: Session = Depend
     )
     db.add(db_contract)
     db.commit()
+    invalidate_clients(contract.client_id)
     db.refresh(db_contract)
     return db_contract
 
 
+# Upsert en masse sur le numéro de contrat (client_number accepté à la place de client_id)
+CONTRACT_BULK_UPSERT = BulkUpserter(
+    ClientContractModel, "contract_number", schemas.ClientContractCreate,
+    references={"client_id": ClientModel, "construction_site_id": ConstructionSiteModel},
+    lookups={"client_number": ("client_id", ClientModel.client_number)}
+)
+
+
+@router.post("/bulk", response_model=schemas.BulkUpsertResponse)
+async def bulk_upsert_contracts(
+    request: Request,
+    errors_only: bool = Query(False, description="Ne retourner que les lignes en échec"),
+    db: Session = Depends(get_db)
+):
+    """
+    Créer ou mettre à jour des contrats en masse.
+    
+    Corps : tableau JSON ou flux NDJSON (`Content-Type: application/x-ndjson`).
+    Le client peut être désigné par `client_id` ou `client_number`. Les clients
+    et chantiers référencés sont vérifiés par lot, puis les lignes sont upsertées
+    sur `contract_number` (une instruction et un commit par lot).
+    """
+    result = await run_bulk_upsert(request, db, CONTRACT_BULK_UPSERT, errors_only)
+    cache.invalidate(CLIENTS_TAG)
+    return result
+
+
 @router.get("/")
 @router.get("")
 def list_contracts(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     client_id: Optional[str] = None,
-    status: Optional[str] = None,
+    status: Optional[schemas.ContractStatusEnum] = None,
     contract_type_code: Optional[str] = None,
     search: Optional[str] = None,
+    clause: Optional[str] = Query(None, description="Code d'une clause sélectionnée (ex: CL_001)"),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    count: schemas.CountModeEnum = Query(schemas.CountModeEnum.EXACT, description=COUNT_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
-    """Liste des contrats avec filtres"""
+    """Liste des contrats avec filtres (projection de liste, voir `expand` et `count`)"""
+    expanded = parse_expand(expand, CONTRACT_HEAVY_COLUMNS)
     query = db.query(ClientContractModel)
     
     if client_id:
@@ -74,10 +115,32 @@ def list_contracts(
             (ClientContractModel.external_reference.ilike(search_filter))
         )
     
-    # Compter le total avant la pagination
-    total = query.count()
+    if clause:
+        # Contenance JSONB (@>) : index GIN jsonb_path_ops
+        query = query.filter(ClientContractModel.selected_clauses.contains([{"code": clause}]))
+    
+    # Total selon le mode demandé (exact, estimé ou aucun)
+    total, estimated = count_total(db, query, count)
     
-    contracts = query.offset(skip).limit(limit).all()
+    contracts, has_more = fetch_page(
+        defer_heavy_columns(query, ClientContractModel, CONTRACT_HEAVY_COLUMNS, expanded),
+        skip, limit
+    )
+    
+    # Garanties de la page en une requête (jointure entière, index couvrant)
+    guarantee_codes = {}
+    if contracts:
+        guarantee_rows = db.execute(
+            text("""
+                SELECT cg.contract_id, coalesce(g.code, cg.guarantee_code) AS code
+                FROM fake_contract_guarantees cg
+                LEFT JOIN fake_ref_guarantees g ON g.id = cg.guarantee_id
+                WHERE cg.contract_id = ANY(:contract_ids)
+            """),
+            {"contract_ids": [contract.id for contract in contracts]}
+        )
+        for contract_id, code in guarantee_rows:
+            guarantee_codes.setdefault(contract_id, []).append(code)
     
     # Enrichir avec les données des chantiers et garanties
     result = []
@@ -99,13 +162,13 @@ def list_contracts(
             "duration_years": contract.duration_years,
             "is_renewable": contract.is_renewable,
             "external_reference": contract.external_reference,
-            "special_conditions": contract.special_conditions,
             "construction_site_id": contract.construction_site_id,
             "created_at": contract.created_at.isoformat() if contract.created_at else None,
             "updated_at": contract.updated_at.isoformat() if contract.updated_at else None,
             "construction_site": None,
             "guarantees": []
         }
+        contract_dict.update(expanded_values(contract, expanded))
         
         # Ajouter les infos du chantier si présent
         if contract.construction_site_id:
@@ -119,41 +182,48 @@ def list_contracts(
                     "site_name": site.site_name
                 }
         
-        # Compter les garanties
-        guarantees = db.execute(
-            text("SELECT guarantee_code FROM fake_contract_guarantees WHERE contract_id = :contract_id"),
-            {"contract_id": contract.id}
-        ).fetchall()
-        
-        contract_dict["guarantees"] = [{"code": g[0]} for g in guarantees]
+        contract_dict["guarantees"] = [{"code": code} for code in guarantee_codes.get(contract.id, [])]
         
         result.append(contract_dict)
     
     # Retourner avec métadonnées de pagination
     response = {
         "items": result,
-        "total": total,
-        "skip": skip,
-        "limit": limit,
-        "page": (skip // limit) + 1 if limit > 0 else 1,
-        "pages": (total + limit - 1) // limit if limit > 0 else 1
+        **page_metadata(total, estimated, has_more, skip, limit, count)
     }
     
     return JSONResponse(content=response)
 
 
 @router.get("/{contract_id}", response_model=schemas.ClientContract)
-def get_contract(contract_id: str, db: Session = Depends(get_db)):
+def get_contract(contract_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Récupérer un contrat par son ID"""
-    contract = db.query(ClientContractModel).filter(ClientContractModel.id == contract_id).first()
-    if not contract:
+    version = db.query(ClientContractModel.id, ClientContractModel.updated_at).filter(
+        ClientContractModel.id == contract_id
+    ).first()
+    if not version:
         raise HTTPException(status_code=404, detail="Contrat non trouvé")
-    return contract
+    
+    etag = build_etag("contract", version.id, version.updated_at)
+    not_modified = conditional_response(request, response, etag, version.updated_at)
+    if not_modified:
+        return not_modified
+    
+    return db.query(ClientContractModel).filter(ClientContractModel.id == contract_id).first()
 
 
 @router.get("/number/{contract_number}")
-def get_contract_by_number(contract_number: str, db: Session = Depends(get_db)):
-    """Récupérer un contrat par son numéro avec les informations du chantier"""
+def get_contract_by_number(
+    contract_number: str,
+    request: Request,
+    include: Optional[str] = Query(None, description="Ressources liées à inclure (ex: client,claims)"),
+    db: Session = Depends(get_db)
+):
+    """Récupérer un contrat par son numéro avec les informations du chantier et ses garanties"""
+    tree = parse_include(include, "contract")
+    # Chantier et garanties sont toujours présents dans la réponse
+    tree.pop("construction_site", None)
+    tree.pop("guarantees", None)
     
     # Fonction helper pour générer un nom de garantie basé sur le code
     def get_guarantee_display_name(code, db_name):
@@ -177,10 +247,48 @@ def get_contract_by_number(contract_number: str, db: Session = Depends(get_db)):
                 return name
         return code
     
-    contract = db.query(ClientContractModel).filter(ClientContractModel.contract_number == contract_number).first()
-    if not contract:
+    # Version du contrat, de son chantier et de ses garanties (la réponse agrège les trois)
+    version = db.query(
+        ClientContractModel.id,
+        ClientContractModel.updated_at,
+        ConstructionSiteModel.updated_at.label("site_updated_at")
+    ).outerjoin(
+        ConstructionSiteModel, ConstructionSiteModel.id == ClientContractModel.construction_site_id
+    ).filter(ClientContractModel.contract_number == contract_number).first()
+    if not version:
         raise HTTPException(status_code=404, detail="Contrat non trouvé")
     
+    # Libellés des garanties lus dans le référentiel : sa dernière mise à jour fait partie de la version
+    guarantees_count, guarantees_updated_at, referential_updated_at = db.query(
+        func.count(), func.max(contract_guarantees.c.updated_at), func.max(GuaranteeModel.updated_at)
+    ).select_from(contract_guarantees).outerjoin(
+        GuaranteeModel, GuaranteeModel.id == contract_guarantees.c.guarantee_id
+    ).filter(contract_guarantees.c.contract_id == version.id).one()
+    
+    last_modified = max(
+        (
+            d for d in (version.updated_at, version.site_updated_at, guarantees_updated_at, referential_updated_at)
+            if d
+        ),
+        default=None
+    )
+    contract = None
+    included_versions = None
+    if tree:
+        contract = db.query(ClientContractModel).filter(ClientContractModel.id == version.id).first()
+        embedded, included_versions = include_related(db, "contract", contract, tree)
+    
+    etag = build_etag(
+        "contract-detail", version.id, version.updated_at, version.site_updated_at,
+        guarantees_count, guarantees_updated_at, referential_updated_at, include, included_versions
+    )
+    headers = cache_headers(etag, last_modified)
+    if is_not_modified(request, etag, None if tree else last_modified):
+        return Response(status_code=304, headers=headers)
+    
+    if contract is None:
+        contract = db.query(ClientContractModel).filter(ClientContractModel.id == version.id).first()
+    
     # Convertir en dict et ajouter les infos du chantier
     contract_dict = {
         "id": contract.id,
@@ -236,14 +344,14 @@ def get_contract_by_number(contract_number: str, db: Session = Depends(get_db)):
                 "actual_end_date": site.actual_completion_date.isoformat() if site.actual_completion_date else None
             }
     
-    # Charger les garanties du contrat
+    # Charger les garanties du contrat (jointure sur guarantee_id, index couvrant)
     guarantees_query = text("""
-        SELECT cg.guarantee_code, cg.custom_ceiling, cg.custom_franchise, 
+        SELECT coalesce(g.code, cg.guarantee_code) AS guarantee_code, cg.custom_ceiling, cg.custom_franchise, 
                cg.is_included, cg.annual_premium, g.name as guarantee_name
         FROM fake_contract_guarantees cg
-        LEFT JOIN fake_ref_guarantees g ON g.code = cg.guarantee_code
+        LEFT JOIN fake_ref_guarantees g ON g.id = cg.guarantee_id
         WHERE cg.contract_id = :contract_id
-        ORDER BY cg.guarantee_code
+        ORDER BY 1
     """)
     guarantees_result = db.execute(guarantees_query, {"contract_id": contract.id})
     contract_dict["guarantees"] = [
@@ -258,7 +366,10 @@ def get_contract_by_number(contract_number: str, db: Session = Depends(get_db)):
         for row in guarantees_result
     ]
     
-    return JSONResponse(content=contract_dict)
+    if tree:
+        contract_dict.update(embedded)
+    
+    return JSONResponse(content=contract_dict, headers=headers)
 
 
 @router.put("/{contract_id}", response_model=schemas.ClientContract)
@@ -268,11 +379,14 @@ def update_contract(contract_id: str, contract_update: schemas.ClientContractUpd
     if not db_contract:
         raise HTTPException(status_code=404, detail="Contrat non trouvé")
     
+    # Client avant modification : ses vues en cache sont invalidées même si le contrat change de client
+    previous_client_id = db_contract.client_id
     update_data = contract_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_contract, field, value)
     
     db.commit()
+    invalidate_clients(previous_client_id, db_contract.client_id)
     db.refresh(db_contract)
     return db_contract
 
@@ -284,29 +398,14 @@ def delete_contract(contract_id: str, db: Session = Depends(get_db)):
     if not db_contract:
         raise HTTPException(status_code=404, detail="Contrat non trouvé")
     
+    client_id = db_contract.client_id
     db.delete(db_contract)
     db.commit()
+    invalidate_clients(client_id)
     return None
 
 
 @router.get("/statistics/summary", response_model=schemas.ContractStatistics)
 def get_contract_statistics(db: Session = Depends(get_db)):
     """Obtenir les statistiques des contrats"""
-    from sqlalchemy import func
-    
-    total = db.query(func.count(ClientContractModel.id)).scalar()
-    active = db.query(func.count(ClientContractModel.id)).filter(ClientContractModel.status == "actif").scalar()
-    draft = db.query(func.count(ClientContractModel.id)).filter(ClientContractModel.status == "brouillon").scalar()
-    cancelled = db.query(func.count(ClientContractModel.id)).filter(ClientContractModel.status == "resilie").scalar()
-    
-    total_premium = db.query(func.sum(ClientContractModel.annual_premium)).scalar() or 0
-    avg_premium = db.query(func.avg(ClientContractModel.annual_premium)).scalar() or 0
-    
-    return {
-        "total_contracts": total or 0,
-        "active_contracts": active or 0,
-        "draft_contracts": draft or 0,
-        "cancelled_contracts": cancelled or 0,
-        "total_premium_volume": float(total_premium),
-        "average_premium": float(avg_premium)
-    }
+    return compute_contract_stats(db)
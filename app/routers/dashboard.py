@@ -0,0 +1,49 @@
+"""Route API du tableau de bord : statistiques servies depuis un instantané en mémoire"""
+from fastapi import APIRouter, Request, Response
+
+from app.http_cache import build_etag, conditional_response
+from app.snapshots import Snapshot
+from app.statistics import compute_claims_stats, compute_contract_stats, compute_global_stats
+
+router = APIRouter(prefix="/dashboard", tags=["Statistics"])
+
+# Période de rafraîchissement de l'instantané (secondes)
+DASHBOARD_REFRESH_SECONDS = 30
+
+
+def compute_dashboard(db) -> dict:
+    return {
+        "stats": compute_global_stats(db),
+        "claims_stats": compute_claims_stats(db),
+        "contract_stats": compute_contract_stats(db),
+    }
+
+
+DASHBOARD_SNAPSHOT = Snapshot("dashboard", compute_dashboard, DASHBOARD_REFRESH_SECONDS, replica=True)
+
+
+@router.get("/")
+@router.get("")
+def get_dashboard(request: Request, response: Response):
+    """
+    Statistiques globales, des sinistres et des contrats en un appel.
+    
+    Les agrégats sont recalculés en tâche de fond toutes les DASHBOARD_REFRESH_SECONDS secondes
+    et servis depuis la mémoire : l'ouverture simultanée du tableau de bord par de nombreux
+    utilisateurs ne coûte qu'un seul calcul.
+    """
+    snapshot = DASHBOARD_SNAPSHOT
+    data = snapshot.get()
+    generated_at = snapshot.generated_at
+    
+    not_modified = conditional_response(request, response, build_etag("dashboard", generated_at.isoformat()))
+    if not_modified:
+        return not_modified
+    response.headers["Age"] = str(int(snapshot.age))
+    
+    return {
+        **data,
+        "generated_at": generated_at,
+        "refresh_interval": snapshot.refresh_interval,
+        "stale": snapshot.is_stale,
+    }
@@ -0,0 +1,43 @@
+"""Routes API pour le géocodage hors ligne (code postal et commune)"""
+from typing import List
+
+from fastapi import APIRouter
+
+from app import schemas
+from app.geocoder import GEOCODER_TABLE_PATH, geocode, get_table
+
+router = APIRouter(prefix="/geocoding", tags=["Géocodage"])
+
+
+@router.post("/batch", response_model=List[schemas.GeocodeResult])
+def geocode_batch(batch: schemas.GeocodeBatchRequest):
+    """
+    Géocoder un lot d'adresses (10 000 au plus) sans service externe.
+    
+    Résultats dans l'ordre des adresses. `precision` : commune (code postal et ville reconnus),
+    code_postal (centroïde des communes du code) ou departement (code absent de la table).
+    """
+    results = []
+    for address in batch.addresses:
+        latitude, longitude, precision = geocode(address.postal_code, address.city) or (None, None, None)
+        results.append({
+            "postal_code": address.postal_code,
+            "city": address.city,
+            "latitude": latitude,
+            "longitude": longitude,
+            "precision": precision,
+        })
+    return results
+
+
+@router.get("/status")
+def geocoding_status():
+    """Table des centroïdes chargée et cache de géocodage"""
+    table = get_table()
+    cache = geocode.cache_info()
+    return {
+        "table_path": GEOCODER_TABLE_PATH,
+        "table_loaded": table is not None,
+        "entries": table.count if table is not None else 0,
+        "cache": {"hits": cache.hits, "misses": cache.misses, "size": cache.currsize, "max_size": cache.maxsize},
+    }
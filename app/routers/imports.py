@@ -0,0 +1,87 @@
+"""Routes API pour l'import de portefeuille (CSV / XLSX)"""
+import csv
+import io
+import json
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.database import get_db, SessionLocal
+from app import schemas
+from app.cache import CLIENTS_TAG, cache
+from app.models import ImportRejectionModel
+from app.portfolio_import import import_portfolio
+
+router = APIRouter(prefix="/imports", tags=["Imports"])
+
+
+@router.post("/portfolio", response_model=schemas.PortfolioImportResult)
+def upload_portfolio(
+    file: UploadFile = File(..., description="Fichier CSV (séparateur ; , ou tabulation) ou XLSX"),
+    sheet: Optional[str] = Form(None, description="Feuille XLSX (par défaut la feuille active)"),
+    encoding: str = Form("utf-8", description="Encodage du CSV : utf-8, latin-1 ou cp1252"),
+    db: Session = Depends(get_db)
+):
+    """
+    Importer un portefeuille (une ligne par contrat, colonnes client et chantier).
+    
+    Le fichier est chargé par COPY dans une table de staging, validé en SQL puis
+    fusionné dans les clients, chantiers et contrats (upsert sur les numéros).
+    Les lignes invalides sont consultables via `/imports/{batch_id}/rejections`.
+    Pour les très gros fichiers, préférer le script `import_portfolio.py`.
+    """
+    try:
+        result = import_portfolio(db, file.file, file.filename or "", sheet=sheet, encoding=encoding)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cache.invalidate(CLIENTS_TAG)
+    return result
+
+
+@router.get("/{batch_id}/rejections", response_model=List[schemas.ImportRejection])
+def list_rejections(
+    batch_id: str,
+    format: str = Query("json", pattern="^(json|csv)$", description="json (paginé) ou csv (rapport complet)"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Rapport des lignes rejetées d'un import"""
+    if format == "csv":
+        return StreamingResponse(
+            iter_rejections_csv(batch_id),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="rejets_{batch_id}.csv"'}
+        )
+    
+    return db.query(ImportRejectionModel).filter(
+        ImportRejectionModel.batch_id == batch_id
+    ).order_by(ImportRejectionModel.line_number).offset(skip).limit(limit).all()
+
+
+def iter_rejections_csv(batch_id: str, batch_size: int = 5000):
+    """
+    Rapport CSV des rejets, lu par paquets.
+    Utilise sa propre session : la réponse est diffusée après la fermeture de celle de la requête.
+    """
+    db = SessionLocal()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=";")
+        writer.writerow(["line_number", "errors", "raw_data"])
+        rows = db.query(
+            ImportRejectionModel.line_number, ImportRejectionModel.errors, ImportRejectionModel.raw_data
+        ).filter(
+            ImportRejectionModel.batch_id == batch_id
+        ).order_by(ImportRejectionModel.line_number).yield_per(batch_size)
+        for row in rows:
+            writer.writerow([row.line_number, row.errors, json.dumps(row.raw_data, ensure_ascii=False)])
+            if buffer.tell() > 65536:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        db.close()
@@ -1,11 +1,18 @@
 """Routes API pour la gestion des référentiels"""
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, literal, union_all
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import gzip
+import hashlib
+import json
+import threading
 import uuid
 
 from app.database import get_db
 from app import schemas
+from app.http_cache import build_etag, cache_headers, conditional_response, collection_version, is_not_modified
 from app.models import (
     InsuranceContractTypeModel, GuaranteeModel, ContractClauseModel,
     BuildingCategoryModel, WorkCategoryModel, ProfessionModel
@@ -14,6 +21,32 @@ from app.models import (
 router = APIRouter(prefix="/referentials", tags=["Référentiels"])
 
 
+# =============================================================================
+# REQUÊTES CONDITIONNELLES
+# =============================================================================
+
+def _get_by_code(model, code: str, detail: str, request: Request, response: Response, db: Session):
+    """Récupère un élément par son code, ou une 304 si le client possède déjà cette version"""
+    version = db.query(model.id, model.updated_at).filter(model.code == code).first()
+    if not version:
+        raise HTTPException(status_code=404, detail=detail)
+    
+    etag = build_etag(model.__tablename__, version.id, version.updated_at)
+    not_modified = conditional_response(request, response, etag, version.updated_at)
+    if not_modified:
+        return not_modified
+    
+    return db.query(model).filter(model.id == version.id).first()
+
+
+def _list_not_modified(query, model, request: Request, response: Response):
+    """Version agrégée (nombre, dernière mise à jour) d'une liste filtrée ; 304 si inchangée"""
+    count, last_update = collection_version(query, model)
+    params = sorted(request.query_params.multi_items())
+    etag = build_etag(model.__tablename__, "list", params, count, last_update)
+    return conditional_response(request, response, etag, last_update)
+
+
 # =============================================================================
 # TYPES DE CONTRATS
 # =============================================================================
@@ -37,6 +70,8 @@ def create_contract_type(contract_type: schemas.InsuranceContractTypeCreate, db:
 
 @router.get("/contract-types", response_model=List[schemas.InsuranceContractType])
 def list_contract_types(
+    request: Request,
+    response: Response,
     is_active: Optional[bool] = None,
     is_mandatory: Optional[bool] = None,
     db: Session = Depends(get_db)
@@ -50,16 +85,17 @@ def list_contract_types(
     if is_mandatory is not None:
         query = query.filter(InsuranceContractTypeModel.is_mandatory == is_mandatory)
     
+    not_modified = _list_not_modified(query, InsuranceContractTypeModel, request, response)
+    if not_modified:
+        return not_modified
+    
     return query.all()
 
 
 @router.get("/contract-types/{code}", response_model=schemas.InsuranceContractType)
-def get_contract_type(code: str, db: Session = Depends(get_db)):
+def get_contract_type(code: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Récupérer un type de contrat par son code"""
-    contract_type = db.query(InsuranceContractTypeModel).filter(InsuranceContractTypeModel.code == code).first()
-    if not contract_type:
-        raise HTTPException(status_code=404, detail="Type de contrat non trouvé")
-    return contract_type
+    return _get_by_code(InsuranceContractTypeModel, code, "Type de contrat non trouvé", request, response, db)
 
 
 # =============================================================================
@@ -85,6 +121,8 @@ def create_guarantee(guarantee: schemas.GuaranteeCreate, db: Session = Depends(g
 
 @router.get("/guarantees", response_model=List[schemas.Guarantee])
 def list_guarantees(
+    request: Request,
+    response: Response,
     contract_type_id: Optional[str] = None,
     category: Optional[str] = None,
     guarantee_type: Optional[str] = None,
@@ -106,16 +144,17 @@ def list_guarantees(
     if is_active is not None:
         query = query.filter(GuaranteeModel.is_active == is_active)
     
+    not_modified = _list_not_modified(query, GuaranteeModel, request, response)
+    if not_modified:
+        return not_modified
+    
     return query.all()
 
 
 @router.get("/guarantees/{code}", response_model=schemas.Guarantee)
-def get_guarantee(code: str, db: Session = Depends(get_db)):
+def get_guarantee(code: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Récupérer une garantie par son code"""
-    guarantee = db.query(GuaranteeModel).filter(GuaranteeModel.code == code).first()
-    if not guarantee:
-        raise HTTPException(status_code=404, detail="Garantie non trouvée")
-    return guarantee
+    return _get_by_code(GuaranteeModel, code, "Garantie non trouvée", request, response, db)
 
 
 # =============================================================================
@@ -141,9 +180,13 @@ def create_clause(clause: schemas.ContractClauseCreate, db: Session = Depends(ge
 
 @router.get("/clauses", response_model=List[schemas.ContractClause])
 def list_clauses(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     is_mandatory: Optional[bool] = None,
     is_active: Optional[bool] = None,
+    contract_type: Optional[str] = Query(None, description="Code d'un type de contrat auquel la clause s'applique"),
+    guarantee: Optional[str] = Query(None, description="Code d'une garantie à laquelle la clause s'applique"),
     db: Session = Depends(get_db)
 ):
     """Liste des clauses avec filtres"""
@@ -158,16 +201,24 @@ def list_clauses(
     if is_active is not None:
         query = query.filter(ContractClauseModel.is_active == is_active)
     
+    # Contenance JSONB (@>) : index GIN jsonb_path_ops
+    if contract_type:
+        query = query.filter(ContractClauseModel.applies_to_contract_types.contains([contract_type]))
+    
+    if guarantee:
+        query = query.filter(ContractClauseModel.applies_to_guarantees.contains([guarantee]))
+    
+    not_modified = _list_not_modified(query, ContractClauseModel, request, response)
+    if not_modified:
+        return not_modified
+    
     return query.order_by(ContractClauseModel.priority_order).all()
 
 
 @router.get("/clauses/{code}", response_model=schemas.ContractClause)
-def get_clause(code: str, db: Session = Depends(get_db)):
+def get_clause(code: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Récupérer une clause par son code"""
-    clause = db.query(ContractClauseModel).filter(ContractClauseModel.code == code).first()
-    if not clause:
-        raise HTTPException(status_code=404, detail="Clause non trouvée")
-    return clause
+    return _get_by_code(ContractClauseModel, code, "Clause non trouvée", request, response, db)
 
 
 # =============================================================================
@@ -192,23 +243,24 @@ def create_building_category(category: schemas.BuildingCategoryCreate, db: Sessi
 
 
 @router.get("/building-categories", response_model=List[schemas.BuildingCategory])
-def list_building_categories(is_active: Optional[bool] = None, db: Session = Depends(get_db)):
+def list_building_categories(request: Request, response: Response, is_active: Optional[bool] = None, db: Session = Depends(get_db)):
     """Liste des catégories de bâtiments"""
     query = db.query(BuildingCategoryModel)
     
     if is_active is not None:
         query = query.filter(BuildingCategoryModel.is_active == is_active)
     
+    not_modified = _list_not_modified(query, BuildingCategoryModel, request, response)
+    if not_modified:
+        return not_modified
+    
     return query.all()
 
 
 @router.get("/building-categories/{code}", response_model=schemas.BuildingCategory)
-def get_building_category(code: str, db: Session = Depends(get_db)):
+def get_building_category(code: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Récupérer une catégorie de bâtiment par son code"""
-    category = db.query(BuildingCategoryModel).filter(BuildingCategoryModel.code == code).first()
-    if not category:
-        raise HTTPException(status_code=404, detail="Catégorie non trouvée")
-    return category
+    return _get_by_code(BuildingCategoryModel, code, "Catégorie non trouvée", request, response, db)
 
 
 # =============================================================================
@@ -233,23 +285,24 @@ def create_work_category(category: schemas.WorkCategoryCreate, db: Session = Dep
 
 
 @router.get("/work-categories", response_model=List[schemas.WorkCategory])
-def list_work_categories(is_active: Optional[bool] = None, db: Session = Depends(get_db)):
+def list_work_categories(request: Request, response: Response, is_active: Optional[bool] = None, db: Session = Depends(get_db)):
     """Liste des catégories de travaux"""
     query = db.query(WorkCategoryModel)
     
     if is_active is not None:
         query = query.filter(WorkCategoryModel.is_active == is_active)
     
+    not_modified = _list_not_modified(query, WorkCategoryModel, request, response)
+    if not_modified:
+        return not_modified
+    
     return query.all()
 
 
 @router.get("/work-categories/{code}", response_model=schemas.WorkCategory)
-def get_work_category(code: str, db: Session = Depends(get_db)):
+def get_work_category(code: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Récupérer une catégorie de travaux par son code"""
-    category = db.query(WorkCategoryModel).filter(WorkCategoryModel.code == code).first()
-    if not category:
-        raise HTTPException(status_code=404, detail="Catégorie non trouvée")
-    return category
+    return _get_by_code(WorkCategoryModel, code, "Catégorie non trouvée", request, response, db)
 
 
 # =============================================================================
@@ -275,6 +328,8 @@ def create_profession(profession: schemas.ProfessionCreate, db: Session = Depend
 
 @router.get("/professions", response_model=List[schemas.Profession])
 def list_professions(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     is_active: Optional[bool] = None,
     db: Session = Depends(get_db)
@@ -288,13 +343,103 @@ def list_professions(
     if is_active is not None:
         query = query.filter(ProfessionModel.is_active == is_active)
     
+    not_modified = _list_not_modified(query, ProfessionModel, request, response)
+    if not_modified:
+        return not_modified
+    
     return query.all()
 
 
 @router.get("/professions/{code}", response_model=schemas.Profession)
-def get_profession(code: str, db: Session = Depends(get_db)):
+def get_profession(code: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Récupérer une profession par son code"""
-    profession = db.query(ProfessionModel).filter(ProfessionModel.code == code).first()
-    if not profession:
-        raise HTTPException(status_code=404, detail="Profession non trouvée")
-    return profession
+    return _get_by_code(ProfessionModel, code, "Profession non trouvée", request, response, db)
+
+
+# =============================================================================
+# BUNDLE DE TOUS LES RÉFÉRENTIELS
+# =============================================================================
+
+# Référentiels inclus dans le bundle : nom exposé -> (modèle, schéma de sérialisation)
+BUNDLE_REFERENTIALS = {
+    "contract_types": (InsuranceContractTypeModel, schemas.InsuranceContractType),
+    "guarantees": (GuaranteeModel, schemas.Guarantee),
+    "clauses": (ContractClauseModel, schemas.ContractClause),
+    "building_categories": (BuildingCategoryModel, schemas.BuildingCategory),
+    "work_categories": (WorkCategoryModel, schemas.WorkCategory),
+    "professions": (ProfessionModel, schemas.Profession),
+}
+
+# Niveau gzip du bundle (compressé une seule fois par version)
+BUNDLE_GZIP_LEVEL = 9
+
+# Dernier bundle construit (remplacé en bloc, jamais modifié en place)
+_bundle_cache = {"current": None}
+_bundle_lock = threading.Lock()
+
+
+def _bundle_version(db: Session) -> tuple:
+    """Version de l'ensemble des référentiels (nombre, dernière mise à jour par table) en une requête"""
+    rows = db.execute(union_all(*[
+        db.query(literal(name), func.count(model.id), func.max(model.updated_at)).statement
+        for name, (model, _) in BUNDLE_REFERENTIALS.items()
+    ])).all()
+    return tuple(sorted((name, count, last_update) for name, count, last_update in rows))
+
+
+def _build_bundle(db: Session, version: tuple) -> dict:
+    """Sérialise les référentiels et précalcule le corps compressé et son empreinte"""
+    payload = {
+        name: [jsonable_encoder(schema.from_orm(item)) for item in db.query(model).order_by(model.code).all()]
+        for name, (model, schema) in BUNDLE_REFERENTIALS.items()
+    }
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    content_hash = hashlib.sha256(body).hexdigest()
+    return {
+        "version": version,
+        "body": body,
+        "gzip": gzip.compress(body, compresslevel=BUNDLE_GZIP_LEVEL, mtime=0),
+        "hash": content_hash,
+        "etag": f'"{content_hash}"',
+    }
+
+
+def _current_bundle(db: Session) -> dict:
+    """Bundle à jour ; reconstruit une seule fois lorsqu'un référentiel a changé"""
+    version = _bundle_version(db)
+    bundle = _bundle_cache["current"]
+    if bundle is not None and bundle["version"] == version:
+        return bundle
+    with _bundle_lock:
+        bundle = _bundle_cache["current"]
+        if bundle is None or bundle["version"] != version:
+            bundle = _build_bundle(db, version)
+            _bundle_cache["current"] = bundle
+        return bundle
+
+
+def warm_referentials_bundle(db: Session) -> None:
+    """Construit le bundle au démarrage du serveur, avant le premier appel"""
+    _current_bundle(db)
+
+
+@router.get("/bundle")
+def get_referentials_bundle(request: Request, db: Session = Depends(get_db)):
+    """
+    Tous les référentiels en un seul document JSON (types de contrats, garanties, clauses,
+    catégories de bâtiments et de travaux, professions).
+    
+    Le document est sérialisé et compressé une fois par version des tables ; l'ETag est
+    l'empreinte SHA-256 du contenu (`X-Content-Hash`). Un client à jour reçoit une 304.
+    """
+    bundle = _current_bundle(db)
+    headers = cache_headers(bundle["etag"])
+    headers["X-Content-Hash"] = bundle["hash"]
+    headers["Vary"] = "Accept-Encoding"
+    if is_not_modified(request, bundle["etag"]):
+        return Response(status_code=304, headers=headers)
+    
+    if "gzip" in request.headers.get("accept-encoding", "").lower():
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=bundle["gzip"], media_type="application/json", headers=headers)
+    return Response(content=bundle["body"], media_type="application/json", headers=headers)
@@ -1,12 +1,18 @@
 """Routes API pour la gestion des chantiers"""
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import uuid
 
-from app.database import get_db
+from app.database import get_db, get_primary_db
 from app import schemas
-from app.models import ConstructionSiteModel
+from app.cache import invalidate_clients
+from app.geo import MAX_RADIUS_KM, near, parse_bbox, within_bbox
+from app.http_cache import build_etag, conditional_response
+from app.models import ClientContractModel, ConstructionSiteModel
+from app.rows import rows_response, schema_columns
+from app.site_tiles import read_clusters, refresh_site_tiles
 
 router = APIRouter(prefix="/construction-sites", tags=["Chantiers"])
 
@@ -40,50 +46,110 @@ def list_sites(
     city: Optional[str] = None,
     is_active: Optional[bool] = None,
     search: Optional[str] = None,
+    bbox: Optional[str] = Query(None, description="Rectangle min_lon,min_lat,max_lon,max_lat"),
     db: Session = Depends(get_db)
 ):
-    """Liste des chantiers avec filtres"""
-    query = db.query(ConstructionSiteModel)
+    """Liste des chantiers avec filtres (lecture Core, sans instances ORM)"""
+    query = select(*schema_columns(ConstructionSiteModel, schemas.ConstructionSite))
     
     if building_category:
-        query = query.filter(ConstructionSiteModel.building_category_code == building_category)
+        query = query.where(ConstructionSiteModel.building_category_code == building_category)
     
     if work_category:
-        query = query.filter(ConstructionSiteModel.work_category_code == work_category)
+        query = query.where(ConstructionSiteModel.work_category_code == work_category)
     
     if city:
-        query = query.filter(ConstructionSiteModel.city.ilike(f"%{city}%"))
+        query = query.where(ConstructionSiteModel.city.ilike(f"%{city}%"))
     
     if is_active is not None:
-        query = query.filter(ConstructionSiteModel.is_active == is_active)
+        query = query.where(ConstructionSiteModel.is_active == is_active)
     
     if search:
         search_filter = f"%{search}%"
-        query = query.filter(
+        query = query.where(
             (ConstructionSiteModel.site_reference.ilike(search_filter)) |
             (ConstructionSiteModel.site_name.ilike(search_filter)) |
             (ConstructionSiteModel.city.ilike(search_filter))
         )
     
-    return query.offset(skip).limit(limit).all()
+    if bbox:
+        query = query.where(within_bbox(ConstructionSiteModel, parse_bbox(bbox)))
+    
+    return rows_response(db, query.order_by(ConstructionSiteModel.id).offset(skip).limit(limit))
+
+
+@router.get("/near", response_model=List[schemas.ConstructionSiteDistance])
+def list_sites_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=MAX_RADIUS_KM),
+    is_active: Optional[bool] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Chantiers situés à moins de radius_km du point, du plus proche au plus éloigné"""
+    query = select(*schema_columns(ConstructionSiteModel, schemas.ConstructionSite))
+    if is_active is not None:
+        query = query.where(ConstructionSiteModel.is_active == is_active)
+    
+    return rows_response(db, near(query, ConstructionSiteModel, lat, lon, radius_km).limit(limit))
+
+
+@router.get("/clusters")
+def get_site_clusters(
+    zoom: int = Query(..., ge=0, le=22, description="Niveau de zoom de la carte"),
+    bbox: str = Query("-180,-85.0511,180,85.0511", description="Rectangle affiché min_lon,min_lat,max_lon,max_lat"),
+    db: Session = Depends(get_primary_db)
+):
+    """
+    Groupes de chantiers actifs pour une carte : nombre, rectangle englobant, barycentre et coût
+    de construction total par tuile (grille de 4 x 4 groupes par tuile affichée).
+    Lus dans les agrégats précalculés ; les modifications de chantiers en attente sont appliquées avant.
+    """
+    refresh_site_tiles(db)
+    return read_clusters(db, parse_bbox(bbox), zoom)
 
 
 @router.get("/{site_id}", response_model=schemas.ConstructionSite)
-def get_site(site_id: str, db: Session = Depends(get_db)):
+def get_site(site_id: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Récupérer un chantier par son ID"""
-    site = db.query(ConstructionSiteModel).filter(ConstructionSiteModel.id == site_id).first()
-    if not site:
+    version = db.query(ConstructionSiteModel.id, ConstructionSiteModel.updated_at).filter(
+        ConstructionSiteModel.id == site_id
+    ).first()
+    if not version:
         raise HTTPException(status_code=404, detail="Chantier non trouvé")
-    return site
+    
+    etag = build_etag("site", version.id, version.updated_at)
+    not_modified = conditional_response(request, response, etag, version.updated_at)
+    if not_modified:
+        return not_modified
+    
+    return db.query(ConstructionSiteModel).filter(ConstructionSiteModel.id == version.id).first()
 
 
 @router.get("/reference/{site_reference}", response_model=schemas.ConstructionSite)
-def get_site_by_reference(site_reference: str, db: Session = Depends(get_db)):
+def get_site_by_reference(site_reference: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """Récupérer un chantier par sa référence"""
-    site = db.query(ConstructionSiteModel).filter(ConstructionSiteModel.site_reference == site_reference).first()
-    if not site:
+    version = db.query(ConstructionSiteModel.id, ConstructionSiteModel.updated_at).filter(
+        ConstructionSiteModel.site_reference == site_reference
+    ).first()
+    if not version:
         raise HTTPException(status_code=404, detail="Chantier non trouvé")
-    return site
+    
+    etag = build_etag("site", version.id, version.updated_at)
+    not_modified = conditional_response(request, response, etag, version.updated_at)
+    if not_modified:
+        return not_modified
+    
+    return db.query(ConstructionSiteModel).filter(ConstructionSiteModel.id == version.id).first()
+
+
+def _invalidate_site_clients(db: Session, site_id: str) -> None:
+    """Le chantier figure dans la vue complète des clients qui ont un contrat dessus"""
+    client_ids = db.scalars(
+        select(ClientContractModel.client_id).where(ClientContractModel.construction_site_id == site_id).distinct()
+    ).all()
+    invalidate_clients(*client_ids)
 
 
 @router.put("/{site_id}", response_model=schemas.ConstructionSite)
@@ -98,6 +164,7 @@ def update_site(site_id: str, site_update: schemas.ConstructionSiteUpdate, db: S
         setattr(db_site, field, value)
     
     db.commit()
+    _invalidate_site_clients(db, site_id)
     db.refresh(db_site)
     return db_site
 
@@ -111,4 +178,5 @@ def delete_site(site_id: str, db: Session = Depends(get_db)):
     
     db_site.is_active = False
     db.commit()
+    _invalidate_site_clients(db, site_id)
     return None
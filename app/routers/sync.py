@@ -0,0 +1,315 @@
+"""Routes API de synchronisation pour le mode hors ligne"""
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy import tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.database import get_db, get_primary_db
+from app import schemas
+from app.cache import invalidate_clients
+from app.models import ClientModel, ClientContractModel, ClaimModel, SyncTombstoneModel
+from app.sync_feed import SYNC_ENTITIES, snapshot_xmin
+
+router = APIRouter(prefix="/sync", tags=["Synchronisation"])
+
+
+SYNC_TOKEN_VERSION = 2
+
+# Jetons v1 (curseurs updated_at, sujets aux pertes) : resynchronisation complète
+SYNC_TOKEN_LEGACY_VERSIONS = {1}
+
+
+# =============================================================================
+# JETON DE SYNCHRONISATION
+# =============================================================================
+
+def encode_sync_token(cursors: dict, tombstone_cursors: dict) -> str:
+    """Encode les curseurs (sync_xid, id) par entité, lignes et suppressions, dans un jeton opaque"""
+    payload = {
+        "v": SYNC_TOKEN_VERSION,
+        "c": {name: [xid, row_id] for name, (xid, row_id) in cursors.items()},
+        "d": {name: [xid, row_id] for name, (xid, row_id) in tombstone_cursors.items()},
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_sync_token(token: str) -> tuple:
+    """Décode un jeton de synchronisation (curseurs des lignes, curseurs des suppressions) ; erreur 400 s'il est invalide"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if payload.get("v") in SYNC_TOKEN_LEGACY_VERSIONS:
+            return {}, {}
+        if payload.get("v") != SYNC_TOKEN_VERSION:
+            raise ValueError("version de jeton inconnue")
+        cursors, tombstone_cursors = (
+            {
+                name: (int(xid), int(row_id))
+                for name, (xid, row_id) in payload[key].items()
+                if name in SYNC_ENTITIES
+            }
+            for key in ("c", "d")
+        )
+        return cursors, tombstone_cursors
+    except (ValueError, KeyError, TypeError, AttributeError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Jeton de synchronisation invalide")
+
+
+# =============================================================================
+# FLUX DE MODIFICATIONS
+# =============================================================================
+
+def _claims_client_names(db: Session, claims: list) -> dict:
+    """Noms des clients des sinistres (une seule requête), comme dans la liste des sinistres"""
+    contract_ids = {claim.contract_id for claim in claims}
+    if not contract_ids:
+        return {}
+    rows = db.query(
+        ClientContractModel.id, ClientModel.client_type, ClientModel.company_name,
+        ClientModel.first_name, ClientModel.last_name
+    ).join(ClientModel, ClientModel.id == ClientContractModel.client_id).filter(
+        ClientContractModel.id.in_(contract_ids)
+    ).all()
+    
+    names = {}
+    for row in rows:
+        if row.client_type == 'professionnel':
+            names[row.id] = row.company_name
+        else:
+            names[row.id] = f"{row.first_name or ''} {row.last_name or ''}".strip()
+    return names
+
+
+@router.get("/changes", response_model=dict)
+def get_changes(
+    since: Optional[str] = Query(None, description="Jeton retourné par l'appel précédent (absent = synchronisation complète)"),
+    entities: Optional[str] = Query(None, description="Entités à synchroniser, séparées par des virgules"),
+    limit: int = Query(500, ge=1, le=5000, description="Nombre maximum de lignes par entité et par page"),
+    # Primaire : l'instantané d'une réplique ne borne pas les transactions en cours sur le primaire
+    db: Session = Depends(get_primary_db)
+):
+    """
+    Flux des modifications depuis un jeton de synchronisation.
+    
+    Retourne, pour chaque entité, les lignes créées ou modifiées depuis le jeton
+    (`updated`) et les identifiants supprimés (`deleted` : suppression logique
+    `is_active = false` ou suppression physique). Le parcours suit l'ordre de
+    validation des transactions (curseur (sync_xid, id), voir app/sync_feed.py) :
+    une modification validée après l'appel est toujours remise à l'appel suivant,
+    quelle que soit la durée de sa transaction. Tant que `has_more` est vrai,
+    rappeler l'endpoint avec le nouveau `token`.
+    """
+    cursors, tombstone_cursors = decode_sync_token(since) if since else ({}, {})
+    
+    if entities:
+        names = [name.strip() for name in entities.split(",") if name.strip()]
+        unknown = [name for name in names if name not in SYNC_ENTITIES]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Entités inconnues : {', '.join(unknown)}")
+    else:
+        names = list(SYNC_ENTITIES)
+    
+    # Transactions encore en cours : leurs lignes (sync_xid >= borne) attendront l'appel suivant
+    upper_bound = snapshot_xmin(db)
+    changes = {}
+    has_more = False
+    
+    for name in names:
+        model, schema = SYNC_ENTITIES[name]
+        query = db.query(model).filter(model.sync_xid < upper_bound)
+        
+        cursor = cursors.get(name)
+        if cursor:
+            query = query.filter(tuple_(model.sync_xid, model.id) > cursor)
+        
+        # Une ligne de plus pour savoir s'il reste des modifications
+        rows = query.order_by(model.sync_xid, model.id).limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            has_more = True
+        
+        if rows:
+            cursors[name] = (rows[-1].sync_xid, rows[-1].id)
+        
+        # Suppressions physiques. Synchronisation complète de l'entité : les lignes supprimées
+        # avant la borne ne sont déjà plus lues, seules les suppressions suivantes sont à remettre
+        tombstone_cursor = tombstone_cursors.get(name) or (upper_bound, 0)
+        tombstones = db.query(SyncTombstoneModel.id, SyncTombstoneModel.entity_id, SyncTombstoneModel.sync_xid).filter(
+            SyncTombstoneModel.entity == name,
+            SyncTombstoneModel.sync_xid < upper_bound,
+            tuple_(SyncTombstoneModel.sync_xid, SyncTombstoneModel.id) > tombstone_cursor
+        ).order_by(SyncTombstoneModel.sync_xid, SyncTombstoneModel.id).limit(limit + 1).all()
+        if len(tombstones) > limit:
+            tombstones = tombstones[:limit]
+            has_more = True
+        
+        if tombstones:
+            tombstone_cursors[name] = (tombstones[-1].sync_xid, tombstones[-1].id)
+        else:
+            tombstone_cursors[name] = tombstone_cursor
+        
+        # Suppression logique uniquement pour les tables ayant une colonne is_active
+        # (ClientContractModel.is_active est une propriété dérivée du statut)
+        soft_delete = "is_active" in model.__table__.c
+        updated = []
+        deleted = [tombstone.entity_id for tombstone in tombstones]
+        client_names = _claims_client_names(db, rows) if model is ClaimModel else {}
+        for row in rows:
+            if soft_delete and row.is_active is False:
+                deleted.append(row.id)
+                continue
+            item = jsonable_encoder(schema.model_validate(row))
+            if model is ClaimModel and row.contract_id in client_names:
+                item["client_name"] = client_names[row.contract_id]
+            updated.append(item)
+        
+        changes[name] = {"updated": updated, "deleted": deleted}
+    
+    return {
+        "token": encode_sync_token(cursors, tombstone_cursors),
+        "has_more": has_more,
+        "server_time": datetime.utcnow().isoformat(),
+        "changes": changes
+    }
+
+
+# =============================================================================
+# LOT DE MODIFICATIONS HORS LIGNE
+# =============================================================================
+
+# Type d'entité -> (modèle, colonne d'identification, schéma de mise à jour, schéma de réponse)
+BATCH_TARGETS = {
+    schemas.SyncEntityTypeEnum.CLAIM: (ClaimModel, ClaimModel.claim_number, schemas.ClaimUpdate, schemas.Claim),
+    schemas.SyncEntityTypeEnum.CONTRACT: (ClientContractModel, ClientContractModel.id, schemas.ClientContractUpdate, schemas.ClientContract),
+    schemas.SyncEntityTypeEnum.CLIENT: (ClientModel, ClientModel.id, schemas.ClientUpdate, schemas.Client),
+}
+
+
+def _as_utc_naive(value: datetime) -> datetime:
+    """Les dates sont stockées en UTC sans fuseau"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _load_batch_targets(db: Session, changes: list) -> dict:
+    """Charge les entités visées par le lot : une requête par type d'entité"""
+    keys = {}
+    for change in changes:
+        keys.setdefault(change.entity_type, set()).add(change.entity_id)
+    
+    loaded = {}
+    for entity_type, ids in keys.items():
+        model, key_column, _, _ = BATCH_TARGETS[entity_type]
+        if key_column is model.id:
+            ids = {int(i) for i in ids if i.isdigit()}
+        for entity in db.query(model).filter(key_column.in_(ids)).all():
+            loaded[(entity_type, str(getattr(entity, key_column.key)))] = entity
+    return loaded
+
+
+def _owner_client_id(entity) -> Optional[int]:
+    """Client propriétaire d'une entité synchronisée (aucun pour les sinistres)"""
+    if isinstance(entity, ClientModel):
+        return entity.id
+    if isinstance(entity, ClientContractModel):
+        return entity.client_id
+    return None
+
+
+@router.post("/batch", response_model=schemas.SyncBatchResponse)
+def apply_batch(batch: schemas.SyncBatchRequest, db: Session = Depends(get_db)):
+    """
+    Appliquer en un seul appel les modifications hors ligne en attente.
+    
+    Les modifications sont appliquées dans l'ordre, dans une seule transaction
+    (un point de sauvegarde par modification). Si `base_updated_at` est fourni
+    et que l'entité a été modifiée sur le serveur depuis, la modification est
+    rejetée en conflit avec la version serveur. Avec `atomic=true`, le moindre
+    échec annule l'ensemble du lot.
+    """
+    entities = _load_batch_targets(db, batch.changes)
+    # Version serveur avant le lot (les modifications du lot mettent à jour updated_at)
+    server_versions = {key: entity.updated_at for key, entity in entities.items()}
+    # Clients dont la vue complète en cache dépend des entités du lot
+    touched_clients = {_owner_client_id(entity) for entity in entities.values()}
+    results = []
+    
+    for change in batch.changes:
+        model, _, update_schema, response_schema = BATCH_TARGETS[change.entity_type]
+        result = schemas.SyncBatchItemResult(
+            change_id=change.change_id,
+            entity_type=change.entity_type,
+            entity_id=change.entity_id,
+            status="applied"
+        )
+        results.append(result)
+        key = (change.entity_type, change.entity_id)
+        
+        if change.operation != "update":
+            result.status = "invalid"
+            result.detail = f"Opération non gérée : {change.operation}"
+            continue
+        
+        entity = entities.get(key)
+        if entity is None:
+            result.status = "not_found"
+            continue
+        
+        server_version = server_versions.get(key)
+        if change.base_updated_at and server_version and server_version > _as_utc_naive(change.base_updated_at):
+            result.status = "conflict"
+            result.detail = "L'entité a été modifiée sur le serveur depuis la dernière synchronisation"
+            result.server_version = jsonable_encoder(response_schema.model_validate(entity))
+            continue
+        
+        try:
+            update_data = update_schema.model_validate(change.data).model_dump(exclude_unset=True)
+        except ValidationError as e:
+            result.status = "invalid"
+            result.detail = str(e)
+            continue
+        
+        try:
+            with db.begin_nested():
+                for field, value in update_data.items():
+                    setattr(entity, field, value)
+                entity.updated_at = datetime.utcnow()
+                db.flush()
+            touched_clients.add(_owner_client_id(entity))
+        except SQLAlchemyError as e:
+            db.expire(entity)
+            result.status = "error"
+            result.detail = str(e.__cause__ or e)
+            continue
+        
+        result.updated_at = entity.updated_at
+    
+    failed = [r for r in results if r.status != "applied"]
+    if batch.atomic and failed:
+        db.rollback()
+        for r in results:
+            if r.status == "applied":
+                r.status = "rolled_back"
+                r.updated_at = None
+        committed = False
+    else:
+        db.commit()
+        committed = True
+        invalidate_clients(*touched_clients)
+    
+    return {
+        "committed": committed,
+        "applied": sum(1 for r in results if r.status == "applied"),
+        "conflicts": sum(1 for r in results if r.status == "conflict"),
+        "failed": sum(1 for r in results if r.status not in ("applied", "conflict", "rolled_back")),
+        "results": results
+    }
@@ -0,0 +1,51 @@
+"""
+Lecture légère pour les endpoints en lecture seule : select() Core des colonnes utiles,
+lignes (tuples) sérialisées directement en JSON, sans instances ORM, identity map ni
+validation Pydantic intermédiaire.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Iterable, Optional
+
+from fastapi import Response
+from sqlalchemy.orm import Session
+
+
+def table_columns(model, names: Optional[Iterable[str]] = None) -> list:
+    """Colonnes Core d'un modèle (toutes, ou celles nommées, dans l'ordre donné)"""
+    columns = model.__table__.c
+    return list(columns) if names is None else [columns[name] for name in names]
+
+
+def schema_columns(model, schema) -> list:
+    """Colonnes correspondant aux champs d'un schéma de réponse Pydantic"""
+    return table_columns(model, schema.model_fields)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+def to_json(value) -> str:
+    """JSON compact (dates ISO, décimaux en nombres, énumérations par valeur)"""
+    return json.dumps(value, default=_json_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def rows_to_json(keys: list, rows: Iterable) -> bytes:
+    """Sérialise des lignes (tuples) en tableau JSON d'objets"""
+    return to_json([dict(zip(keys, row)) for row in rows]).encode("utf-8")
+
+
+def rows_response(db: Session, statement) -> Response:
+    """Exécute un select() Core et renvoie directement le JSON des lignes"""
+    result = db.execute(statement)
+    keys = list(result.keys())
+    return Response(content=rows_to_json(keys, result), media_type="application/json")
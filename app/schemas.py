@@ -1,6 +1,6 @@
 """Schémas Pydantic pour la validation et sérialisation des données"""
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List
+from typing import Optional, List, Union, Any, Dict
 from datetime import datetime, date
 from enum import Enum
 
@@ -32,6 +32,14 @@ class AddressTypeEnum(str, Enum):
     CONSTRUCTION_SITE = "chantier"
 
 
+class ContractHistoryActionEnum(str, Enum):
+    CREATION = "creation"
+    MODIFICATION = "modification"
+    STATUS_CHANGE = "changement_statut"
+    RENEWAL = "renouvellement"
+    CANCELLATION = "resiliation"
+
+
 class InsuranceTypeEnum(str, Enum):
     DO = "dommages_ouvrage"
     RCD = "rc_decennale"
@@ -47,6 +55,22 @@ class GuaranteeTypeEnum(str, Enum):
     COMPLEMENTARY = "complementaire"
 
 
+class LossRatioDimensionEnum(str, Enum):
+    """Axes d'analyse des ratios sinistres / primes"""
+    CLIENT = "client"
+    CONSTRUCTION_SITE = "construction_site"
+    CONTRACT_TYPE = "contract_type"
+    BROKER = "broker"
+    ACCIDENT_YEAR = "accident_year"
+
+
+class CountModeEnum(str, Enum):
+    """Calcul du total des listes paginées"""
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    NONE = "none"
+
+
 # =============================================================================
 # SCHÉMAS CLIENT
 # =============================================================================
@@ -112,7 +136,7 @@ class Client(ClientBase):
     id: int
     created_at: datetime
     updated_at: datetime
-
+    
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -178,7 +202,7 @@ class ClientAddress(ClientAddressBase):
     client_id: int
     created_at: datetime
     updated_at: datetime
-
+    
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -246,10 +270,15 @@ class ConstructionSite(ConstructionSiteBase):
     id: int
     created_at: datetime
     updated_at: datetime
-
+    
     model_config = ConfigDict(from_attributes=True)
 
 
+class ConstructionSiteDistance(ConstructionSite):
+    """Chantier et sa distance au point de recherche"""
+    distance_km: float
+
+
 # =============================================================================
 # SCHÉMAS CONTRAT CLIENT
 # =============================================================================
@@ -306,7 +335,7 @@ class ClientContract(ClientContractBase):
     id: int
     created_at: datetime
     updated_at: datetime
-
+    
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -334,7 +363,7 @@ class InsuranceContractType(InsuranceContractTypeBase):
     id: int
     created_at: datetime
     updated_at: datetime
-
+    
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -372,7 +401,7 @@ class Guarantee(GuaranteeBase):
     id: int
     created_at: datetime
     updated_at: datetime
-
+    
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -387,8 +416,8 @@ class ContractClauseBase(BaseModel):
     content: str
     category: str
     subcategory: Optional[str] = None
-    applies_to_contract_types: Optional[dict] = None
-    applies_to_guarantees: Optional[dict] = None
+    applies_to_contract_types: Optional[List[str]] = None
+    applies_to_guarantees: Optional[List[str]] = None
     is_mandatory: bool = False
     is_negotiable: bool = True
     priority_order: int = 0
@@ -408,7 +437,7 @@ class ContractClause(ContractClauseBase):
     id: int
     created_at: datetime
     updated_at: datetime
-
+    
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -437,7 +466,7 @@ class BuildingCategory(BuildingCategoryBase):
     id: int
     created_at: datetime
     updated_at: datetime
-
+    
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -468,7 +497,7 @@ class WorkCategory(WorkCategoryBase):
     id: int
     created_at: datetime
     updated_at: datetime
-
+    
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -500,7 +529,7 @@ class Profession(ProfessionBase):
     id: int
     created_at: datetime
     updated_at: datetime
-
+    
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -656,5 +685,209 @@ class Claim(ClaimBase):
     rejection_reason: Optional[str] = None
     created_at: datetime
     updated_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ClaimSummary(BaseModel):
+    """Projection de liste d'un sinistre : sans textes ni documents (voir ?expand=)"""
+    id: int
+    claim_number: str
+    external_reference: Optional[str] = None
+    contract_id: int
+    construction_site_id: Optional[int] = None
+    claim_type: ClaimTypeEnum
+    severity: Optional[ClaimSeverityEnum] = None
+    status: ClaimStatusEnum
+    incident_date: datetime
+    declaration_date: datetime
+    acknowledgment_date: Optional[datetime] = None
+    settlement_date: Optional[datetime] = None
+    closure_date: Optional[datetime] = None
+    title: str
+    affected_area: Optional[str] = None
+    floor: Optional[str] = None
+    estimated_amount: Optional[float] = None
+    expert_amount: Optional[float] = None
+    franchise_applied: Optional[float] = None
+    indemnity_amount: Optional[float] = None
+    reserve_amount: Optional[float] = None
+    declared_by: Optional[str] = None
+    expert_name: Optional[str] = None
+    expert_company: Optional[str] = None
+    activated_guarantees: Optional[List[str]] = None
+    has_photos: bool = False
+    has_expert_report: bool = False
+    has_repair_quote: bool = False
+    third_party_involved: bool = False
+    police_report_number: Optional[str] = None
+    repair_status: Optional[str] = None
+    repair_company: Optional[str] = None
+    repair_start_date: Optional[date] = None
+    repair_end_date: Optional[date] = None
+    created_at: datetime
+    updated_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ContractGuaranteeSummary(BaseModel):
+    """Garantie souscrite sur un contrat"""
+    code: Optional[str] = None
+    name: Optional[str] = None
+    ceiling: Optional[float] = None
+    franchise: Optional[float] = None
+    included: Optional[bool] = None
+    annual_premium: Optional[float] = None
+
+
+class ClaimContextContract(ClientContract):
+    """Contrat du sinistre avec ses garanties"""
+    guarantees: List[ContractGuaranteeSummary] = []
+
+
+class ClaimContext(BaseModel):
+    """Contexte complet d'un sinistre pour l'écran de détail"""
+    claim: Claim
+    contract: ClaimContextContract
+    client: Client
+    construction_site: Optional[ConstructionSite] = None  # Chantier du sinistre, à défaut celui du contrat
+
+
+# =============================================================================
+# SCHÉMAS SYNCHRONISATION HORS LIGNE
+# =============================================================================
+
+class SyncEntityTypeEnum(str, Enum):
+    CLAIM = "claim"
+    CONTRACT = "contract"
+    CLIENT = "client"
+
+
+class SyncBatchItem(BaseModel):
+    """Modification locale en attente (file pending_changes du front-end)"""
+    change_id: Optional[Union[int, str]] = Field(None, description="Identifiant local de la modification")
+    entity_type: SyncEntityTypeEnum
+    entity_id: str = Field(..., description="N° de sinistre, ou ID du contrat / du client")
+    operation: str = "update"
+    data: dict = Field(..., description="Champs modifiés")
+    base_updated_at: Optional[datetime] = Field(
+        None, description="updated_at connu du client lors de la modification (détection de conflit)"
+    )
+
+
+class SyncBatchRequest(BaseModel):
+    """Lot de modifications à appliquer dans une seule transaction"""
+    changes: List[SyncBatchItem] = Field(..., max_length=1000)
+    atomic: bool = Field(False, description="Tout annuler si une modification échoue")
+
+
+class SyncBatchItemResult(BaseModel):
+    """Résultat d'une modification du lot"""
+    change_id: Optional[Union[int, str]] = None
+    entity_type: SyncEntityTypeEnum
+    entity_id: str
+    status: str  # applied, conflict, not_found, invalid, error, rolled_back
+    detail: Optional[str] = None
+    updated_at: Optional[datetime] = None
+    server_version: Optional[dict] = None  # Version serveur en cas de conflit
+
+
+class SyncBatchResponse(BaseModel):
+    """Réponse du traitement d'un lot de modifications"""
+    committed: bool
+    applied: int
+    conflicts: int
+    failed: int
+    results: List[SyncBatchItemResult]
+
+
+# =============================================================================
+# SCHÉMAS IMPORT EN MASSE
+# =============================================================================
 
+class BulkRowResult(BaseModel):
+    """Résultat de l'upsert d'une ligne"""
+    index: int  # Position de la ligne dans le flux reçu
+    key: Optional[str] = None  # Clé métier (client_number, contract_number, claim_number)
+    status: str  # created, updated, invalid, duplicate, error
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BulkUpsertResponse(BaseModel):
+    """Synthèse d'un import en masse"""
+    total: int
+    created: int
+    updated: int
+    invalid: int
+    duplicates: int  # Occurrences remplacées par une occurrence ultérieure de la même clé
+    failed: int
+    results: List[BulkRowResult]
+
+
+# =============================================================================
+# SCHÉMAS IMPORT DE PORTEFEUILLE
+# =============================================================================
+
+class PortfolioImportResult(BaseModel):
+    """Synthèse d'un import de portefeuille (CSV / XLSX)"""
+    batch_id: str
+    total_rows: int
+    rejected_rows: int
+    clients_created: int
+    clients_updated: int
+    sites_created: int
+    sites_updated: int
+    contracts_created: int
+    contracts_updated: int
+    ignored_columns: List[str] = []
+    duration_seconds: float
+
+
+class ImportRejection(BaseModel):
+    """Ligne rejetée lors d'un import"""
+    line_number: int
+    errors: str
+    raw_data: Optional[dict] = None
+    
     model_config = ConfigDict(from_attributes=True)
+
+
+# =============================================================================
+# SCHÉMAS ANALYTIQUE
+# =============================================================================
+
+class EventImpactRequest(BaseModel):
+    """Emprise d'un événement (tempête, inondation...) pour le calcul d'impact"""
+    footprint: Dict[str, Any] = Field(
+        ..., description="GeoJSON : Polygon ou MultiPolygon (géométrie ou Feature), ou Point avec radius_km"
+    )
+    radius_km: Optional[float] = Field(None, gt=0, description="Rayon autour du Point (km)")
+    include_addresses: bool = Field(
+        True, description="Contrats sans chantier : localisés par les adresses actives du client"
+    )
+
+
+# =============================================================================
+# SCHÉMAS GÉOCODAGE
+# =============================================================================
+
+class GeocodeQuery(BaseModel):
+    """Adresse à géocoder"""
+    postal_code: str = Field(..., max_length=10)
+    city: Optional[str] = Field(None, max_length=100)
+
+
+class GeocodeBatchRequest(BaseModel):
+    """Lot d'adresses à géocoder"""
+    addresses: List[GeocodeQuery] = Field(..., max_length=10000)
+
+
+class GeocodeResult(BaseModel):
+    """Position d'une adresse (nulle si le code postal est inconnu)"""
+    postal_code: str
+    city: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    precision: Optional[str] = Field(None, description="commune, code_postal ou departement")
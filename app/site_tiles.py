@@ -0,0 +1,311 @@
+"""
+Agrégats de chantiers par tuile de carte (Web Mercator, z/x/y) pour le regroupement côté serveur.
+
+- fake_site_tiles : pour chaque niveau de zoom 0..SITE_TILES_MAX_ZOOM et chaque tuile non vide,
+  nombre de chantiers actifs, rectangle englobant, barycentre et coût de construction total.
+- fake_site_tile_changes : tuiles (au zoom maximal) touchées depuis le dernier rafraîchissement.
+  Alimentée par des triggers de niveau instruction sur fake_construction_sites (tables de
+  transition) : toutes les écritures sont suivies, y compris imports COPY, synchronisation et
+  générateurs.
+
+Le rafraîchissement ne recalcule que les tuiles modifiées au zoom maximal (à partir des chantiers,
+via l'index GiST de position), puis leurs parentes niveau par niveau à partir des tuiles filles.
+Une carte lit quelques centaines de tuiles au lieu de la table des chantiers.
+"""
+import math
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.snapshots import Snapshot
+
+# Zoom le plus fin agrégé (tuiles d'environ 1,7 km en France). Le modifier impose de vider
+# fake_site_tiles : la table est alors reconstruite entièrement à la lecture suivante.
+SITE_TILES_MAX_ZOOM = 14
+
+# Grille de regroupement : tuiles de zoom + 2, soit 4 x 4 groupes par tuile affichée
+CLUSTER_ZOOM_OFFSET = 2
+
+# Nombre maximal de groupes renvoyés par appel
+CLUSTER_MAX_CELLS = 5000
+
+# Au-delà de ce nombre de tuiles modifiées, une reconstruction complète est plus rapide
+SITE_TILES_INCREMENTAL_MAX = 20000
+
+# Période d'application des modifications en tâche de fond (secondes)
+SITE_TILES_REFRESH_SECONDS = 60
+
+# Verrou consultatif : un seul processus met à jour les tuiles à la fois
+SITE_TILES_ADVISORY_LOCK = 4102
+
+# Latitude maximale de la projection Web Mercator
+MAX_MERCATOR_LAT = 85.0511
+
+
+# =============================================================================
+# COORDONNÉES DE TUILES
+# =============================================================================
+
+def tile_x(lon: float, zoom: int) -> int:
+    """Colonne de la tuile contenant une longitude (identique à map_tile_x en SQL)"""
+    n = 1 << zoom
+    return min(max(math.floor((lon + 180.0) / 360.0 * n), 0), n - 1)
+
+
+def tile_y(lat: float, zoom: int) -> int:
+    """Ligne de la tuile contenant une latitude (identique à map_tile_y en SQL)"""
+    n = 1 << zoom
+    lat = math.radians(min(max(lat, -MAX_MERCATOR_LAT), MAX_MERCATOR_LAT))
+    return min(max(math.floor((1.0 - math.log(math.tan(lat) + 1.0 / math.cos(lat)) / math.pi) / 2.0 * n), 0), n - 1)
+
+
+SITE_TILES_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION map_tile_x(lon double precision, zoom integer) RETURNS integer
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT least(greatest(floor((lon + 180.0) / 360.0 * (1 << zoom))::integer, 0), (1 << zoom) - 1)
+    $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION map_tile_y(lat double precision, zoom integer) RETURNS integer
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT least(greatest(floor(
+            (1.0 - ln(tan(radians(least(greatest(lat, -{MAX_MERCATOR_LAT}), {MAX_MERCATOR_LAT})))
+                      + 1.0 / cos(radians(least(greatest(lat, -{MAX_MERCATOR_LAT}), {MAX_MERCATOR_LAT})))) / pi())
+            / 2.0 * (1 << zoom)
+        )::integer, 0), (1 << zoom) - 1)
+    $$
+    """,
+    # Bords d'une tuile (longitude ouest de la colonne x, latitude nord de la ligne y)
+    """
+    CREATE OR REPLACE FUNCTION map_tile_lon(x integer, zoom integer) RETURNS double precision
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT x::double precision / (1 << zoom) * 360.0 - 180.0
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION map_tile_lat(y integer, zoom integer) RETURNS double precision
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT degrees(atan(sinh(pi() * (1.0 - 2.0 * y / (1 << zoom)))))
+    $$
+    """,
+    # Tuiles touchées par une instruction : positions avant et après, chantiers avec coordonnées
+    f"""
+    CREATE OR REPLACE FUNCTION fake_site_tiles_log_changes() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'TRUNCATE' THEN
+            DELETE FROM fake_site_tiles;
+            DELETE FROM fake_site_tile_changes;
+            RETURN NULL;
+        END IF;
+        
+        -- DO UPDATE et non DO NOTHING : la tuile déjà notée est verrouillée jusqu'au commit, une
+        -- mise à jour concurrente (DELETE ... RETURNING) attend donc et relit les chantiers validés
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO fake_site_tile_changes (x, y)
+            SELECT map_tile_x(longitude, {SITE_TILES_MAX_ZOOM}), map_tile_y(latitude, {SITE_TILES_MAX_ZOOM})
+            FROM new_rows
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (x, y) DO UPDATE SET x = excluded.x;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO fake_site_tile_changes (x, y)
+            SELECT map_tile_x(longitude, {SITE_TILES_MAX_ZOOM}), map_tile_y(latitude, {SITE_TILES_MAX_ZOOM})
+            FROM old_rows
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (x, y) DO UPDATE SET x = excluded.x;
+        ELSE
+            INSERT INTO fake_site_tile_changes (x, y)
+            SELECT map_tile_x(position.longitude, {SITE_TILES_MAX_ZOOM}), map_tile_y(position.latitude, {SITE_TILES_MAX_ZOOM})
+            FROM (
+                SELECT o.longitude, o.latitude, n.longitude AS new_longitude, n.latitude AS new_latitude
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                WHERE (o.latitude, o.longitude, o.construction_cost, o.is_active)
+                      IS DISTINCT FROM (n.latitude, n.longitude, n.construction_cost, n.is_active)
+            ) moved
+            CROSS JOIN LATERAL (VALUES (moved.longitude, moved.latitude), (moved.new_longitude, moved.new_latitude))
+                AS position(longitude, latitude)
+            WHERE position.latitude IS NOT NULL AND position.longitude IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (x, y) DO UPDATE SET x = excluded.x;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+]
+
+# Un trigger par événement : les tables de transition n'acceptent qu'un seul événement
+SITE_TILES_TRIGGERS = {
+    "fake_site_tiles_insert": "AFTER INSERT ON fake_construction_sites REFERENCING NEW TABLE AS new_rows",
+    "fake_site_tiles_update": "AFTER UPDATE ON fake_construction_sites REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "fake_site_tiles_delete": "AFTER DELETE ON fake_construction_sites REFERENCING OLD TABLE AS old_rows",
+    "fake_site_tiles_truncate": "AFTER TRUNCATE ON fake_construction_sites",
+}
+
+
+def create_site_tiles_triggers(connection) -> None:
+    """Crée les fonctions de tuilage et les triggers absents (tables créées par create_all)"""
+    for statement in SITE_TILES_DDL:
+        connection.execute(text(statement))
+    for name, definition in SITE_TILES_TRIGGERS.items():
+        exists = connection.execute(text("SELECT 1 FROM pg_trigger WHERE tgname = :name"), {"name": name}).first()
+        if not exists:
+            connection.execute(text(
+                f"CREATE TRIGGER {name} {definition} FOR EACH STATEMENT EXECUTE FUNCTION fake_site_tiles_log_changes()"
+            ))
+
+
+# =============================================================================
+# MISE À JOUR DES TUILES
+# =============================================================================
+
+_TILE_AGGREGATES = """
+    count(*), coalesce(sum(s.construction_cost), 0),
+    min(s.longitude), min(s.latitude), max(s.longitude), max(s.latitude),
+    sum(s.longitude), sum(s.latitude), now()
+"""
+
+_CHILD_AGGREGATES = """
+    sum(t.sites_count), sum(t.total_construction_cost),
+    min(t.min_lon), min(t.min_lat), max(t.max_lon), max(t.max_lat),
+    sum(t.sum_lon), sum(t.sum_lat), now()
+"""
+
+_TILE_COLUMNS = """
+    zoom, x, y, sites_count, total_construction_cost,
+    min_lon, min_lat, max_lon, max_lat, sum_lon, sum_lat, updated_at
+"""
+
+_ACTIVE_LOCATED = "s.is_active IS NOT FALSE AND s.latitude IS NOT NULL AND s.longitude IS NOT NULL"
+
+
+def _rebuild_all(db: Session) -> None:
+    db.execute(text("DELETE FROM fake_site_tile_changes"))
+    db.execute(text("DELETE FROM fake_site_tiles"))
+    db.execute(text(f"""
+        INSERT INTO fake_site_tiles ({_TILE_COLUMNS})
+        SELECT :zoom, map_tile_x(s.longitude, :zoom), map_tile_y(s.latitude, :zoom), {_TILE_AGGREGATES}
+        FROM fake_construction_sites s
+        WHERE {_ACTIVE_LOCATED}
+        GROUP BY 2, 3
+    """), {"zoom": SITE_TILES_MAX_ZOOM})
+    for zoom in range(SITE_TILES_MAX_ZOOM - 1, -1, -1):
+        db.execute(text(f"""
+            INSERT INTO fake_site_tiles ({_TILE_COLUMNS})
+            SELECT :zoom, t.x / 2, t.y / 2, {_CHILD_AGGREGATES}
+            FROM fake_site_tiles t
+            WHERE t.zoom = :zoom + 1
+            GROUP BY 2, 3
+        """), {"zoom": zoom})
+
+
+def _refresh_tiles(db: Session, tiles: list) -> None:
+    """Recalcule les tuiles modifiées (zoom maximal) puis leurs parentes, niveau par niveau"""
+    params = {"zoom": SITE_TILES_MAX_ZOOM, "xs": [x for x, _ in tiles], "ys": [y for _, y in tiles]}
+    dirty = "unnest(CAST(:xs AS integer[]), CAST(:ys AS integer[])) AS d(x, y)"
+    db.execute(text(f"DELETE FROM fake_site_tiles t USING {dirty} WHERE t.zoom = :zoom AND t.x = d.x AND t.y = d.y"), params)
+    # Chantiers de chaque tuile lus par l'index GiST sur point(longitude, latitude) (une recherche par tuile)
+    db.execute(text(f"""
+        INSERT INTO fake_site_tiles ({_TILE_COLUMNS})
+        SELECT :zoom, d.x, d.y, tile.*
+        FROM {dirty}
+        CROSS JOIN LATERAL (
+            SELECT {_TILE_AGGREGATES}
+            FROM fake_construction_sites s
+            WHERE point(s.longitude, s.latitude) <@ box(
+                      point(map_tile_lon(d.x, :zoom), map_tile_lat(d.y + 1, :zoom)),
+                      point(map_tile_lon(d.x + 1, :zoom), map_tile_lat(d.y, :zoom)))
+              AND map_tile_x(s.longitude, :zoom) = d.x AND map_tile_y(s.latitude, :zoom) = d.y
+              AND {_ACTIVE_LOCATED}
+        ) AS tile(sites_count)
+        WHERE tile.sites_count > 0
+    """), params)
+    
+    for zoom in range(SITE_TILES_MAX_ZOOM - 1, -1, -1):
+        tiles = sorted({(x // 2, y // 2) for x, y in tiles})
+        params = {"zoom": zoom, "xs": [x for x, _ in tiles], "ys": [y for _, y in tiles]}
+        db.execute(text(f"DELETE FROM fake_site_tiles t USING {dirty} WHERE t.zoom = :zoom AND t.x = d.x AND t.y = d.y"), params)
+        db.execute(text(f"""
+            INSERT INTO fake_site_tiles ({_TILE_COLUMNS})
+            SELECT :zoom, d.x, d.y, {_CHILD_AGGREGATES}
+            FROM {dirty}
+            JOIN fake_site_tiles t
+              ON t.zoom = :zoom + 1 AND t.x BETWEEN d.x * 2 AND d.x * 2 + 1 AND t.y BETWEEN d.y * 2 AND d.y * 2 + 1
+            GROUP BY d.x, d.y
+        """), params)
+
+
+def refresh_site_tiles(db: Session) -> dict:
+    """
+    Applique les modifications de chantiers en attente aux tuiles (reconstruction complète si la
+    table des tuiles est vide). Ne fait rien si un autre processus met déjà les tuiles à jour.
+    """
+    pending = db.execute(text("""
+        SELECT EXISTS (SELECT 1 FROM fake_site_tile_changes),
+               NOT EXISTS (SELECT 1 FROM fake_site_tiles)
+               AND EXISTS (SELECT 1 FROM fake_construction_sites WHERE latitude IS NOT NULL AND longitude IS NOT NULL)
+    """)).one()
+    if not any(pending):
+        db.rollback()
+        return {"rebuilt": False, "changed_tiles": 0}
+    if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": SITE_TILES_ADVISORY_LOCK}).scalar():
+        db.rollback()
+        return {"skipped": "mise à jour en cours dans un autre processus"}
+    
+    changed = db.execute(text("DELETE FROM fake_site_tile_changes RETURNING x, y")).all()
+    rebuild = pending[1] or len(changed) > SITE_TILES_INCREMENTAL_MAX
+    if rebuild:
+        _rebuild_all(db)
+    elif changed:
+        _refresh_tiles(db, [tuple(tile) for tile in changed])
+    db.commit()
+    return {"rebuilt": rebuild, "changed_tiles": len(changed)}
+
+
+SITE_TILES_SNAPSHOT = Snapshot("site_tiles", refresh_site_tiles, SITE_TILES_REFRESH_SECONDS)
+
+
+# =============================================================================
+# LECTURE DES GROUPES
+# =============================================================================
+
+def read_clusters(db: Session, bbox: tuple, zoom: int) -> dict:
+    """Groupes de chantiers du rectangle pour un niveau de zoom de carte"""
+    tile_zoom = min(zoom + CLUSTER_ZOOM_OFFSET, SITE_TILES_MAX_ZOOM)
+    min_lon, min_lat, max_lon, max_lat = bbox
+    rows = db.execute(text("""
+        SELECT x, y, sites_count, total_construction_cost, min_lon, min_lat, max_lon, max_lat, sum_lon, sum_lat
+        FROM fake_site_tiles
+        WHERE zoom = :zoom AND x BETWEEN :x_min AND :x_max AND y BETWEEN :y_min AND :y_max
+        ORDER BY x, y
+        LIMIT :limit
+    """), {
+        "zoom": tile_zoom,
+        "x_min": tile_x(min_lon, tile_zoom), "x_max": tile_x(max_lon, tile_zoom),
+        # Les lignes de tuiles sont numérotées du nord au sud
+        "y_min": tile_y(max_lat, tile_zoom), "y_max": tile_y(min_lat, tile_zoom),
+        "limit": CLUSTER_MAX_CELLS + 1,
+    }).all()
+    
+    clusters = [
+        {
+            "tile": f"{tile_zoom}/{row.x}/{row.y}",
+            "count": row.sites_count,
+            "center": [round(row.sum_lon / row.sites_count, 6), round(row.sum_lat / row.sites_count, 6)],
+            "bbox": [row.min_lon, row.min_lat, row.max_lon, row.max_lat],
+            "total_construction_cost": round(row.total_construction_cost, 2),
+        }
+        for row in rows[:CLUSTER_MAX_CELLS]
+    ]
+    return {
+        "zoom": zoom,
+        "tile_zoom": tile_zoom,
+        "bbox": list(bbox),
+        "total_sites": sum(cluster["count"] for cluster in clusters),
+        "truncated": len(rows) > CLUSTER_MAX_CELLS,
+        "clusters": clusters,
+    }
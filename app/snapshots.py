@@ -0,0 +1,107 @@
+"""
+Instantanés en mémoire d'agrégats coûteux, servis en stale-while-revalidate.
+
+Un instantané est recalculé en tâche de fond toutes les `refresh_interval` secondes.
+Une lecture ne déclenche jamais plus d'un calcul à la fois : au premier appel les
+requêtes concurrentes attendent le même calcul, ensuite la valeur en mémoire est
+servie immédiatement (même périmée) pendant qu'un seul rafraîchissement s'exécute.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, read_session
+
+
+class Snapshot:
+    """Valeur calculée par `compute(db)`, partagée par toutes les requêtes du processus"""
+    
+    def __init__(self, name: str, compute: Callable[[Session], dict], refresh_interval: float, replica: bool = False):
+        self.name = name
+        self.compute = compute
+        self.refresh_interval = refresh_interval
+        self.replica = replica  # Calcul en lecture seule : servi par la réplique si elle est utilisable
+        self.value: Optional[dict] = None
+        self.generated_at: Optional[datetime] = None
+        self.computations = 0
+        self.last_error: Optional[str] = None
+        self._computed_at = 0.0  # Horloge monotone du dernier calcul réussi
+        self._lock = threading.Lock()  # Un seul calcul à la fois
+        self._state_lock = threading.Lock()  # Protège _refreshing (jamais tenu pendant un calcul)
+        self._refreshing = False
+    
+    @property
+    def age(self) -> Optional[float]:
+        return time.monotonic() - self._computed_at if self.value is not None else None
+    
+    @property
+    def is_stale(self) -> bool:
+        return self.value is None or self.age > self.refresh_interval
+    
+    def refresh(self, only_if_stale: bool = False) -> None:
+        """Recalcule l'instantané ; en cas d'erreur la valeur précédente est conservée"""
+        with self._lock:
+            # Un calcul concurrent vient peut-être de se terminer pendant l'attente du verrou
+            if only_if_stale and not self.is_stale:
+                return
+            self._refresh_locked()
+    
+    def _refresh_locked(self) -> None:
+        db = read_session() if self.replica else SessionLocal()
+        try:
+            value = self.compute(db)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"❌ Rafraîchissement de l'instantané {self.name} : {self.last_error}")
+            if self.value is None:
+                raise
+            return
+        finally:
+            db.close()
+        self.value = value
+        self.generated_at = datetime.now(timezone.utc)
+        self._computed_at = time.monotonic()
+        self.computations += 1
+        self.last_error = None
+    
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh(only_if_stale=True)
+        except Exception:
+            pass
+        finally:
+            with self._state_lock:
+                self._refreshing = False
+    
+    def get(self) -> dict:
+        """
+        Valeur courante. Sans valeur, les appelants concurrents attendent un calcul unique ;
+        une valeur périmée est servie telle quelle et un seul rafraîchissement est lancé.
+        """
+        if self.value is None:
+            with self._lock:
+                if self.value is None:
+                    self._refresh_locked()
+            return self.value
+        
+        if self.is_stale and not self._refreshing:
+            with self._state_lock:
+                start = not self._refreshing
+                self._refreshing = True
+            if start:
+                threading.Thread(target=self._refresh_in_background, name=f"snapshot-{self.name}", daemon=True).start()
+        return self.value
+    
+    async def run_periodic(self) -> None:
+        """Boucle de rafraîchissement à lancer au démarrage de l'application"""
+        while True:
+            try:
+                await run_in_threadpool(self.refresh)
+            except Exception:
+                pass  # Erreur déjà tracée, nouvel essai à l'échéance suivante
+            await asyncio.sleep(self.refresh_interval)
@@ -0,0 +1,81 @@
+"""Agrégats statistiques (clients, contrats, sinistres) partagés par /stats et /dashboard"""
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import (
+    ClaimModel, ClientAddressModel, ClientContractModel, ClientModel, ConstructionSiteModel
+)
+
+OPEN_CLAIM_STATUSES = ("declare", "pris_en_compte", "en_cours_expertise", "attente_pieces", "accepte")
+CLAIM_TYPES = ("structurel", "degats_des_eaux", "incendie", "intemperies", "vol", "vandalisme", "malfacons", "rc", "autre")
+
+
+def compute_global_stats(db: Session) -> dict:
+    """Statistiques globales de la base de données"""
+    total_clients, clients_particulier, clients_professionnel = db.query(
+        func.count(ClientModel.id),
+        func.count(ClientModel.id).filter(ClientModel.client_type == "particulier"),
+        func.count(ClientModel.id).filter(ClientModel.client_type == "professionnel"),
+    ).one()
+    contracts_by_status = db.query(
+        ClientContractModel.status,
+        func.count(ClientContractModel.id)
+    ).group_by(ClientContractModel.status).all()
+    
+    return {
+        "total_clients": total_clients,
+        "total_addresses": db.query(func.count(ClientAddressModel.id)).scalar(),
+        "total_construction_sites": db.query(func.count(ConstructionSiteModel.id)).scalar(),
+        "total_contracts": sum(count for _, count in contracts_by_status),
+        "clients_by_type": {
+            "particulier": clients_particulier,
+            "professionnel": clients_professionnel
+        },
+        "contracts_by_status": {status: count for status, count in contracts_by_status}
+    }
+
+
+def compute_claims_stats(db: Session) -> dict:
+    """Statistiques sur les sinistres (un seul parcours de la table pour les totaux)"""
+    total, open_claims, settled, rejected, total_estimated, total_indemnity = db.query(
+        func.count(ClaimModel.id),
+        func.count(ClaimModel.id).filter(ClaimModel.status.in_(OPEN_CLAIM_STATUSES)),
+        func.count(ClaimModel.id).filter(ClaimModel.status == "regle"),
+        func.count(ClaimModel.id).filter(ClaimModel.status == "refuse"),
+        func.sum(ClaimModel.estimated_amount),
+        func.sum(ClaimModel.indemnity_amount),
+    ).one()
+    counts_by_type = dict(
+        db.query(ClaimModel.claim_type, func.count(ClaimModel.id)).group_by(ClaimModel.claim_type).all()
+    )
+    
+    return {
+        "total_claims": total,
+        "open_claims": open_claims,
+        "settled_claims": settled,
+        "rejected_claims": rejected,
+        "total_estimated_amount": total_estimated or 0,
+        "total_indemnity_amount": total_indemnity or 0,
+        "claims_by_type": {claim_type: counts_by_type.get(claim_type, 0) for claim_type in CLAIM_TYPES}
+    }
+
+
+def compute_contract_stats(db: Session) -> dict:
+    """Statistiques sur les contrats"""
+    total, active, draft, cancelled, total_premium, avg_premium = db.query(
+        func.count(ClientContractModel.id),
+        func.count(ClientContractModel.id).filter(ClientContractModel.status == "actif"),
+        func.count(ClientContractModel.id).filter(ClientContractModel.status == "brouillon"),
+        func.count(ClientContractModel.id).filter(ClientContractModel.status == "resilie"),
+        func.sum(ClientContractModel.annual_premium),
+        func.avg(ClientContractModel.annual_premium),
+    ).one()
+    
+    return {
+        "total_contracts": total or 0,
+        "active_contracts": active or 0,
+        "draft_contracts": draft or 0,
+        "cancelled_contracts": cancelled or 0,
+        "total_premium_volume": float(total_premium or 0),
+        "average_premium": float(avg_premium or 0)
+    }
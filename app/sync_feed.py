@@ -0,0 +1,97 @@
+"""
+Ordre de validation des écritures pour le flux de synchronisation hors ligne (/sync/changes).
+
+- sync_xid : identifiant (64 bits) de la transaction qui a écrit la ligne en dernier, posé par la
+  valeur par défaut de la colonne à l'insertion (sans coût de trigger pour les imports) puis par
+  un trigger BEFORE UPDATE sur chaque table synchronisée. Contrairement à updated_at
+  (posé par l'application avant le commit), il ne dépend ni de l'horloge ni de la durée de la
+  transaction.
+- Borne du flux : xmin de l'instantané courant, plus ancienne transaction encore en cours.
+  Toute ligne dont sync_xid est inférieur est validée (ou annulée, donc invisible) : aucune
+  transaction encore ouverte ne peut plus écrire derrière un curseur déjà remis à un client.
+  Le flux attend donc la fin des transactions longues (imports, lots) au lieu de les perdre.
+- fake_sync_tombstones : suppressions physiques (contrats, sinistres...), journalisées par un
+  trigger AFTER DELETE de niveau instruction (table de transition), avec le même sync_xid.
+
+Les TRUNCATE ne sont pas journalisés : après un rechargement complet, les clients doivent
+repartir d'une synchronisation complète (jeton absent).
+"""
+from sqlalchemy import text
+
+from app import schemas
+from app.models import (
+    CURRENT_XID_SQL,
+    ClientModel, ClientContractModel, ClaimModel, ConstructionSiteModel,
+    InsuranceContractTypeModel, GuaranteeModel, ContractClauseModel,
+    BuildingCategoryModel, WorkCategoryModel, ProfessionModel
+)
+
+# Entités synchronisées : nom exposé -> (modèle, schéma de sérialisation)
+SYNC_ENTITIES = {
+    "clients": (ClientModel, schemas.Client),
+    "contracts": (ClientContractModel, schemas.ClientContract),
+    "claims": (ClaimModel, schemas.Claim),
+    "construction_sites": (ConstructionSiteModel, schemas.ConstructionSite),
+    "contract_types": (InsuranceContractTypeModel, schemas.InsuranceContractType),
+    "guarantees": (GuaranteeModel, schemas.Guarantee),
+    "clauses": (ContractClauseModel, schemas.ContractClause),
+    "building_categories": (BuildingCategoryModel, schemas.BuildingCategory),
+    "work_categories": (WorkCategoryModel, schemas.WorkCategory),
+    "professions": (ProfessionModel, schemas.Profession),
+}
+
+# Borne du flux : plus ancienne transaction encore en cours lors de l'instantané
+SNAPSHOT_XMIN_SQL = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+
+SYNC_FEED_DDL = [
+    f"""
+    CREATE OR REPLACE FUNCTION fake_sync_stamp_xid() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.sync_xid := {CURRENT_XID_SQL};
+        RETURN NEW;
+    END
+    $$
+    """,
+    # TG_ARGV[0] : nom de l'entité exposé par /sync/changes
+    f"""
+    CREATE OR REPLACE FUNCTION fake_sync_log_deletes() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO fake_sync_tombstones (entity, entity_id, sync_xid, deleted_at)
+        SELECT TG_ARGV[0], id, {CURRENT_XID_SQL}, now() AT TIME ZONE 'utc' FROM old_rows;
+        RETURN NULL;
+    END
+    $$
+    """,
+]
+
+
+def _sync_triggers() -> dict:
+    """Triggers par table synchronisée : nom -> définition"""
+    triggers = {}
+    for name, (model, _) in SYNC_ENTITIES.items():
+        table = model.__tablename__
+        triggers[f"{table}_sync_xid"] = (
+            f"BEFORE UPDATE ON {table} FOR EACH ROW EXECUTE FUNCTION fake_sync_stamp_xid()"
+        )
+        triggers[f"{table}_sync_delete"] = (
+            f"AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION fake_sync_log_deletes('{name}')"
+        )
+    return triggers
+
+
+def create_sync_triggers(connection) -> None:
+    """Crée les fonctions du flux et les triggers absents (colonnes et tables créées par create_all)"""
+    for statement in SYNC_FEED_DDL:
+        connection.execute(text(statement))
+    for name, definition in _sync_triggers().items():
+        exists = connection.execute(text("SELECT 1 FROM pg_trigger WHERE tgname = :name"), {"name": name}).first()
+        if not exists:
+            connection.execute(text(f"CREATE TRIGGER {name} {definition}"))
+
+
+def snapshot_xmin(db) -> int:
+    """Borne supérieure (exclue) des sync_xid publiables"""
+    return db.execute(text(SNAPSHOT_XMIN_SQL)).scalar()
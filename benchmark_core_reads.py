@@ -0,0 +1,176 @@
+"""
+Benchmark des lectures en liste : instances ORM vs select() Core sérialisé directement
+Usage:
+    python benchmark_core_reads.py                  # 10 000 lignes par table
+    python benchmark_core_reads.py --rows 50000     # Volume plus important
+    python benchmark_core_reads.py --runs 5         # Nombre d'exécutions par mesure
+
+Les lignes de test (adresses, historique, chantiers) sont insérées dans une transaction
+annulée à la fin : la base n'est pas modifiée. Les deux chemins reproduisent les endpoints
+GET /addresses, GET /contract-history et GET /construction-sites avant et après passage à
+la lecture Core (app/rows.py). Temps CPU et pic mémoire sont ramenés à 1000 lignes.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from app import schemas
+from app.database import engine
+from app.models import ClientAddressModel, ConstructionSiteModel, ContractHistoryModel
+from app.rows import rows_to_json, schema_columns, table_columns
+
+
+def seed(conn, rows: int) -> None:
+    client_id = conn.execute(text("""
+        INSERT INTO fake_clients (client_number, client_type, last_name, is_active, country, created_at, updated_at)
+        VALUES ('BENCH-CORE', 'particulier', 'Benchmark', true, 'France', now(), now())
+        RETURNING id
+    """)).scalar()
+    contract_id = conn.execute(text("""
+        INSERT INTO fake_client_contracts (contract_number, contract_type_code, client_id, status,
+                                           duration_years, is_renewable, created_at, updated_at)
+        VALUES ('BENCH-CORE', 'DO', :client_id, 'actif', 10, false, now(), now())
+        RETURNING id
+    """), {"client_id": client_id}).scalar()
+    conn.execute(text("""
+        INSERT INTO fake_client_addresses (client_id, address_type, name, address_line1, postal_code, city,
+                                           country, latitude, longitude, display_order, is_active, is_primary,
+                                           notes, created_at, updated_at)
+        SELECT :client_id, 'chantier', 'Adresse ' || i, i || ' rue de la Paix', '75001', 'Paris',
+               'France', 48.86, 2.33, i, true, false, 'Note ' || i, now(), now()
+        FROM generate_series(1, :rows) AS i
+    """), {"client_id": client_id, "rows": rows})
+    conn.execute(text("""
+        INSERT INTO fake_contract_history (contract_id, action, field_changed, old_value, new_value,
+                                           changed_by, changed_at, comment)
+        SELECT :contract_id, 'modification', 'annual_premium', i::text, (i + 1)::text,
+               'benchmark', now() - i * interval '1 minute', 'Révision ' || i
+        FROM generate_series(1, :rows) AS i
+    """), {"contract_id": contract_id, "rows": rows})
+    conn.execute(text("""
+        INSERT INTO fake_construction_sites (site_reference, site_name, address_line1, postal_code, city,
+                                             latitude, longitude, total_surface_m2, construction_cost,
+                                             permit_date, has_basement, has_swimming_pool, has_elevator,
+                                             flood_zone, soil_study_done, is_active, created_at, updated_at)
+        SELECT 'BENCH-' || i, 'Chantier ' || i, i || ' avenue Foch', '69001', 'Lyon',
+               45.76, 4.83, 120.5, 250000, current_date, false, false, true,
+               false, true, true, now(), now()
+        FROM generate_series(1, :rows) AS i
+    """), {"rows": rows})
+
+
+# =============================================================================
+# CHEMINS COMPARÉS
+# =============================================================================
+
+ADDRESS_FIELDS = [column.key for column in ClientAddressModel.__table__.columns]
+HISTORY_FIELDS = [column.key for column in ContractHistoryModel.__table__.columns]
+
+
+def orm_addresses(db: Session, rows: int) -> bytes:
+    addresses = db.query(ClientAddressModel).limit(rows).all()
+    payload = [{field: getattr(address, field) for field in ADDRESS_FIELDS} for address in addresses]
+    return json.dumps(jsonable_encoder(payload)).encode("utf-8")
+
+
+def orm_history(db: Session, rows: int) -> bytes:
+    history = db.query(ContractHistoryModel).order_by(ContractHistoryModel.changed_at.desc()).limit(rows).all()
+    payload = [{field: getattr(entry, field) for field in HISTORY_FIELDS} for entry in history]
+    return json.dumps(jsonable_encoder(payload)).encode("utf-8")
+
+
+def orm_sites(db: Session, rows: int) -> bytes:
+    sites = db.query(ConstructionSiteModel).limit(rows).all()
+    payload = [schemas.ConstructionSite.from_orm(site) for site in sites]
+    return json.dumps(jsonable_encoder(payload)).encode("utf-8")
+
+
+def core(statement):
+    def read(db: Session, rows: int) -> bytes:
+        result = db.execute(statement.limit(rows))
+        return rows_to_json(list(result.keys()), result)
+    return read
+
+
+CASES = {
+    "Adresses": (
+        orm_addresses,
+        core(select(*table_columns(ClientAddressModel)))
+    ),
+    "Historique": (
+        orm_history,
+        core(select(*table_columns(ContractHistoryModel)).order_by(ContractHistoryModel.changed_at.desc()))
+    ),
+    "Chantiers": (
+        orm_sites,
+        core(select(*schema_columns(ConstructionSiteModel, schemas.ConstructionSite)))
+    ),
+}
+
+
+def measure(conn, read, rows: int, runs: int) -> tuple:
+    """(temps CPU médian en ms, pic mémoire en Ko), ramenés à 1000 lignes"""
+    durations = []
+    for _ in range(runs):
+        with Session(bind=conn) as db:
+            start = time.process_time()
+            read(db, rows)
+            durations.append((time.process_time() - start) * 1000)
+    
+    with Session(bind=conn) as db:
+        tracemalloc.start()
+        read(db, rows)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    
+    per_thousand = 1000 / rows
+    return sorted(durations)[len(durations) // 2] * per_thousand, peak / 1024 * per_thousand
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Comparer les lectures en liste ORM et Core (CPU et mémoire pour 1000 lignes)"
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=10000,
+        help="Nombre de lignes lues par table (défaut: 10000)"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Nombre d'exécutions par mesure (défaut: 5)"
+    )
+    args = parser.parse_args()
+    
+    with engine.connect() as conn:
+        print(f"\n🔧 Insertion de {args.rows} lignes de test par table...")
+        seed(conn, args.rows)
+        
+        print("\n" + "=" * 78)
+        print(f"⏱️  POUR 1000 LIGNES (CPU médian sur {args.runs} exécutions, pic mémoire)")
+        print("=" * 78)
+        print(f"  {'':12} {'CPU ORM':>11} {'CPU Core':>11} {'gain':>6}   {'Mém. ORM':>11} {'Mém. Core':>11} {'gain':>6}")
+        for label, (orm_read, core_read) in CASES.items():
+            orm_read(Session(bind=conn), args.rows)  # préchauffage (cache de requêtes compilées)
+            core_read(Session(bind=conn), args.rows)
+            orm_cpu, orm_memory = measure(conn, orm_read, args.rows, args.runs)
+            core_cpu, core_memory = measure(conn, core_read, args.rows, args.runs)
+            print(
+                f"  {label:12} {orm_cpu:8.1f} ms {core_cpu:8.1f} ms {orm_cpu / core_cpu:5.1f}x"
+                f"   {orm_memory:8.0f} Ko {core_memory:8.0f} Ko {orm_memory / core_memory:5.1f}x"
+            )
+        print("=" * 78 + "\n")
+        
+        conn.rollback()
+
+
+if __name__ == "__main__":
+    main()
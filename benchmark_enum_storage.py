@@ -0,0 +1,128 @@
+"""
+Benchmark du stockage des colonnes de statut : varchar vs énumération PostgreSQL native
+Usage:
+    python benchmark_enum_storage.py                  # 1 000 000 lignes
+    python benchmark_enum_storage.py --rows 200000    # Volume réduit
+    python benchmark_enum_storage.py --runs 5         # Nombre d'exécutions par requête
+
+Les deux tables temporaires reproduisent les colonnes de fake_claims (statut, type, gravité)
+avec des valeurs aléatoires : la base n'est pas modifiée.
+"""
+import argparse
+import time
+from sqlalchemy import text
+
+from app.database import engine
+from app.models import ClaimStatusEnum, ClaimTypeEnum, ClaimSeverityEnum
+
+COLUMNS = {
+    "status": (ClaimStatusEnum, "claim_status_enum"),
+    "claim_type": (ClaimTypeEnum, "claim_type_enum"),
+    "severity": (ClaimSeverityEnum, "claim_severity_enum"),
+}
+
+QUERIES = {
+    "Filtre (seq scan)": "SELECT count(*), sum(amount) FROM {table} WHERE status = 'en_cours_expertise' AND severity = 'grave'",
+    "Filtre (index)": "SELECT count(*) FROM {table} WHERE status = 'cloture'",
+    "Agrégat par statut": "SELECT status, count(*), sum(amount) FROM {table} GROUP BY status",
+    "Agrégat type x gravité": "SELECT claim_type, severity, count(*), avg(amount) FROM {table} GROUP BY claim_type, severity",
+}
+
+
+def random_value_sql(enum_class) -> str:
+    values = ", ".join(f"'{member.value}'" for member in enum_class)
+    return f"(ARRAY[{values}])[1 + floor(random() * {len(enum_class)})::int]"
+
+
+def create_tables(conn, rows: int) -> None:
+    for enum_class, type_name in COLUMNS.values():
+        values = ", ".join(f"'{member.value}'" for member in enum_class)
+        conn.execute(text(
+            f"DO $$ BEGIN CREATE TYPE {type_name} AS ENUM ({values}); "
+            f"EXCEPTION WHEN duplicate_object THEN NULL; END $$"
+        ))
+    
+    columns = ", ".join(f"{name} VARCHAR(30)" for name in COLUMNS)
+    conn.execute(text(f"CREATE TEMP TABLE bench_varchar (id BIGINT, {columns}, amount FLOAT)"))
+    conn.execute(text(f"""
+        INSERT INTO bench_varchar
+        SELECT i, {', '.join(random_value_sql(enum_class) for enum_class, _ in COLUMNS.values())}, random() * 100000
+        FROM generate_series(1, :rows) AS i
+    """), {"rows": rows})
+    
+    casts = ", ".join(f"CAST({name} AS {type_name})" for name, (_, type_name) in COLUMNS.items())
+    conn.execute(text(f"CREATE TEMP TABLE bench_enum AS SELECT id, {casts}, amount FROM bench_varchar"))
+    
+    for table in ("bench_varchar", "bench_enum"):
+        conn.execute(text(f"CREATE INDEX ix_{table}_status ON {table} (status)"))
+        conn.execute(text(f"CREATE INDEX ix_{table}_type_severity ON {table} (claim_type, severity)"))
+        conn.execute(text(f"ANALYZE {table}"))
+
+
+def measure(conn, sql: str, runs: int, seq_scan_only: bool) -> float:
+    """Durée médiane d'une requête, en millisecondes"""
+    conn.execute(text(f"SET enable_indexscan = {'off' if seq_scan_only else 'on'}"))
+    conn.execute(text(f"SET enable_bitmapscan = {'off' if seq_scan_only else 'on'}"))
+    conn.execute(text(sql)).all()  # préchauffage du cache
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        conn.execute(text(sql)).all()
+        durations.append((time.perf_counter() - start) * 1000)
+    return sorted(durations)[len(durations) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Comparer le stockage varchar et enum natif des colonnes de statut"
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=1000000,
+        help="Nombre de lignes générées (défaut: 1000000)"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Nombre d'exécutions par requête (défaut: 5)"
+    )
+    args = parser.parse_args()
+    
+    with engine.connect() as conn:
+        print(f"\n🔧 Génération de {args.rows} lignes...")
+        create_tables(conn, args.rows)
+        
+        print("\n" + "=" * 70)
+        print("📦 STOCKAGE")
+        print("=" * 70)
+        print(f"  {'':28} {'varchar':>18} {'enum':>18}")
+        sizes = {}
+        for table in ("bench_varchar", "bench_enum"):
+            sizes[table] = conn.execute(text(f"""
+                SELECT pg_table_size('{table}'), pg_indexes_size('{table}'),
+                       (SELECT avg(pg_column_size(t.*)) FROM {table} t)
+            """)).one()
+        for label, position, unit in (("Table", 0, "Mo"), ("Index", 1, "Mo"), ("Taille moyenne d'une ligne", 2, "o")):
+            row = [sizes[table][position] for table in ("bench_varchar", "bench_enum")]
+            if unit == "Mo":
+                row = [value / 1024 / 1024 for value in row]
+            print(f"  {label:28} {row[0]:15.1f} {unit:2} {row[1]:15.1f} {unit:2}")
+        
+        print("\n" + "=" * 70)
+        print(f"⏱️  REQUÊTES (médiane sur {args.runs} exécutions)")
+        print("=" * 70)
+        print(f"  {'':28} {'varchar':>15} {'enum':>15} {'gain':>8}")
+        for label, sql in QUERIES.items():
+            seq_scan_only = "seq scan" in label or "Agrégat" in label
+            varchar_ms = measure(conn, sql.format(table="bench_varchar"), args.runs, seq_scan_only)
+            enum_ms = measure(conn, sql.format(table="bench_enum"), args.runs, seq_scan_only)
+            print(f"  {label:28} {varchar_ms:12.1f} ms {enum_ms:12.1f} ms {varchar_ms / enum_ms:7.2f}x")
+        print("=" * 70 + "\n")
+        
+        conn.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Benchmark du mode serveur : débit de l'API selon le nombre de workers gunicorn
+Usage:
+    python benchmark_workers.py                         # 1, 2, 4... workers jusqu'au nombre de cœurs
+    python benchmark_workers.py --workers 1 2 4 8       # Nombres de workers mesurés
+    python benchmark_workers.py --duration 20           # Durée de chaque mesure (secondes)
+    python benchmark_workers.py --path /stats --path /referentials/bundle
+
+Pour chaque nombre de workers, le serveur est lancé avec gunicorn.conf.py (base configurée
+dans .env), puis des processus clients (connexions HTTP persistantes) envoient des GET en
+continu sur les chemins donnés. Les clients tournent sur la même machine et consomment
+eux aussi du CPU : le gain mesuré est un minorant de celui d'un serveur dédié.
+
+Sur une machine à un seul cœur, workers et clients se partagent ce cœur : le gain ne peut pas
+dépasser 1x et la mesure ne dit rien de la montée en charge (avertissement affiché, la mesure
+de référence à 1 worker reste utile). Mesurer sur au moins 4 cœurs pour juger du passage à
+plusieurs workers.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import subprocess
+import threading
+import time
+
+DEFAULT_PATHS = ["/health", "/referentials/bundle", "/stats", "/clients?limit=20"]
+
+
+def worker_counts() -> list:
+    """1, 2, 4... jusqu'au nombre de cœurs (inclus)"""
+    cores = multiprocessing.cpu_count()
+    counts = []
+    count = 1
+    while count < cores:
+        counts.append(count)
+        count *= 2
+    return counts + [cores]
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "BIND": f"127.0.0.1:{port}", "ACCESS_LOG": ""}
+    server = subprocess.Popen(
+        ["gunicorn", "main:app", "-c", "gunicorn.conf.py"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            pass
+        if server.poll() is not None:
+            raise RuntimeError("Le serveur s'est arrêté au démarrage (voir gunicorn main:app -c gunicorn.conf.py)")
+        time.sleep(0.5)
+    stop_server(server)
+    raise RuntimeError("Le serveur n'a pas répondu à /health dans les 60 s")
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def load(port: int, paths: list, connections: int, duration: float, offset: int, results) -> None:
+    """Processus client : `connections` connexions persistantes, requêtes en boucle jusqu'à l'échéance"""
+    deadline = time.perf_counter() + duration
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    
+    def run(index: int) -> None:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local = []
+        failed = 0
+        while time.perf_counter() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            start = time.perf_counter()
+            ok = False
+            # Connexion persistante fermée par un worker recyclé : une nouvelle tentative, comme un client HTTP
+            for _ in range(2):
+                try:
+                    conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+                    response = conn.getresponse()
+                    response.read()
+                    ok = response.status < 400
+                    break
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            if ok:
+                local.append(time.perf_counter() - start)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+    
+    threads = [threading.Thread(target=run, args=(offset + i,)) for i in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((latencies, errors[0]))
+
+
+def measure(port: int, paths: list, clients: int, concurrency: int, duration: float) -> dict:
+    """Débit (requêtes/s) et latences (p50, p99 en ms) de `concurrency` connexions réparties sur `clients` processus"""
+    results = multiprocessing.Queue()
+    per_client = max(concurrency // clients, 1)
+    processes = [
+        multiprocessing.Process(target=load, args=(port, paths, per_client, duration, i * per_client, results))
+        for i in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    latencies = []
+    errors = 0
+    for _ in processes:
+        client_latencies, client_errors = results.get()
+        latencies.extend(client_latencies)
+        errors += client_errors
+    for process in processes:
+        process.join()
+    
+    latencies.sort()
+    
+    def percentile(p: float) -> float:
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0.0
+    
+    return {
+        "requests_per_second": len(latencies) / duration,
+        "p50": percentile(0.50),
+        "p99": percentile(0.99),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mesurer le débit de l'API selon le nombre de workers gunicorn"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Nombres de workers mesurés (défaut: 1, 2, 4... jusqu'au nombre de cœurs)"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=10,
+        help="Durée de chaque mesure en secondes (défaut: 10)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=32,
+        help="Nombre de connexions simultanées (défaut: 32)"
+    )
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=max(multiprocessing.cpu_count() // 2, 1),
+        help="Nombre de processus clients (défaut: la moitié des cœurs)"
+    )
+    parser.add_argument(
+        "--path",
+        action="append",
+        default=None,
+        help=f"Chemin interrogé, répétable (défaut: {' '.join(DEFAULT_PATHS)})"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="Port d'écoute du serveur de test (défaut: 8765)"
+    )
+    args = parser.parse_args()
+    paths = args.path or DEFAULT_PATHS
+    counts = args.workers or worker_counts()
+    
+    print("\n" + "=" * 72)
+    print(f"⏱️  DÉBIT PAR NOMBRE DE WORKERS ({args.concurrency} connexions, {args.duration:.0f} s par mesure)")
+    print(f"    {multiprocessing.cpu_count()} cœurs, chemins : {' '.join(paths)}")
+    if multiprocessing.cpu_count() < 2:
+        print("    ⚠️  Un seul cœur : workers et clients se le partagent, aucun gain multi-cœur mesurable")
+    print("=" * 72)
+    print(f"  {'workers':>7} {'req/s':>10} {'gain':>7} {'p50':>10} {'p99':>10} {'erreurs':>8}")
+    baseline = None
+    for workers in counts:
+        server = start_server(workers, args.port)
+        try:
+            measure(args.port, paths, args.clients, args.concurrency, min(args.duration, 2))  # préchauffage
+            result = measure(args.port, paths, args.clients, args.concurrency, args.duration)
+        finally:
+            stop_server(server)
+        if baseline is None:
+            baseline = result["requests_per_second"] or 1
+        print(
+            f"  {workers:>7} {result['requests_per_second']:>10.0f} {result['requests_per_second'] / baseline:>6.2f}x"
+            f" {result['p50']:>7.1f} ms {result['p99']:>7.1f} ms {result['errors']:>8}"
+        )
+    print("=" * 72 + "\n")
+
+
+if __name__ == "__main__":
+    main()
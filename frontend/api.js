@@ -2,6 +2,9 @@
 // Utiliser une URL relative pour que ça fonctionne avec n'importe quel domaine
 const API_BASE_URL = '';
 
+// Référentiels mis en cache (clés du bundle /referentials/bundle)
+const REFERENTIAL_TYPES = ['contract_types', 'guarantees', 'clauses', 'building_categories', 'work_categories', 'professions'];
+
 // API Client avec support du mode hors ligne
 class API {
     constructor(baseUrl) {
@@ -123,20 +126,10 @@ class API {
             currentStep++;
             if (progressCallback) progressCallback(currentStep, steps, 'Téléchargement des référentiels...');
             console.log('Chargement des référentiels...');
-            const [guarantees, contractTypes, clauses, buildingCategories, workCategories, professions] = await Promise.all([
-                this.getGuaranteeTypes(),
-                this.getContractTypes(),
-                this.getClauses(),
-                this.getBuildingCategories(),
-                this.getWorkCategories(),
-                this.getProfessions()
-            ]);
-            await dbManager.saveReferential('guarantees', guarantees);
-            await dbManager.saveReferential('contract_types', contractTypes);
-            await dbManager.saveReferential('clauses', clauses);
-            await dbManager.saveReferential('building_categories', buildingCategories);
-            await dbManager.saveReferential('work_categories', workCategories);
-            await dbManager.saveReferential('professions', professions);
+            const bundle = await this.getReferentialBundle();
+            for (const type of REFERENTIAL_TYPES) {
+                await dbManager.saveReferential(type, bundle[type] || []);
+            }
             console.log('✅ Référentiels sauvegardés');
             
             // Étape 8: Finalisation
@@ -297,6 +290,20 @@ class API {
                 // Adresses
                 const addresses = await dbManager.getAllAddresses();
                 return addresses;
+            } else if (cleanEndpoint.includes('/construction-sites/clusters')) {
+                // Groupes de la carte - un groupe par chantier en cache
+                const sites = (await dbManager.getAllSites()).filter(site => site.latitude && site.longitude);
+                return {
+                    clusters: sites.map(site => ({
+                        tile: `site/${site.id}`,
+                        count: 1,
+                        center: [site.longitude, site.latitude],
+                        bbox: [site.longitude, site.latitude, site.longitude, site.latitude],
+                        total_construction_cost: site.construction_cost || 0
+                    })),
+                    total_sites: sites.length,
+                    truncated: false
+                };
             } else if (cleanEndpoint.includes('/construction-sites') || cleanEndpoint.includes('/sites')) {
                 // Chantiers
                 const sites = await dbManager.getAllSites();
@@ -305,6 +312,20 @@ class API {
                 // Historique
                 const history = await dbManager.getAllHistory();
                 return history;
+            } else if (cleanEndpoint.includes('/dashboard')) {
+                // Tableau de bord - calculer depuis le cache
+                const stats = await dbManager.getStats();
+                const addresses = await dbManager.getAllAddresses();
+                return {
+                    stats: {
+                        total_clients: stats.clients || 0,
+                        total_contracts: stats.contracts || 0,
+                        total_addresses: addresses.length || 0,
+                        total_construction_sites: stats.sites || 0
+                    },
+                    claims_stats: { total_claims: stats.claims || 0 },
+                    contract_stats: { total_contracts: stats.contracts || 0 }
+                };
             } else if (cleanEndpoint.includes('/stats')) {
                 // Stats générales - calculer depuis le cache
                 const stats = await dbManager.getStats();
@@ -316,6 +337,13 @@ class API {
                     total_addresses: addresses.length || 0,
                     total_construction_sites: stats.sites || 0
                 };
+            } else if (cleanEndpoint.includes('/referentials/bundle')) {
+                // Bundle des référentiels - reconstitué depuis le cache
+                const bundle = {};
+                for (const type of REFERENTIAL_TYPES) {
+                    bundle[type] = (await dbManager.getReferential(type)) || [];
+                }
+                return bundle;
             } else if (cleanEndpoint.includes('/referentials/guarantees') || cleanEndpoint.includes('/referentials/guarantee-types')) {
                 return await dbManager.getReferential('guarantees');
             } else if (cleanEndpoint.includes('/referentials/contract-types')) {
@@ -344,18 +372,18 @@ class API {
         
         try {
             const pendingChanges = await dbManager.getPendingChanges();
+            if (pendingChanges.length === 0) return;
             console.log(`Synchronisation de ${pendingChanges.length} modifications en attente`);
             
-            for (const change of pendingChanges) {
-                try {
-                    // Envoyer la modification au serveur
-                    await this.syncChange(change);
-                    
+            // Envoi de toutes les modifications en un seul appel
+            const response = await this.syncBatch(pendingChanges);
+            for (const result of response.results) {
+                if (result.status === 'applied') {
                     // Supprimer la modification de la file d'attente
-                    await dbManager.deletePendingChange(change.id);
-                    console.log(`Modification ${change.id} synchronisée`);
-                } catch (error) {
-                    console.error(`Erreur de synchronisation de la modification ${change.id}:`, error);
+                    await dbManager.deletePendingChange(result.change_id);
+                    console.log(`Modification ${result.change_id} synchronisée`);
+                } else {
+                    console.error(`Erreur de synchronisation de la modification ${result.change_id}:`, result.status, result.detail);
                 }
             }
         } catch (error) {
@@ -456,6 +484,17 @@ class API {
         return this.request(endpoint);
     }
 
+    async getSiteClusters(bounds, zoom) {
+        // Rectangle affiché, borné aux limites acceptées par l'API (Web Mercator)
+        const bbox = [
+            Math.max(bounds.getWest(), -180),
+            Math.max(bounds.getSouth(), -85.0511),
+            Math.min(bounds.getEast(), 180),
+            Math.min(bounds.getNorth(), 85.0511)
+        ].map(value => value.toFixed(5)).join(',');
+        return this.request(`/construction-sites/clusters?zoom=${zoom}&bbox=${bbox}`);
+    }
+
     async getSite(siteId) {
         return this.request(`/construction-sites/${siteId}`);
     }
@@ -526,7 +565,17 @@ class API {
         return this.request('/stats');
     }
 
+    async getDashboard() {
+        // Statistiques globales, sinistres et contrats (instantané serveur)
+        return this.request('/dashboard');
+    }
+
     // Referentials
+    async getReferentialBundle() {
+        // Tous les référentiels en un appel (revalidé par ETag : 304 si inchangé)
+        return this.request('/referentials/bundle');
+    }
+
     async getContractTypes() {
         return this.request('/referentials/contract-types');
     }
@@ -608,8 +657,14 @@ class API {
         return this.request(`/claims/?${queryString}`);
     }
 
-    async getClaim(claimNumber) {
-        return this.request(`/claims/${claimNumber}`);
+    async getClaim(claimNumber, include = null) {
+        const query = include ? `?include=${encodeURIComponent(include)}` : '';
+        return this.request(`/claims/${claimNumber}${query}`);
+    }
+
+    async getClaimContext(claimNumber) {
+        // Sinistre, contrat (avec garanties), client et chantier en un appel
+        return this.request(`/claims/${claimNumber}/context`);
     }
 
     async searchClaims(query) {
@@ -630,6 +685,28 @@ class API {
         return this.request('/claims/stats');
     }
 
+    // Synchronisation
+    async getChanges(since = null, limit = 500) {
+        const params = new URLSearchParams({ limit });
+        if (since) params.set('since', since);
+        return this.request(`/sync/changes?${params.toString()}`);
+    }
+
+    async syncBatch(pendingChanges, atomic = false) {
+        const changes = pendingChanges.map(change => ({
+            change_id: change.id,
+            entity_type: change.entity_type,
+            entity_id: String(change.entity_id),
+            operation: change.operation || 'update',
+            data: change.data,
+            base_updated_at: change.base_updated_at || null
+        }));
+        return this.request('/sync/batch', {
+            method: 'POST',
+            body: JSON.stringify({ changes, atomic }),
+        });
+    }
+
     async createClaim(claimData) {
         return this.request('/claims/', {
             method: 'POST',
@@ -215,8 +215,10 @@ async function loadViewData(viewName) {
 // Dashboard
 async function loadDashboard() {
     try {
-        const stats = await api.getStats();
-        const claimsStats = await api.getClaimsStats();
+        // Un seul appel : agrégats servis depuis l'instantané du serveur
+        const dashboard = await api.getDashboard();
+        const stats = dashboard.stats;
+        const claimsStats = dashboard.claims_stats;
         
         document.getElementById('stat-clients').textContent = stats.total_clients || 0;
         document.getElementById('stat-addresses').textContent = stats.total_addresses || 0;
@@ -648,31 +650,20 @@ function initSiteMap(latitude, longitude, siteName) {
     marker.bindPopup(popupContent).openPopup();
 }
 
-// Show all sites on map
-async function showAllSitesMap() {
-    try {
-        const sites = await api.getSites();
-        const sitesWithGPS = sites.filter(site => site.latitude && site.longitude);
-        
-        if (sitesWithGPS.length === 0) {
-            showToast('info', 'Info', 'Aucun chantier avec coordonnées GPS');
-            return;
-        }
-        
-        // Show modal
-        document.getElementById('map-modal').classList.add('active');
-        
-        // Initialize map after modal is visible
-        setTimeout(() => {
-            initAllSitesMap(sitesWithGPS);
-        }, 100);
-    } catch (error) {
-        console.error('Error loading sites:', error);
-        showToast('error', 'Erreur', 'Impossible de charger les chantiers');
-    }
+// Show all sites on map (groupes calculés côté serveur pour le rectangle et le zoom affichés)
+let siteClustersLayer = null;
+
+function showAllSitesMap() {
+    // Show modal
+    document.getElementById('map-modal').classList.add('active');
+    
+    // Initialize map after modal is visible
+    setTimeout(() => {
+        initAllSitesMap();
+    }, 100);
 }
 
-function initAllSitesMap(sites) {
+function initAllSitesMap() {
     // Clear existing map if any
     if (siteMap) {
         siteMap.remove();
@@ -687,31 +678,50 @@ function initAllSitesMap(sites) {
         maxZoom: 19
     }).addTo(siteMap);
     
-    // Add markers for each site
-    const markers = [];
-    sites.forEach(site => {
-        const marker = L.marker([site.latitude, site.longitude]).addTo(siteMap);
+    siteClustersLayer = L.layerGroup().addTo(siteMap);
+    siteMap.on('moveend', loadSiteClusters);
+    loadSiteClusters(true);
+}
+
+async function loadSiteClusters(initial = false) {
+    const map = siteMap;
+    try {
+        const data = await api.getSiteClusters(map.getBounds(), map.getZoom());
+        if (map !== siteMap) return;  // Carte fermée ou remplacée pendant le chargement
         
-        // Create popup content
-        const popupContent = `
-            <div style="min-width: 250px;">
-                <h4 style="margin: 0 0 8px 0; color: #2563eb;"><i class="fas fa-hard-hat"></i> ${site.site_name}</h4>
-                <p style="margin: 4px 0;"><strong>Référence:</strong> ${site.site_reference}</p>
-                <p style="margin: 4px 0;"><strong>Adresse:</strong><br/>${site.address_line1}</p>
-                <p style="margin: 4px 0;">${site.postal_code} ${site.city}</p>
-                ${site.building_category_code ? `<p style="margin: 4px 0;"><strong>Catégorie:</strong> ${site.building_category_code}</p>` : ''}
-                ${site.construction_cost ? `<p style="margin: 4px 0;"><strong>Coût:</strong> ${formatCurrency(site.construction_cost)}</p>` : ''}
-            </div>
-        `;
+        if (initial === true && data.total_sites === 0) {
+            showToast('info', 'Info', 'Aucun chantier avec coordonnées GPS');
+        }
         
-        marker.bindPopup(popupContent);
-        markers.push(marker);
-    });
-    
-    // Fit map bounds to show all markers
-    if (markers.length > 0) {
-        const group = L.featureGroup(markers);
-        siteMap.fitBounds(group.getBounds().pad(0.1));
+        siteClustersLayer.clearLayers();
+        data.clusters.forEach(cluster => {
+            const [lon, lat] = cluster.center;
+            if (cluster.count === 1) {
+                const popupContent = `
+                    <div style="min-width: 200px;">
+                        <h4 style="margin: 0 0 8px 0; color: #2563eb;"><i class="fas fa-hard-hat"></i> Chantier</h4>
+                        <p style="margin: 4px 0;"><strong>Coût:</strong> ${formatCurrency(cluster.total_construction_cost)}</p>
+                        <p style="margin: 4px 0;">Lat: ${lat.toFixed(6)}<br/>Lng: ${lon.toFixed(6)}</p>
+                    </div>
+                `;
+                L.marker([lat, lon]).bindPopup(popupContent).addTo(siteClustersLayer);
+                return;
+            }
+            
+            // Groupe : cercle proportionnel au nombre de chantiers, clic = zoom sur son emprise
+            const [minLon, minLat, maxLon, maxLat] = cluster.bbox;
+            L.circleMarker([lat, lon], {
+                radius: Math.min(10 + Math.log2(cluster.count) * 3, 40),
+                color: '#2563eb',
+                fillOpacity: 0.5
+            })
+                .bindTooltip(`${cluster.count} chantiers<br/>${formatCurrency(cluster.total_construction_cost)}`)
+                .on('click', () => map.fitBounds([[minLat, minLon], [maxLat, maxLon]], { padding: [20, 20] }))
+                .addTo(siteClustersLayer);
+        });
+    } catch (error) {
+        console.error('Error loading site clusters:', error);
+        showToast('error', 'Erreur', 'Impossible de charger les chantiers');
     }
 }
 
@@ -867,14 +877,16 @@ let contractsPagination = {
     currentPage: 1,
     pageSize: 20,
     total: 0,
-    pages: 0
+    pages: 0,
+    estimated: false
 };
 
 async function loadContracts(status = null, page = 1) {
     try {
         const params = {
             skip: (page - 1) * contractsPagination.pageSize,
-            limit: contractsPagination.pageSize
+            limit: contractsPagination.pageSize,
+            count: 'estimated'  // Total estimé / mis en cache côté serveur : pas de COUNT à chaque page
         };
         if (status) params.status = status;
         
@@ -887,6 +899,7 @@ async function loadContracts(status = null, page = 1) {
         if (response.total !== undefined) {
             contractsPagination.total = response.total;
             contractsPagination.pages = response.pages;
+            contractsPagination.estimated = response.total_estimated || false;
             contractsPagination.currentPage = response.page;
         }
         
@@ -1200,17 +1213,28 @@ function displayClaimSearchResults(claims) {
 
 async function viewClaimDetail(claimNumber) {
     try {
-        const claim = await api.getClaim(claimNumber);
-        const contracts = await api.getContracts(null, {});
-        const contract = contracts.items ? contracts.items.find(c => c.id === claim.contract_id) : contracts.find(c => c.id === claim.contract_id);
+        let claim, contract, client;
+        try {
+            // Sinistre, contrat, client, chantier et garanties en une seule requête
+            const context = await api.getClaimContext(claimNumber);
+            claim = context.claim;
+            contract = { ...context.contract, construction_site: context.construction_site };
+            client = context.client;
+        } catch (contextError) {
+            // Hors ligne : reconstitution depuis le cache local (IndexedDB)
+            claim = await api.getClaim(claimNumber);
+            const contracts = await api.getContracts(null, {});
+            contract = contracts.items ? contracts.items.find(c => c.id === claim.contract_id) : contracts.find(c => c.id === claim.contract_id);
+            if (contract) {
+                client = await api.getClient(contract.client_id);
+            }
+        }
         
         if (!contract) {
             showToast('error', 'Erreur', 'Contrat non trouvé');
             return;
         }
         
-        const client = await api.getClient(contract.client_id);
-        
         document.getElementById('claim-search-results').style.display = 'none';
         document.getElementById('claim-detail-view').classList.add('active');
         
@@ -1743,7 +1767,7 @@ function displayContracts(contracts) {
             </button>
             <span class="pagination-info">
                 Page ${contractsPagination.currentPage} sur ${contractsPagination.pages} 
-                (${contractsPagination.total} contrat${contractsPagination.total > 1 ? 's' : ''})
+                (${contractsPagination.estimated ? '~' : ''}${contractsPagination.total} contrat${contractsPagination.total > 1 ? 's' : ''})
             </span>
             <button 
                 class="btn btn-secondary btn-sm" 
@@ -1872,21 +1896,14 @@ function displayHistory(history) {
 // Referentials
 async function loadReferentials() {
     try {
-        const [contractTypes, guaranteeTypes, clauses, buildingCategories, workCategories, professions] = await Promise.all([
-            api.getContractTypes(),
-            api.getGuaranteeTypes(),
-            api.getClauses(),
-            api.getBuildingCategories(),
-            api.getWorkCategories(),
-            api.getProfessions(),
-        ]);
+        const bundle = await api.getReferentialBundle();
         
-        document.querySelector('[data-ref="contract_types"] .ref-count').textContent = `${contractTypes.length} types`;
-        document.querySelector('[data-ref="guarantee_types"] .ref-count').textContent = `${guaranteeTypes.length} garanties`;
-        document.querySelector('[data-ref="clauses"] .ref-count').textContent = `${clauses.length} clauses`;
-        document.querySelector('[data-ref="building_categories"] .ref-count').textContent = `${buildingCategories.length} catégories`;
-        document.querySelector('[data-ref="work_categories"] .ref-count').textContent = `${workCategories.length} catégories`;
-        document.querySelector('[data-ref="professions"] .ref-count').textContent = `${professions.length} professions`;
+        document.querySelector('[data-ref="contract_types"] .ref-count').textContent = `${(bundle.contract_types || []).length} types`;
+        document.querySelector('[data-ref="guarantee_types"] .ref-count').textContent = `${(bundle.guarantees || []).length} garanties`;
+        document.querySelector('[data-ref="clauses"] .ref-count').textContent = `${(bundle.clauses || []).length} clauses`;
+        document.querySelector('[data-ref="building_categories"] .ref-count').textContent = `${(bundle.building_categories || []).length} catégories`;
+        document.querySelector('[data-ref="work_categories"] .ref-count').textContent = `${(bundle.work_categories || []).length} catégories`;
+        document.querySelector('[data-ref="professions"] .ref-count').textContent = `${(bundle.professions || []).length} professions`;
     } catch (error) {
         console.error('Error loading referentials:', error);
     }
@@ -166,6 +166,7 @@ class DBManager {
             entity_id: claimNumber,
             operation: 'update',
             data: updates,
+            base_updated_at: claim.updated_at || null,
             timestamp: new Date().toISOString()
         });
         
@@ -327,6 +328,39 @@ class DBManager {
         });
     }
 
+    /**
+     * Supprime des enregistrements par identifiant serveur (champ id)
+     */
+    async deleteByIds(storeName, ids) {
+        const wanted = new Set(ids);
+        return new Promise((resolve, reject) => {
+            const transaction = this.db.transaction([storeName], 'readwrite');
+            const store = transaction.objectStore(storeName);
+            
+            if (store.keyPath === 'id') {
+                for (const id of wanted) {
+                    store.delete(id);
+                }
+            } else {
+                // Sinistres : indexés par numéro, parcours complet
+                const request = store.openCursor();
+                request.onsuccess = () => {
+                    const cursor = request.result;
+                    if (!cursor) {
+                        return;
+                    }
+                    if (wanted.has(cursor.value.id)) {
+                        cursor.delete();
+                    }
+                    cursor.continue();
+                };
+            }
+            
+            transaction.oncomplete = () => resolve();
+            transaction.onerror = () => reject(transaction.error);
+        });
+    }
+
     /**
      * Sauvegarde des métadonnées
      */
@@ -100,22 +100,27 @@ class SyncManager {
 
         console.log(`[SyncManager] Envoi de ${pendingChanges.length} modifications au serveur`);
         
+        // Un seul aller-retour : le serveur applique le lot dans une transaction
+        const response = await this.api.syncBatch(pendingChanges);
+        const changesById = new Map(pendingChanges.map(change => [change.id, change]));
+        
         let successCount = 0;
         let errorCount = 0;
 
-        for (const change of pendingChanges) {
-            try {
-                await this.syncChange(change);
-                await this.dbManager.deletePendingChange(change.id);
+        for (const result of response.results) {
+            const change = changesById.get(result.change_id);
+            
+            if (result.status === 'applied') {
+                await this.dbManager.deletePendingChange(result.change_id);
                 successCount++;
-                console.log(`[SyncManager] Modification ${change.id} synchronisée`);
-            } catch (error) {
+                console.log(`[SyncManager] Modification ${result.change_id} synchronisée`);
+            } else {
                 errorCount++;
-                console.error(`[SyncManager] Échec de synchronisation de ${change.id}:`, error);
+                console.error(`[SyncManager] Échec de synchronisation de ${result.change_id}:`, result.status, result.detail);
                 
-                // Si l'erreur est un conflit, marquer comme nécessitant une intervention manuelle
-                if (error.message.includes('conflict') || error.message.includes('409')) {
-                    await this.markChangeAsConflict(change);
+                // En cas de conflit, marquer comme nécessitant une intervention manuelle
+                if (result.status === 'conflict' && change) {
+                    await this.markChangeAsConflict(change, result.server_version);
                 }
             }
         }
@@ -145,12 +150,13 @@ class SyncManager {
     /**
      * Marque une modification comme étant en conflit
      */
-    async markChangeAsConflict(change) {
+    async markChangeAsConflict(change, serverVersion = null) {
         // Ajouter un flag de conflit
         const conflictChange = {
             ...change,
             conflict: true,
-            conflict_time: new Date().toISOString()
+            conflict_time: new Date().toISOString(),
+            server_version: serverVersion
         };
         
         // Sauvegarder dans une table de conflits si nécessaire
@@ -159,26 +165,27 @@ class SyncManager {
 
     /**
      * Télécharge les données depuis le serveur
+     * Utilise le flux /sync/changes : seules les modifications depuis le
+     * dernier jeton sont téléchargées (pagination tant que has_more est vrai)
      */
     async syncFromServer() {
-        console.log('[SyncManager] Téléchargement des données depuis le serveur');
+        console.log('[SyncManager] Téléchargement des modifications depuis le serveur');
 
         try {
-            // Télécharger les sinistres
-            const claimsResponse = await this.api.getClaims({ limit: 100 });
-            if (claimsResponse.items) {
-                await this.dbManager.saveClaims(claimsResponse.items);
-                console.log(`[SyncManager] ${claimsResponse.items.length} sinistres téléchargés`);
-            }
+            let token = await this.dbManager.getMetadata('sync_token');
+            let hasMore = true;
+            let totalChanges = 0;
 
-            // Télécharger les contrats (si nécessaire)
-            // const contracts = await this.api.getContracts({ limit: 100 });
-            // await this.dbManager.saveContracts(contracts.items);
+            while (hasMore) {
+                const response = await this.api.getChanges(token);
+                totalChanges += await this.applyServerChanges(response.changes);
+                token = response.token;
+                hasMore = response.has_more;
+                // Enregistrer le jeton après chaque page pour reprendre en cas d'interruption
+                await this.dbManager.setMetadata('sync_token', token);
+            }
 
-            // Télécharger les référentiels
-            const guarantees = await this.api.getGuaranteeTypes();
-            await this.dbManager.saveReferential('guarantees', guarantees);
-            console.log('[SyncManager] Référentiels téléchargés');
+            console.log(`[SyncManager] ${totalChanges} modifications téléchargées`);
 
         } catch (error) {
             console.error('[SyncManager] Erreur lors du téléchargement:', error);
@@ -186,6 +193,60 @@ class SyncManager {
         }
     }
 
+    /**
+     * Applique une page de modifications au cache local
+     */
+    async applyServerChanges(changes) {
+        let count = 0;
+
+        if (changes.claims?.updated.length) {
+            await this.dbManager.saveClaims(changes.claims.updated);
+            count += changes.claims.updated.length;
+        }
+        if (changes.contracts?.updated.length) {
+            await this.dbManager.saveContracts(changes.contracts.updated);
+            count += changes.contracts.updated.length;
+        }
+        if (changes.clients?.updated.length) {
+            await this.dbManager.saveClients(changes.clients.updated);
+            count += changes.clients.updated.length;
+        }
+        if (changes.construction_sites?.updated.length) {
+            await this.dbManager.saveSites(changes.construction_sites.updated);
+            count += changes.construction_sites.updated.length;
+        }
+
+        // Suppressions (logiques ou physiques) : retirées du cache local, après les mises à jour
+        const localStores = { claims: 'claims', contracts: 'contracts', clients: 'clients', construction_sites: 'sites' };
+        for (const [name, storeName] of Object.entries(localStores)) {
+            const deleted = changes[name]?.deleted || [];
+            if (deleted.length) {
+                await this.dbManager.deleteByIds(storeName, deleted);
+                count += deleted.length;
+            }
+        }
+
+        // Référentiels : fusion par code dans la liste déjà en cache
+        const referentials = ['contract_types', 'guarantees', 'clauses', 'building_categories', 'work_categories', 'professions'];
+        for (const type of referentials) {
+            const delta = changes[type];
+            if (!delta || (delta.updated.length === 0 && delta.deleted.length === 0)) {
+                continue;
+            }
+            const current = (await this.dbManager.getReferential(type)) || [];
+            const byCode = new Map(current.map(item => [item.code, item]));
+            for (const item of delta.updated) {
+                byCode.set(item.code, item);
+            }
+            const deletedIds = new Set(delta.deleted);
+            const merged = [...byCode.values()].filter(item => !deletedIds.has(item.id));
+            await this.dbManager.saveReferential(type, merged);
+            count += delta.updated.length + delta.deleted.length;
+        }
+
+        return count;
+    }
+
     /**
      * Force une synchronisation immédiate
      */
@@ -14,6 +14,7 @@ from sqlalchemy.orm import Session
 from faker import Faker
 
 from app.database import SessionLocal, engine
+from app.geocoder import geocode
 from app.models import (
     Base, ClientModel, ClientAddressModel, ConstructionSiteModel,
     ClientContractModel, ContractHistoryModel, ClaimModel, contract_guarantees,
@@ -46,109 +47,12 @@ STRUCTURE_TYPES = ["beton_arme", "ossature_bois", "mixte", "metallique", "maconn
 SEISMIC_ZONES = ["1", "2", "3", "4", "5"]
 ACTION_TYPES = ["creation", "modification", "changement_statut", "renouvellement", "resiliation"]
 
-# Coordonnées GPS approximatives par département français (centre du département)
-DEPARTEMENT_GPS = {
-    "01": {"lat": 46.0667, "lon": 5.3333},  # Ain
-    "02": {"lat": 49.5667, "lon": 3.6167},  # Aisne
-    "03": {"lat": 46.5667, "lon": 3.3333},  # Allier
-    "04": {"lat": 44.1000, "lon": 6.2333},  # Alpes-de-Haute-Provence
-    "05": {"lat": 44.6667, "lon": 6.0833},  # Hautes-Alpes
-    "06": {"lat": 43.9333, "lon": 7.2167},  # Alpes-Maritimes
-    "07": {"lat": 44.7333, "lon": 4.6000},  # Ardèche
-    "08": {"lat": 49.7667, "lon": 4.7167},  # Ardennes
-    "09": {"lat": 42.9667, "lon": 1.6000},  # Ariège
-    "10": {"lat": 48.3000, "lon": 4.0833},  # Aube
-    "11": {"lat": 43.2167, "lon": 2.3500},  # Aude
-    "12": {"lat": 44.3500, "lon": 2.5833},  # Aveyron
-    "13": {"lat": 43.5333, "lon": 5.4500},  # Bouches-du-Rhône
-    "14": {"lat": 49.1833, "lon": -0.3667},  # Calvados
-    "15": {"lat": 45.0333, "lon": 2.4333},  # Cantal
-    "16": {"lat": 45.6500, "lon": 0.1500},  # Charente
-    "17": {"lat": 45.7500, "lon": -0.6333},  # Charente-Maritime
-    "18": {"lat": 47.0833, "lon": 2.4000},  # Cher
-    "19": {"lat": 45.2667, "lon": 1.7667},  # Corrèze
-    "21": {"lat": 47.3167, "lon": 5.0167},  # Côte-d'Or
-    "22": {"lat": 48.5167, "lon": -2.7667},  # Côtes-d'Armor
-    "23": {"lat": 46.1667, "lon": 1.8667},  # Creuse
-    "24": {"lat": 45.1833, "lon": 0.7167},  # Dordogne
-    "25": {"lat": 47.2333, "lon": 6.0333},  # Doubs
-    "26": {"lat": 44.7333, "lon": 5.0500},  # Drôme
-    "27": {"lat": 49.0250, "lon": 0.9500},  # Eure
-    "28": {"lat": 48.4472, "lon": 1.4889},  # Eure-et-Loir
-    "29": {"lat": 48.2667, "lon": -4.0833},  # Finistère
-    "30": {"lat": 43.8333, "lon": 4.3667},  # Gard
-    "31": {"lat": 43.6047, "lon": 1.4442},  # Haute-Garonne
-    "32": {"lat": 43.6500, "lon": 0.5833},  # Gers
-    "33": {"lat": 44.8378, "lon": -0.5792},  # Gironde
-    "34": {"lat": 43.6108, "lon": 3.8767},  # Hérault
-    "35": {"lat": 48.1173, "lon": -1.6778},  # Ille-et-Vilaine
-    "36": {"lat": 46.8108, "lon": 1.6900},  # Indre
-    "37": {"lat": 47.3936, "lon": 0.6889},  # Indre-et-Loire
-    "38": {"lat": 45.1885, "lon": 5.7245},  # Isère
-    "39": {"lat": 46.6689, "lon": 5.5550},  # Jura
-    "40": {"lat": 43.8958, "lon": -0.5000},  # Landes
-    "41": {"lat": 47.5889, "lon": 1.3358},  # Loir-et-Cher
-    "42": {"lat": 45.4397, "lon": 4.3872},  # Loire
-    "43": {"lat": 45.0439, "lon": 3.8850},  # Haute-Loire
-    "44": {"lat": 47.2184, "lon": -1.5536},  # Loire-Atlantique
-    "45": {"lat": 47.9028, "lon": 1.9086},  # Loiret
-    "46": {"lat": 44.4472, "lon": 1.4414},  # Lot
-    "47": {"lat": 44.2028, "lon": 0.6197},  # Lot-et-Garonne
-    "48": {"lat": 44.5186, "lon": 3.5008},  # Lozère
-    "49": {"lat": 47.4739, "lon": -0.5542},  # Maine-et-Loire
-    "50": {"lat": 49.1167, "lon": -1.0833},  # Manche
-    "51": {"lat": 48.9569, "lon": 4.3658},  # Marne
-    "52": {"lat": 48.1128, "lon": 5.1397},  # Haute-Marne
-    "53": {"lat": 48.0706, "lon": -0.7703},  # Mayenne
-    "54": {"lat": 48.6844, "lon": 6.1844},  # Meurthe-et-Moselle
-    "55": {"lat": 49.1611, "lon": 5.3847},  # Meuse
-    "56": {"lat": 47.7467, "lon": -2.7597},  # Morbihan
-    "57": {"lat": 49.1197, "lon": 6.1769},  # Moselle
-    "58": {"lat": 47.0000, "lon": 3.5333},  # Nièvre
-    "59": {"lat": 50.6292, "lon": 3.0573},  # Nord
-    "60": {"lat": 49.4167, "lon": 2.0833},  # Oise
-    "61": {"lat": 48.4333, "lon": 0.0833},  # Orne
-    "62": {"lat": 50.5167, "lon": 2.6333},  # Pas-de-Calais
-    "63": {"lat": 45.7667, "lon": 3.0833},  # Puy-de-Dôme
-    "64": {"lat": 43.3000, "lon": -0.3667},  # Pyrénées-Atlantiques
-    "65": {"lat": 43.2333, "lon": 0.0833},  # Hautes-Pyrénées
-    "66": {"lat": 42.5000, "lon": 2.7500},  # Pyrénées-Orientales
-    "67": {"lat": 48.5833, "lon": 7.7500},  # Bas-Rhin
-    "68": {"lat": 47.7500, "lon": 7.3333},  # Haut-Rhin
-    "69": {"lat": 45.7640, "lon": 4.8357},  # Rhône
-    "70": {"lat": 47.6167, "lon": 6.1500},  # Haute-Saône
-    "71": {"lat": 46.6500, "lon": 4.7667},  # Saône-et-Loire
-    "72": {"lat": 48.0061, "lon": 0.1996},  # Sarthe
-    "73": {"lat": 45.5647, "lon": 6.3767},  # Savoie
-    "74": {"lat": 46.0672, "lon": 6.3769},  # Haute-Savoie
-    "75": {"lat": 48.8566, "lon": 2.3522},  # Paris
-    "76": {"lat": 49.4433, "lon": 1.0993},  # Seine-Maritime
-    "77": {"lat": 48.8424, "lon": 2.9978},  # Seine-et-Marne
-    "78": {"lat": 48.8033, "lon": 2.1333},  # Yvelines
-    "79": {"lat": 46.3239, "lon": -0.4642},  # Deux-Sèvres
-    "80": {"lat": 49.8944, "lon": 2.2958},  # Somme
-    "81": {"lat": 43.9286, "lon": 2.1478},  # Tarn
-    "82": {"lat": 44.0167, "lon": 1.3500},  # Tarn-et-Garonne
-    "83": {"lat": 43.4667, "lon": 6.2333},  # Var
-    "84": {"lat": 44.0000, "lon": 5.1333},  # Vaucluse
-    "85": {"lat": 46.6708, "lon": -1.4264},  # Vendée
-    "86": {"lat": 46.5819, "lon": 0.3339},  # Vienne
-    "87": {"lat": 45.8333, "lon": 1.2667},  # Haute-Vienne
-    "88": {"lat": 48.1706, "lon": 6.4514},  # Vosges
-    "89": {"lat": 47.7986, "lon": 3.5672},  # Yonne
-    "90": {"lat": 47.6406, "lon": 6.8631},  # Territoire de Belfort
-    "91": {"lat": 48.6308, "lon": 2.4286},  # Essonne
-    "92": {"lat": 48.8922, "lon": 2.2392},  # Hauts-de-Seine
-    "93": {"lat": 48.9103, "lon": 2.4839},  # Seine-Saint-Denis
-    "94": {"lat": 48.7917, "lon": 2.4856},  # Val-de-Marne
-    "95": {"lat": 49.0400, "lon": 2.1003},  # Val-d'Oise
-}
-
 
 def get_gps_coordinates(postal_code: str) -> tuple:
     """
     Obtenir des coordonnées GPS réalistes basées sur le code postal.
-    Ajoute une variation aléatoire pour simuler différentes adresses dans le département.
+    Centroïde de la commune (table du géocodeur) ou, à défaut, centre du département,
+    avec une variation aléatoire pour simuler différentes adresses.
     
     Args:
         postal_code: Code postal français (5 chiffres)
@@ -156,29 +60,18 @@ def get_gps_coordinates(postal_code: str) -> tuple:
     Returns:
         tuple: (latitude, longitude)
     """
-    if not postal_code or len(postal_code) < 2:
+    result = geocode(postal_code)
+    if result is None:
         # Coordonnées par défaut (centre de la France)
         return (46.6034, 1.8883)
     
-    # Extraire le code département (2 premiers chiffres)
-    dept_code = postal_code[:2]
-    
-    # Obtenir les coordonnées du département
-    dept_coords = DEPARTEMENT_GPS.get(dept_code)
-    
-    if dept_coords:
-        # Ajouter une variation aléatoire de ±0.1 à ±0.5 degrés
-        # pour simuler différentes adresses dans le département
-        lat_variation = random.uniform(-0.5, 0.5)
-        lon_variation = random.uniform(-0.5, 0.5)
-        
-        latitude = round(dept_coords["lat"] + lat_variation, 6)
-        longitude = round(dept_coords["lon"] + lon_variation, 6)
-        
-        return (latitude, longitude)
-    else:
-        # Coordonnées par défaut si département non trouvé
-        return (46.6034, 1.8883)
+    latitude, longitude, precision = result
+    # Variation de ±0.5 degré dans le département, ±0.02 degré autour d'une commune
+    spread = 0.5 if precision == "departement" else 0.02
+    return (
+        round(latitude + random.uniform(-spread, spread), 6),
+        round(longitude + random.uniform(-spread, spread), 6)
+    )
 
 def clean_all_clients(db: Session):
     """Supprimer tous les clients et leurs relations"""
@@ -480,6 +373,7 @@ def generate_contract(db: Session, client: ClientModel, site: ConstructionSiteMo
         for guarantee in selected_guarantees:
             guarantees_data.append({
                 'contract_id': contract.id,
+                'guarantee_id': guarantee.id,
                 'guarantee_code': guarantee.code,
                 'custom_ceiling': guarantee.default_ceiling or random.randint(50000, 1000000),
                 'custom_franchise': guarantee.default_franchise or random.randint(500, 5000),
@@ -0,0 +1,81 @@
+"""
+Script de géocodage hors ligne des adresses clients et des chantiers
+Usage:
+    python geocode_backfill.py --build-table laposte_hexasmal.csv  # Construire la table des centroïdes
+    python geocode_backfill.py                                    # Renseigner les coordonnées manquantes
+    python geocode_backfill.py --table sites --chunk-size 10000   # Chantiers seulement, lots de 10 000
+    python geocode_backfill.py --overwrite --min-precision commune # Recalculer, communes reconnues seulement
+"""
+import argparse
+
+from app.database import SessionLocal
+from app.geocoder import GEOCODER_BACKFILL_CHUNK_SIZE, GEOCODER_TABLE_PATH, PRECISIONS, backfill_coordinates, build_table
+from app.models import ClientAddressModel, ConstructionSiteModel
+
+BACKFILL_TABLES = {"addresses": ClientAddressModel, "sites": ConstructionSiteModel}
+
+
+def print_progress(stats: dict):
+    print(f"  {stats['table']} : {stats['scanned']} lignes lues, {stats['updated']} positions renseignées", end="\r")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Géocoder hors ligne (code postal / commune) les adresses clients et les chantiers"
+    )
+    parser.add_argument(
+        "--build-table",
+        metavar="CSV",
+        default=None,
+        help="Construire la table des centroïdes depuis la base officielle des codes postaux (CSV)"
+    )
+    parser.add_argument(
+        "--table",
+        choices=["addresses", "sites", "all"],
+        default="all",
+        help="Table à géocoder (défaut: all)"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=GEOCODER_BACKFILL_CHUNK_SIZE,
+        help=f"Lignes par transaction (défaut: {GEOCODER_BACKFILL_CHUNK_SIZE})"
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Recalculer aussi les lignes qui ont déjà des coordonnées"
+    )
+    parser.add_argument(
+        "--min-precision",
+        choices=list(PRECISIONS),
+        default="code_postal",
+        help="Précision minimale acceptée (défaut: code_postal)"
+    )
+    
+    args = parser.parse_args()
+    
+    if args.build_table:
+        count = build_table(args.build_table)
+        print(f"✓ Table des centroïdes : {count} entrées ({GEOCODER_TABLE_PATH})")
+        return
+    
+    tables = BACKFILL_TABLES if args.table == "all" else {args.table: BACKFILL_TABLES[args.table]}
+    db = SessionLocal()
+    try:
+        for model in tables.values():
+            stats = backfill_coordinates(
+                db, model, chunk_size=args.chunk_size, overwrite=args.overwrite,
+                min_precision=args.min_precision, progress=print_progress
+            )
+            print(
+                f"✓ {stats['table']} : {stats['updated']} / {stats['scanned']} positions renseignées "
+                f"({', '.join(f'{name}: {count}' for name, count in stats['by_precision'].items())}), "
+                f"{stats['skipped']} ignorées, {stats['duration_seconds']} s"
+            )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
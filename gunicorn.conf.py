@@ -0,0 +1,128 @@
+"""
+Configuration du mode serveur de production : gunicorn main:app
+
+- WEB_CONCURRENCY workers uvicorn (par défaut un par cœur disponible, quota du conteneur
+  compris, dans la limite du budget de connexions), application préchargée dans le
+  processus maître puis partagée par fork (copy-on-write)
+- Pool de connexions de chaque worker dimensionné par app.database.pool_options
+  à partir de DATABASE_CONNECTION_BUDGET et du nombre de workers (démarrage refusé si le
+  budget ne couvre pas le minimum de chaque worker)
+- Rafraîchissements périodiques exécutés par un seul worker (verrou de fichier)
+- Schéma, référentiels et table du géocodeur chargés par le maître avant le lancement
+  des workers : aucune requête n'est servie avant
+- Recyclage progressif des workers (max_requests + jitter) avec arrêt gracieux : les requêtes
+  en cours se terminent, les nouvelles vont aux autres workers
+"""
+import contextlib
+import gc
+import multiprocessing
+import os
+import tempfile
+
+# Avant la lecture de la configuration de l'application (settings, instanciée à l'import)
+os.environ.setdefault("SQL_ECHO", "false")
+if not os.environ.get("WEB_CONCURRENCY"):
+    os.environ.pop("WEB_CONCURRENCY", None)  # Variable vide (docker-compose) : nombre par défaut
+
+from app.config import POOL_MIN_CONNECTIONS, settings  # noqa: E402
+
+
+def _available_cores() -> int:
+    """Cœurs utilisables par ce processus : affinité CPU, puis quota du conteneur (cgroup v2)"""
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else multiprocessing.cpu_count()
+    with contextlib.suppress(OSError, ValueError):
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = min(cores, max(int(quota) // int(period), 1))
+    return cores
+
+
+# Nombre de workers : exporté avant le préchargement de l'application, qui en déduit la taille
+# de ses pools (changer le nombre de workers avec -w ou TTIN/TTOU fausse ce calcul).
+# WEB_CONCURRENCY imposé : démarrage refusé si le budget de connexions ne le couvre pas ;
+# sinon un worker par cœur disponible, dans la limite du budget
+if "WEB_CONCURRENCY" in os.environ:
+    workers = int(os.environ["WEB_CONCURRENCY"])
+else:
+    workers = max(min(_available_cores(), settings.DATABASE_CONNECTION_BUDGET // POOL_MIN_CONNECTIONS), 1)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+settings.WEB_CONCURRENCY = workers
+
+# Rafraîchissements périodiques (tableau de bord, vues analytiques, tuiles, cumuls) exécutés par un
+# seul worker à la fois : verrou sur ce fichier, propre à ce serveur (voir main.run_periodic_refreshes)
+os.environ.setdefault(
+    "BACKGROUND_TASKS_LOCK", os.path.join(tempfile.gettempdir(), f"sma_dwh-background-{os.getpid()}.lock")
+)
+
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+preload_app = True
+
+# Recyclage : chaque worker est remplacé après max_requests requêtes (± jitter, pour
+# ne pas recycler tous les workers en même temps)
+max_requests = 10000
+max_requests_jitter = 1000
+
+# Délai laissé aux requêtes en cours lors d'un recyclage ou d'un arrêt (secondes)
+graceful_timeout = 30
+
+# Worker bloqué sans signe de vie : redémarré (secondes)
+timeout = 120
+
+keepalive = 5
+
+# Journal des accès sur la sortie standard (ACCESS_LOG= vide pour le désactiver, par ex. en benchmark)
+accesslog = os.environ.get("ACCESS_LOG", "-") or None
+
+
+def when_ready(server):
+    """Maître prêt (socket ouvert, workers pas encore lancés) : schéma et données de référence"""
+    import main
+    from app.database import engine, init_db, replica_engine
+    
+    try:
+        init_db()
+        main.warm_up()
+        # Hérité par les workers : leur lifespan ne refait ni le schéma ni le chargement
+        main.PRELOADED = True
+    except Exception as e:
+        # Base indisponible : les workers réessaieront à leur démarrage (lifespan, init_db sous verrou)
+        server.log.warning("Préchargement impossible : %s", e)
+    # Aucune connexion ouverte par le maître ne doit être héritée par les workers
+    engine.dispose()
+    replica_engine.dispose()
+    # Objets chargés exclus du ramasse-miettes : leurs pages restent partagées entre workers
+    gc.freeze()
+    server.log.info("Application préchargée : %s workers, pool %s par worker", workers, _pool_description())
+
+
+def nworkers_changed(server, new_value, old_value):
+    if new_value != workers:
+        server.log.warning(
+            "%s workers au lieu de %s : pools dimensionnés pour %s (utiliser WEB_CONCURRENCY)",
+            new_value, workers, workers
+        )
+
+
+def post_fork(server, worker):
+    """Nouveau worker : pools vidés sans fermer les connexions éventuelles du maître"""
+    from app.database import engine, replica_engine
+    
+    engine.dispose(close=False)
+    replica_engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    server.log.info("Worker %s arrêté (recyclage ou arrêt)", worker.pid)
+
+
+def on_exit(server):
+    with contextlib.suppress(OSError):
+        os.remove(os.environ["BACKGROUND_TASKS_LOCK"])
+
+
+def _pool_description() -> str:
+    from app.database import POOL_OPTIONS
+    
+    return f"{POOL_OPTIONS['pool_size']}+{POOL_OPTIONS['max_overflow']}"
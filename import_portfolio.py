@@ -0,0 +1,97 @@
+"""
+Script d'import de portefeuille (CSV / XLSX) via COPY et table de staging
+Usage:
+    python import_portfolio.py extraction.csv                     # Import CSV (UTF-8)
+    python import_portfolio.py extraction.csv --encoding cp1252   # Export Excel Windows
+    python import_portfolio.py portefeuille.xlsx --sheet Contrats # Feuille XLSX
+    python import_portfolio.py extraction.csv --report rejets.csv # Rapport des lignes rejetées
+"""
+import argparse
+import csv
+import json
+
+from app.database import SessionLocal
+from app.models import ImportRejectionModel
+from app.portfolio_import import import_portfolio, COPY_ENCODINGS
+
+
+def write_rejection_report(db, batch_id: str, path: str) -> int:
+    """Écrit le rapport des lignes rejetées au format CSV (séparateur ;)"""
+    count = 0
+    rows = db.query(
+        ImportRejectionModel.line_number, ImportRejectionModel.errors, ImportRejectionModel.raw_data
+    ).filter(
+        ImportRejectionModel.batch_id == batch_id
+    ).order_by(ImportRejectionModel.line_number).yield_per(5000)
+    
+    with open(path, "w", newline="", encoding="utf-8") as report:
+        writer = csv.writer(report, delimiter=";")
+        writer.writerow(["line_number", "errors", "raw_data"])
+        for row in rows:
+            writer.writerow([row.line_number, row.errors, json.dumps(row.raw_data, ensure_ascii=False)])
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Importer un portefeuille (clients, chantiers, contrats) depuis un fichier CSV ou XLSX"
+    )
+    parser.add_argument("file", help="Fichier CSV ou XLSX (une ligne par contrat)")
+    parser.add_argument(
+        "--sheet",
+        type=str,
+        default=None,
+        help="Feuille XLSX à importer (défaut: feuille active)"
+    )
+    parser.add_argument(
+        "--encoding",
+        choices=list(COPY_ENCODINGS),
+        default="utf-8",
+        help="Encodage du fichier CSV (défaut: utf-8)"
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        default=None,
+        help="Chemin du rapport CSV des lignes rejetées"
+    )
+    
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    
+    try:
+        print(f"\n📥 Import de {args.file}...\n")
+        with open(args.file, "rb") as fileobj:
+            result = import_portfolio(db, fileobj, args.file, sheet=args.sheet, encoding=args.encoding)
+        
+        print("=" * 60)
+        print("📊 RÉSUMÉ DE L'IMPORT")
+        print("=" * 60)
+        print(f"  Lot:                  {result['batch_id']}")
+        print(f"  Lignes lues:          {result['total_rows']}")
+        print(f"  Lignes rejetées:      {result['rejected_rows']}")
+        print(f"  Clients:              {result['clients_created']} créés, {result['clients_updated']} mis à jour")
+        print(f"  Chantiers:            {result['sites_created']} créés, {result['sites_updated']} mis à jour")
+        print(f"  Contrats:             {result['contracts_created']} créés, {result['contracts_updated']} mis à jour")
+        if result["ignored_columns"]:
+            print(f"  Colonnes ignorées:    {', '.join(result['ignored_columns'])}")
+        print(f"  Durée:                {result['duration_seconds']} s")
+        print("=" * 60)
+        
+        if args.report and result["rejected_rows"]:
+            count = write_rejection_report(db, result["batch_id"], args.report)
+            print(f"📝 Rapport des rejets : {args.report} ({count} lignes)")
+        
+        print("✅ Import terminé\n")
+    
+    except Exception as e:
+        print(f"\n❌ Erreur: {str(e)}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,32 +4,110 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from fastapi import Depends
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from pydantic import BaseModel
+import asyncio
 import subprocess
 import os
 
 from app.config import settings
-from app.database import init_db, get_db
-from app.routers import clients, contracts, sites, referentials, addresses, history, claims
+from app.database import (
+    init_db, get_db, SessionLocal, current_wal_lsn, replica_configured, replica_health,
+    READ_METHODS, READ_YOUR_WRITES_COOKIE, READ_YOUR_WRITES_HEADER, REPLICA_MAX_LAG_SECONDS
+)
+from app.routers import clients, contracts, sites, referentials, addresses, history, claims, sync, imports, dashboard, analytics, geocoding
+from app.accumulation import ACCUMULATION_SNAPSHOT
+from app.cache import cache, cached_response
+from app.geocoder import get_table
+from app.analytics import ANALYTICS_SNAPSHOT
+from app.site_tiles import SITE_TILES_SNAPSHOT
+from app.statistics import compute_global_stats
+
+
+# Fichier verrou posé par gunicorn.conf.py : un seul worker exécute les rafraîchissements périodiques
+BACKGROUND_LOCK_ENV = "BACKGROUND_TASKS_LOCK"
+
+# Intervalle auquel les autres workers retentent de prendre le verrou (worker élu recyclé ou arrêté)
+BACKGROUND_LOCK_RETRY_SECONDS = 30
+
+# Rafraîchissements périodiques : tableau de bord, vues analytiques (si leurs tables sources ont
+# changé), tuiles de carte et cumuls catastrophe (modifications de chantiers, contrats et garanties)
+PERIODIC_SNAPSHOTS = (dashboard.DASHBOARD_SNAPSHOT, ANALYTICS_SNAPSHOT, SITE_TILES_SNAPSHOT, ACCUMULATION_SNAPSHOT)
+
+# Schéma et données de référence chargés par le processus maître (gunicorn.conf.py, when_ready) :
+# les workers, qui en héritent par fork, ne refont ni l'un ni l'autre
+PRELOADED = False
+
+
+def warm_up() -> None:
+    """
+    Charge les données de référence avant d'accepter du trafic : bundle des référentiels
+    et table des centroïdes du géocodeur. En mode serveur (gunicorn.conf.py), appelée par le
+    processus maître avant de lancer les workers, qui en héritent sans les recharger.
+    """
+    db = SessionLocal()
+    try:
+        referentials.warm_referentials_bundle(db)
+    finally:
+        db.close()
+    get_table()
+
+
+async def run_periodic_refreshes() -> None:
+    """
+    Boucles de rafraîchissement périodique. En mode serveur, un seul worker les exécute (verrou de
+    fichier) : les autres gardent leur pool pour les requêtes et ne rafraîchissent leurs instantanés
+    qu'à la lecture. À l'arrêt du worker élu, un autre prend le relais.
+    """
+    lock_path = os.environ.get(BACKGROUND_LOCK_ENV)
+    lock_file = open(lock_path, "a") if lock_path else None
+    try:
+        if lock_file is not None:
+            import fcntl
+            
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(BACKGROUND_LOCK_RETRY_SECONDS)
+            print(f"🔁 Rafraîchissements périodiques assurés par le worker {os.getpid()}")
+        await asyncio.gather(*(snapshot.run_periodic() for snapshot in PERIODIC_SNAPSHOTS))
+    finally:
+        # Verrou libéré avec le fichier
+        if lock_file is not None:
+            lock_file.close()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gestion du cycle de vie de l'application"""
-    # Démarrage : initialisation de la base de données
-    print("🚀 Initialisation de la base de données...")
-    try:
-        init_db()
-        print("✅ Base de données initialisée avec succès")
-    except Exception as e:
-        print(f"❌ Erreur lors de l'initialisation de la base de données: {e}")
+    if not PRELOADED:
+        # Démarrage : initialisation de la base de données
+        print("🚀 Initialisation de la base de données...")
+        try:
+            init_db()
+            print("✅ Base de données initialisée avec succès")
+        except Exception as e:
+            print(f"❌ Erreur lors de l'initialisation de la base de données: {e}")
+        
+        # Données de référence chargées avant la première requête
+        try:
+            await run_in_threadpool(warm_up)
+        except Exception as e:
+            print(f"⚠️ Préchargement des référentiels impossible : {e}")
+    
+    periodic_refreshes = asyncio.create_task(run_periodic_refreshes())
     
     yield
     
     # Arrêt : nettoyage si nécessaire
+    periodic_refreshes.cancel()
+    with suppress(asyncio.CancelledError):
+        await periodic_refreshes
     print("👋 Arrêt de l'application")
 
 
@@ -54,6 +132,20 @@ async def proxy_headers_middleware(request: Request, call_next):
     response = await call_next(request)
     return response
 
+# Lecture après écriture : après une écriture réussie, le client reçoit la position WAL du primaire
+# (cookie et en-tête) ; ses lectures restent sur le primaire tant que la réplique ne l'a pas rejouée
+@app.middleware("http")
+async def read_your_writes_middleware(request: Request, call_next):
+    """Pose le cookie / en-tête X-Primary-LSN après une écriture lorsqu'une réplique est configurée"""
+    response = await call_next(request)
+    if replica_configured() and request.method not in READ_METHODS and response.status_code < 400:
+        lsn = await run_in_threadpool(current_wal_lsn)
+        response.headers[READ_YOUR_WRITES_HEADER] = lsn
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE, lsn, max_age=REPLICA_MAX_LAG_SECONDS, httponly=True, samesite="lax"
+        )
+    return response
+
 # Configuration CORS
 app.add_middleware(
     CORSMiddleware,
@@ -71,6 +163,11 @@ app.include_router(sites.router)
 app.include_router(referentials.router)
 app.include_router(history.router)
 app.include_router(claims.router)
+app.include_router(sync.router)
+app.include_router(imports.router)
+app.include_router(dashboard.router)
+app.include_router(analytics.router)
+app.include_router(geocoding.router)
 
 # Montage des fichiers statiques pour le front-end
 frontend_path = os.path.join(os.path.dirname(__file__), "frontend")
@@ -93,48 +190,26 @@ def root():
     }
 
 
+# Durée de vie des statistiques globales en cache (secondes)
+STATS_CACHE_TTL = 30
+
+
 @app.get("/health", tags=["Health"])
 def health_check():
-    """Vérification de la santé de l'API"""
+    """Vérification de la santé de l'API (retard de la réplique en lecture, compteurs du cache)"""
     return {
         "status": "healthy",
-        "database": "connected"
+        "database": "connected",
+        "replica": replica_health(),
+        "cache": cache.stats()
     }
 
 
 @app.get("/stats/", tags=["Statistics"])
 @app.get("/stats", tags=["Statistics"])
 def get_statistics(db: Session = Depends(get_db)):
-    """Obtenir les statistiques globales de la base de données"""
-    from app.models import ClientModel, ClientAddressModel, ConstructionSiteModel, ClientContractModel
-    
-    total_clients = db.query(ClientModel).count()
-    total_addresses = db.query(ClientAddressModel).count()
-    total_construction_sites = db.query(ConstructionSiteModel).count()
-    total_contracts = db.query(ClientContractModel).count()
-    
-    # Statistiques par type de client
-    clients_particulier = db.query(ClientModel).filter(ClientModel.client_type == 'particulier').count()
-    clients_professionnel = db.query(ClientModel).filter(ClientModel.client_type == 'professionnel').count()
-    
-    # Statistiques par statut de contrat
-    from sqlalchemy import func
-    contracts_by_status = db.query(
-        ClientContractModel.status,
-        func.count(ClientContractModel.id)
-    ).group_by(ClientContractModel.status).all()
-    
-    return {
-        "total_clients": total_clients,
-        "total_addresses": total_addresses,
-        "total_construction_sites": total_construction_sites,
-        "total_contracts": total_contracts,
-        "clients_by_type": {
-            "particulier": clients_particulier,
-            "professionnel": clients_professionnel
-        },
-        "contracts_by_status": {status: count for status, count in contracts_by_status}
-    }
+    """Obtenir les statistiques globales de la base de données (en cache, partagé entre workers)"""
+    return cached_response("stats", lambda: compute_global_stats(db), STATS_CACHE_TTL)
 
 
 # Modèles pour la génération de données
@@ -176,6 +251,8 @@ async def generate_data(request: DataGenerationRequest, background_tasks: Backgr
         )
         
         if result.returncode == 0:
+            # Données régénérées hors de l'API : plus aucune entrée en cache n'est fiable
+            cache.clear()
             return {
                 "status": "success",
                 "message": f"Génération terminée : {request.count} clients créés",
@@ -218,6 +295,8 @@ async def clean_data():
         )
         
         if result.returncode == 0:
+            # Données régénérées hors de l'API : plus aucune entrée en cache n'est fiable
+            cache.clear()
             return {
                 "status": "success",
                 "message": "Toutes les données ont été supprimées",
@@ -265,6 +344,8 @@ async def generate_claims(request: ClaimsGenerationRequest):
         )
         
         if result.returncode == 0:
+            # Données régénérées hors de l'API : plus aucune entrée en cache n'est fiable
+            cache.clear()
             return {
                 "status": "success",
                 "message": f"Génération terminée : {request.count} sinistres créés",
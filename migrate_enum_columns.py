@@ -0,0 +1,132 @@
+"""
+Script de migration des colonnes de statut / type vers des énumérations PostgreSQL natives
+Usage:
+    python migrate_enum_columns.py           # varchar -> enum natif
+    python migrate_enum_columns.py --revert  # enum natif -> varchar
+
+Les colonnes concernées sont celles déclarées avec db_enum() dans app/models.py.
+Une colonne contenant des valeurs hors énumération est ignorée (valeurs listées).
+ALTER COLUMN TYPE réécrit la table sous verrou exclusif : à lancer hors production.
+"""
+import argparse
+from sqlalchemy import Enum as SQLEnum, text
+
+from app.database import engine, Base
+import app.models  # noqa: F401 - déclaration des tables
+
+# Longueur varchar d'origine, pour --revert
+VARCHAR_LENGTHS = {
+    ("fake_contract_history", "action"): 50,
+    ("fake_claims", "severity"): 20,
+}
+DEFAULT_VARCHAR_LENGTH = 30
+
+
+def enum_columns() -> dict:
+    """Colonnes énumérées déclarées dans les modèles, groupées par table"""
+    columns = {}
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, SQLEnum):
+                columns.setdefault(table.name, []).append(column)
+    return columns
+
+
+def column_info(conn, table: str, column: str):
+    return conn.execute(text("""
+        SELECT data_type, udt_name, column_default
+        FROM information_schema.columns
+        WHERE table_name = :table AND column_name = :column
+    """), {"table": table, "column": column}).one_or_none()
+
+
+def table_size(conn, table: str) -> int:
+    return conn.execute(text("SELECT pg_total_relation_size(CAST(:table AS regclass))"), {"table": table}).scalar()
+
+
+def migrate(revert: bool = False) -> None:
+    sizes = {}
+    with engine.begin() as conn:
+        for table, columns in enum_columns().items():
+            clauses = []
+            defaults = []
+            for column in columns:
+                enum_type = column.type
+                info = column_info(conn, table, column.name)
+                if info is None:
+                    print(f"  ⏭️  {table}.{column.name} : colonne absente")
+                    continue
+                is_enum = info.data_type == "USER-DEFINED" and info.udt_name == enum_type.name
+                if is_enum != revert:
+                    print(f"  ✓ {table}.{column.name} déjà {'varchar' if revert else enum_type.name}")
+                    continue
+                
+                if revert:
+                    length = VARCHAR_LENGTHS.get((table, column.name), DEFAULT_VARCHAR_LENGTH)
+                    clauses.append(f"ALTER COLUMN {column.name} TYPE VARCHAR({length}) USING {column.name}::text")
+                else:
+                    invalid = conn.execute(text(
+                        f"SELECT DISTINCT {column.name} FROM {table} "
+                        f"WHERE {column.name} IS NOT NULL AND NOT ({column.name} = ANY(:values))"
+                    ), {"values": list(enum_type.enums)}).scalars().all()
+                    if invalid:
+                        print(f"  ⚠️  {table}.{column.name} ignorée, valeurs hors énumération : {', '.join(invalid)}")
+                        continue
+                    enum_type.create(conn, checkfirst=True)
+                    clauses.append(f"ALTER COLUMN {column.name} TYPE {enum_type.name} USING {column.name}::{enum_type.name}")
+                
+                # Un défaut serveur ne peut pas être converti automatiquement
+                if info.column_default is not None:
+                    default_value = conn.execute(text(f"SELECT ({info.column_default})::text")).scalar()
+                    clauses.insert(0, f"ALTER COLUMN {column.name} DROP DEFAULT")
+                    defaults.append((column.name, default_value))
+                print(f"  🔄 {table}.{column.name} -> {'varchar' if revert else enum_type.name}")
+            
+            if not clauses:
+                continue
+            
+            before = table_size(conn, table)
+            # Une seule réécriture de la table pour toutes ses colonnes
+            conn.execute(text(f"ALTER TABLE {table} {', '.join(clauses)}"))
+            for name, value in defaults:
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {name} SET DEFAULT :value").bindparams(value=value))
+            sizes[table] = (before, table_size(conn, table))
+        
+        if revert:
+            # Suppression des types devenus inutilisés
+            for columns in enum_columns().values():
+                for column in columns:
+                    column.type.drop(conn, checkfirst=True)
+    
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in sizes:
+            conn.execute(text(f"VACUUM (ANALYZE) {table}"))
+    
+    if sizes:
+        print("\n📊 Taille des tables (données + index)")
+        for table, (before, after) in sizes.items():
+            print(f"  {table:30} {before / 1024:10.0f} Ko -> {after / 1024:10.0f} Ko")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convertir les colonnes de statut / type en énumérations PostgreSQL natives"
+    )
+    parser.add_argument(
+        "--revert",
+        action="store_true",
+        help="Revenir aux colonnes varchar"
+    )
+    args = parser.parse_args()
+    
+    try:
+        print(f"\n🔄 Migration des colonnes énumérées{' (retour arrière)' if args.revert else ''}...\n")
+        migrate(revert=args.revert)
+        print("\n✅ Migration terminée avec succès!")
+    except Exception as e:
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Script de normalisation des garanties de contrats sur clé entière
+Usage:
+    python migrate_guarantee_ids.py                    # Backfill + contraintes + index
+    python migrate_guarantee_ids.py --batch-size 20000 # Taille des lots de backfill
+
+1. Renseigne guarantee_id à partir de guarantee_code, par lots d'identifiants (un commit par lot)
+2. Ajoute les clés étrangères manquantes (NOT VALID puis VALIDATE : pas de verrou bloquant)
+3. Crée l'index couvrant (contract_id, guarantee_id) utilisé par les lectures de garanties
+4. VACUUM ANALYZE pour que la carte de visibilité permette les index-only scans
+"""
+import argparse
+from sqlalchemy import inspect, text
+
+from app.database import engine
+
+TABLE = "fake_contract_guarantees"
+
+FOREIGN_KEYS = {
+    "guarantee_id": ("fk_fake_contract_guarantees_guarantee_id", "fake_ref_guarantees"),
+    "contract_id": ("fk_fake_contract_guarantees_contract_id", "fake_client_contracts"),
+}
+
+# Index couvrant : la lecture des garanties d'un contrat n'a pas besoin de la table
+COVERING_INDEX = f"""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_fake_contract_guarantees_contract_guarantee
+    ON {TABLE} (contract_id, guarantee_id)
+    INCLUDE (id, guarantee_code, custom_ceiling, custom_franchise, is_included, annual_premium, updated_at)
+"""
+
+# Index créé sans id dans INCLUDE (id lu par les inclusions pour l'ETag) : recréé
+OUTDATED_INDEX = """
+    SELECT 1 FROM pg_indexes
+    WHERE indexname = 'ix_fake_contract_guarantees_contract_guarantee' AND indexdef NOT LIKE '%INCLUDE (id,%'
+"""
+
+
+def backfill_guarantee_ids(batch_size: int) -> int:
+    """Renseigne guarantee_id par plages d'identifiants ; retourne le nombre de lignes mises à jour"""
+    with engine.connect() as conn:
+        min_id, max_id = conn.execute(text(
+            f"SELECT min(id), max(id) FROM {TABLE} WHERE guarantee_id IS NULL AND guarantee_code IS NOT NULL"
+        )).one()
+    
+    if min_id is None:
+        print("✓ Aucune ligne à compléter")
+        return 0
+    
+    total = 0
+    for start in range(min_id, max_id + 1, batch_size):
+        # Une transaction courte par lot : pas de verrou long ni de gros volume de WAL d'un coup
+        with engine.begin() as conn:
+            updated = conn.execute(text(f"""
+                UPDATE {TABLE} cg
+                SET guarantee_id = g.id
+                FROM fake_ref_guarantees g
+                WHERE g.code = cg.guarantee_code
+                  AND cg.guarantee_id IS NULL
+                  AND cg.id >= :start AND cg.id < :end
+            """), {"start": start, "end": start + batch_size}).rowcount
+        total += updated
+        print(f"  ✓ Lignes {start} à {min(start + batch_size - 1, max_id)} : {updated} garanties renseignées")
+    
+    return total
+
+
+def add_foreign_keys() -> None:
+    """Ajoute les clés étrangères absentes sans bloquer les écritures pendant la validation"""
+    existing = {
+        column
+        for fk in inspect(engine).get_foreign_keys(TABLE)
+        for column in fk["constrained_columns"]
+    }
+    for column, (name, referenced) in FOREIGN_KEYS.items():
+        if column in existing:
+            print(f"✓ Clé étrangère sur {column} déjà présente")
+            continue
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} "
+                f"FOREIGN KEY ({column}) REFERENCES {referenced} (id) NOT VALID"
+            ))
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {TABLE} VALIDATE CONSTRAINT {name}"))
+        print(f"✓ Clé étrangère {name} ajoutée")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Renseigner guarantee_id et indexer les garanties de contrats"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="Nombre d'identifiants traités par lot (défaut: 10000)"
+    )
+    args = parser.parse_args()
+    
+    try:
+        print(f"\n🔄 Backfill de guarantee_id (lots de {args.batch_size})...")
+        total = backfill_guarantee_ids(args.batch_size)
+        print(f"✓ {total} lignes mises à jour")
+        
+        with engine.connect() as conn:
+            orphans = conn.execute(text(
+                f"SELECT guarantee_code, count(*) FROM {TABLE} "
+                f"WHERE guarantee_id IS NULL GROUP BY guarantee_code ORDER BY 2 DESC"
+            )).fetchall()
+        if orphans:
+            print("⚠️  Codes sans garantie dans le référentiel :")
+            for code, count in orphans:
+                print(f"   - {code}: {count} lignes")
+        
+        print("\n🔗 Clés étrangères...")
+        add_foreign_keys()
+        
+        # CREATE INDEX CONCURRENTLY et VACUUM ne peuvent pas s'exécuter dans une transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            print("\n📇 Index couvrant (contract_id, guarantee_id)...")
+            if conn.execute(text(OUTDATED_INDEX)).first():
+                conn.execute(text("DROP INDEX CONCURRENTLY ix_fake_contract_guarantees_contract_guarantee"))
+            conn.execute(text(COVERING_INDEX))
+            print("✓ Index ix_fake_contract_guarantees_contract_guarantee présent")
+            
+            print("\n🧹 VACUUM ANALYZE...")
+            conn.execute(text(f"VACUUM (ANALYZE) {TABLE}"))
+            print("✓ Statistiques et carte de visibilité à jour")
+        
+        print("\n✅ Garanties des contrats normalisées avec succès!")
+    
+    except Exception as e:
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
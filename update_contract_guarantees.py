@@ -40,6 +40,7 @@ def update_contract_guarantees():
             for guarantee in selected_guarantees:
                 guarantees_data.append({
                     'contract_id': contract_id,
+                    'guarantee_id': guarantee.id,
                     'guarantee_code': guarantee.code,
                     'custom_ceiling': guarantee.default_ceiling or random.randint(50000, 1000000),
                     'custom_franchise': guarantee.default_franchise or random.randint(500, 5000),